@@ -4,12 +4,20 @@ import logging
 import sys
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
-from langgraph.checkpoint.sqlite import SqliteSaver
 from langchain_core.messages import HumanMessage
 from graph.graph import workflow
-import json
-from contextlib import ExitStack
-import atexit
+from graph.checkpoint import build_checkpointer
+from graph.checkpoint.retention import restore_if_archived
+from utils.sse import format_sse, ChatStreamEncoder
+from utils.cache import cache_stats
+from utils.telemetry import render_prometheus, PROMETHEUS_CONTENT_TYPE
+from graph.tools.order_progress import progress_hub
+from graph.tools.summary_schedule import summary_scheduler
+from graph.tools.google_tools import rank_restaurants
+from sql.menu_catalog import menu_catalog
+from sql.session import db_pool_stats
+from config import LOG_LEVEL, CHAT_STREAM_TOKENS
+import queue
 
 app = Flask(__name__)
 CORS(app)
@@ -18,7 +26,7 @@ CORS(app)
 # When using 'flask run', it can interfere with logging configuration.
 # It's more reliable to get the root logger, clear its handlers, and add our own.
 logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger.setLevel(LOG_LEVEL.upper())
 logger.handlers.clear()
 handler = logging.StreamHandler(sys.stdout)
 handler.setFormatter(logging.Formatter(
@@ -36,26 +44,16 @@ os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = os.environ.get('GOOGLE_APPLICATIO
 os.environ['LINE_CHANNEL_ACCESS_TOKEN'] = os.environ.get('LINE_CHANNEL_ACCESS_TOKEN', 'YOUR_LINE_CHANNEL_ACCESS_TOKEN')
 
 # --- LangGraph Setup ---
-stack = ExitStack()
-# Use a file-based sqlite database for persistence.
-# This ensures that conversation state is maintained across requests.
-db_path = os.path.join(os.path.dirname(__file__), "checkpointer.sqlite")
-memory = stack.enter_context(SqliteSaver.from_conn_string(db_path))
-# Register the close method to be called when the application exits.
-atexit.register(stack.close)
+# Checkpointer 後端由 CHECKPOINT_BACKEND 決定 (預設為 WAL + 批次寫入的 SQLite)，
+# 讓對話狀態在 request 之間保留。
+# SQLite 版本會在程式結束時自行把佇列中的寫入 commit。
+memory = build_checkpointer()
 
 graph = workflow.compile(checkpointer=memory)
-# 畫圖
-graph.get_graph().draw_mermaid_png(output_file_path="graph.png")
+# 流程圖改由 `python -m graph.render` 離線產生，啟動時不再呼叫 draw_mermaid_png
 
-
-# --- Helper Functions ---
-def _is_json(s):
-    try:
-        json.loads(s)
-        return True
-    except (ValueError, TypeError):
-        return False
+# 本機菜單目錄載入行程內的快取，建立表單時不必查詢資料庫 (失敗時只記錄警告，之後的查詢會再嘗試)
+menu_catalog.warm()
 
 
 # --- API Routes ---
@@ -73,6 +71,7 @@ def chat():
     data = request.json
     human_input = data.get("message")
     thread_id = data.get("thread_id")
+    stream_tokens = bool(data.get("stream_tokens", CHAT_STREAM_TOKENS))
     logging.info(f"Received request for thread_id: {thread_id} with message: {human_input}")
 
     # --- Conversation Management ---
@@ -80,6 +79,9 @@ def chat():
     if not thread_id:
         thread_id = str(uuid.uuid4())
         logging.info(f"New conversation started with thread_id: {thread_id}")
+    else:
+        # 已封存到冷儲存的對話先還原
+        restore_if_archived(memory, thread_id)
 
     # Configuration for the graph invocation
     config = {"configurable": {"thread_id": thread_id}}
@@ -92,40 +94,106 @@ def chat():
         Streams the agent's response back to the client.
         This allows for real-time updates in the UI.
         """
+        encoder = ChatStreamEncoder(thread_id, stream_tokens=stream_tokens)
         try:
-            # The stream method returns an iterator of events
-            for event in graph.stream(inputs, config, stream_mode="values"):
-                # The event is the full state of the graph after each step
-                last_message = event["messages"][-1]
-                logging.info(f"Streaming event for thread_id {thread_id}: {last_message.pretty_repr()}")
-
-                # Check if the last message has content and send it
-                if last_message and last_message.content:
-                    # Check if the content is a JSON string (for structured data)
-                    if isinstance(last_message.content, str) and _is_json(last_message.content):
-                        # If it's JSON, send it as a structured data event
-                        yield f"data: {last_message.content}\n\n"
-                    else:
-                        # Otherwise, wrap it in a standard message JSON object
-                        response_data = {
-                            "type": "message",
-                            "content": last_message.content
-                        }
-                        yield f"data: {json.dumps(response_data)}\n\n"
+            # 只串流每個節點新增的訊息 (以及可選的回覆 token)，不再每一步都產生完整 state
+            for chunk in graph.stream(inputs, config, stream_mode=encoder.stream_mode):
+                yield from encoder.encode(chunk)
 
             # Send a final event to indicate the end of the stream
-            end_event = {"type": "end", "thread_id": thread_id}
-            yield f"data: {json.dumps(end_event)}\n\n"
+            yield encoder.end()
 
         except Exception as e:
             logging.error(f"Error during stream for thread_id {thread_id}: {e}", exc_info=True)
-            error_event = {"type": "error", "content": str(e)}
-            yield f"data: {json.dumps(error_event)}\n\n"
+            yield encoder.error(e)
 
     # Return the streaming response
     return Response(event_stream(), mimetype='text/event-stream')
 
 
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """回傳各個結果快取 (例如 Google Maps 搜尋) 的命中/未命中統計。"""
+    return jsonify(cache_stats()), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus 指標：各節點 / 工具 / LLM 呼叫的耗時、tokens、外部 API 呼叫與快取命中。"""
+    return Response(render_prometheus(), mimetype=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.route('/api/db/pool', methods=['GET'])
+def get_db_pool_stats():
+    """回傳資料庫連線池的使用量、飽和度與取得連線的等待時間。"""
+    return jsonify(db_pool_stats()), 200
+
+
+@app.route('/api/orders/<order_id>/progress', methods=['GET'])
+def get_order_progress(order_id):
+    """回傳訂單目前各品項的份數 (由共用的增量統計提供，不會觸發整張表的讀取)。"""
+    snapshot = progress_hub.snapshot(order_id)
+    if snapshot is None:
+        return jsonify({"error": "Order not found or has no response sheet."}), 404
+    return jsonify(snapshot), 200
+
+
+@app.route('/api/orders/<order_id>/progress/stream', methods=['GET'])
+def stream_order_progress(order_id):
+    """以 SSE 推送訂單進度，每次有新回覆時送出一次最新的統計。"""
+    updates = queue.Queue()
+    unsubscribe = progress_hub.subscribe(order_id, updates.put)
+    if unsubscribe is None:
+        return jsonify({"error": "Order not found or has no response sheet."}), 404
+
+    def event_stream():
+        try:
+            while True:
+                try:
+                    snapshot = updates.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(snapshot)
+                if snapshot.get("final"):
+                    break
+        finally:
+            unsubscribe()
+
+    return Response(event_stream(), mimetype='text/event-stream')
+
+
+@app.route('/api/orders/<order_id>/notify', methods=['POST'])
+def notify_order_progress(order_id):
+    """Forms watch 通知的接收端：有新回覆時立即更新該訂單的進度。"""
+    return jsonify({"accepted": progress_hub.notify(order_id)}), 202
+
+
+@app.route('/api/summary-tasks/<schedule_id>', methods=['GET'])
+def get_summary_task(schedule_id):
+    """回傳截止統計排程的狀態 (pending / running / done / failed / replaced)。"""
+    record = summary_scheduler.get(schedule_id)
+    if record is None:
+        return jsonify({"error": "Scheduled summary not found."}), 404
+    return jsonify(record), 200
+
+
+@app.route('/api/threads/<thread_id>/summary-tasks', methods=['GET'])
+def list_summary_tasks(thread_id):
+    """回傳對話排定的所有截止統計及其狀態。"""
+    return jsonify(summary_scheduler.for_thread(thread_id)), 200
+
+
+@app.route('/api/restaurants/rank', methods=['GET'])
+def rank_restaurants_route():
+    """
+    以新的篩選條件 (min_rating、price、cuisine、max_distance_km) 重新排序推薦餐廳。
+    同一個查詢的候選池在快取中時只在本機排序，不會再呼叫 Maps API。
+    """
+    payload, status = rank_restaurants(request.args)
+    return jsonify(payload), status
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for monitoring."""
@@ -0,0 +1,294 @@
+# asgi_app.py
+"""
+非同步 (ASGI) 版本的聊天 API。
+
+與 app.py 的 Flask 版本提供相同的路由，但以 graph.astream() 驅動 LangGraph，
+每條 SSE 連線只佔用一個 coroutine 而非一個 worker thread，
+因此單一 process 可以同時維持數百條聊天串流。
+
+啟動方式：
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+"""
+import os
+import re
+import uuid
+import json
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from langchain_core.messages import HumanMessage
+
+from graph.graph import workflow
+from graph.checkpoint import build_checkpointer
+from graph.checkpoint.retention import restore_if_archived
+from utils.sse import format_sse, ChatStreamEncoder
+from utils.cache import cache_stats
+from utils.telemetry import render_prometheus, PROMETHEUS_CONTENT_TYPE
+from graph.tools.order_progress import progress_hub
+from graph.tools.summary_schedule import summary_scheduler
+from graph.tools.google_tools import rank_restaurants
+from sql.menu_catalog import menu_catalog
+from sql.session import db_pool_stats
+from config import LOG_LEVEL, CHAT_STREAM_TOKENS
+
+logging.basicConfig(level=LOG_LEVEL.upper(), format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+# 同步工具 (Google Maps / Forms) 會在 executor 中執行，預設的執行緒數量太少，撐不住大量並行串流。
+ASGI_IO_THREADS = int(os.environ.get("ASGI_IO_THREADS", "64"))
+
+_graph = None
+_saver = None
+_init_lock = asyncio.Lock()
+
+
+async def get_graph():
+    """
+    延遲建立已編譯的 graph (第一次請求或 lifespan startup 時)。
+    checkpointer 與 Flask 版本相同 (build_checkpointer)，非同步方法在 executor 中執行。
+    """
+    global _graph, _saver
+    if _graph is not None:
+        return _graph
+    async with _init_lock:
+        if _graph is None:
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=ASGI_IO_THREADS))
+            _saver = build_checkpointer()
+            _graph = workflow.compile(checkpointer=_saver)
+            logging.info(f"Async graph compiled with {type(_saver).__name__}")
+    return _graph
+
+
+async def close_graph():
+    global _graph, _saver
+    if _saver is not None and hasattr(_saver, "close"):
+        await asyncio.get_running_loop().run_in_executor(None, _saver.close)
+    _graph = None
+    _saver = None
+
+
+# --- ASGI helpers ---
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-headers", b"Content-Type"),
+    (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+]
+
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _send_json(send, payload, status=200):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), *CORS_HEADERS],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_text(send, text, status=200, content_type="text/plain; charset=utf-8"):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode("latin-1")), *CORS_HEADERS],
+    })
+    await send({"type": "http.response.body", "body": text.encode("utf-8")})
+
+
+async def _wait_disconnect(receive) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+# --- API Routes ---
+async def chat(receive, send):
+    """
+    Main endpoint for interacting with the agent.
+    Handles conversation state and streams responses.
+    """
+    try:
+        data = json.loads(await _read_body(receive) or b"{}")
+    except ValueError:
+        await _send_json(send, {"error": "Invalid JSON body."}, status=400)
+        return
+    human_input = data.get("message")
+    thread_id = data.get("thread_id")
+    stream_tokens = bool(data.get("stream_tokens", CHAT_STREAM_TOKENS))
+    logging.info(f"Received request for thread_id: {thread_id} with message: {human_input}")
+
+    # If no thread_id is provided, start a new conversation
+    if not thread_id:
+        thread_id = str(uuid.uuid4())
+        logging.info(f"New conversation started with thread_id: {thread_id}")
+    else:
+        # 已封存到冷儲存的對話先還原
+        graph = await get_graph()
+        await asyncio.get_running_loop().run_in_executor(None, restore_if_archived, graph.checkpointer, thread_id)
+
+    config = {"configurable": {"thread_id": thread_id}}
+    inputs = {"messages": [HumanMessage(content=human_input)]}
+
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            *CORS_HEADERS,
+        ],
+    })
+
+    async def emit(chunk: str):
+        await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+
+    encoder = ChatStreamEncoder(thread_id, stream_tokens=stream_tokens)
+    try:
+        graph = await get_graph()
+        async for chunk in graph.astream(inputs, config, stream_mode=encoder.stream_mode):
+            for sse_event in encoder.encode(chunk):
+                await emit(sse_event)
+
+        await emit(encoder.end())
+
+    except Exception as e:
+        logging.error(f"Error during stream for thread_id {thread_id}: {e}", exc_info=True)
+        await emit(encoder.error(e))
+
+    await send({"type": "http.response.body", "body": b""})
+
+
+ORDER_ROUTE_RE = re.compile(r"^/api/orders/(?P<order_id>[^/]+)/(?P<action>progress|progress/stream|notify)$")
+_ORDER_NOT_FOUND = {"error": "Order not found or has no response sheet."}
+SUMMARY_TASK_RE = re.compile(r"^/api/summary-tasks/(?P<schedule_id>[^/]+)$")
+THREAD_SUMMARY_TASKS_RE = re.compile(r"^/api/threads/(?P<thread_id>[^/]+)/summary-tasks$")
+
+
+async def order_progress(order_id, send):
+    """回傳訂單目前各品項的份數 (由共用的增量統計提供，不會觸發整張表的讀取)。"""
+    snapshot = await asyncio.get_running_loop().run_in_executor(None, progress_hub.snapshot, order_id)
+    if snapshot is None:
+        await _send_json(send, _ORDER_NOT_FOUND, status=404)
+    else:
+        await _send_json(send, snapshot)
+
+
+async def order_progress_stream(order_id, receive, send):
+    """以 SSE 推送訂單進度，每次有新回覆時送出一次最新的統計。"""
+    loop = asyncio.get_running_loop()
+    updates: asyncio.Queue = asyncio.Queue()
+    unsubscribe = await loop.run_in_executor(
+        None, progress_hub.subscribe, order_id,
+        lambda snapshot: loop.call_soon_threadsafe(updates.put_nowait, snapshot),
+    )
+    if unsubscribe is None:
+        await _send_json(send, _ORDER_NOT_FOUND, status=404)
+        return
+
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            *CORS_HEADERS,
+        ],
+    })
+
+    async def emit(chunk: str):
+        await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        while not disconnected.done():
+            update = asyncio.ensure_future(updates.get())
+            done, _ = await asyncio.wait({update, disconnected}, timeout=15, return_when=asyncio.FIRST_COMPLETED)
+            if update not in done:
+                update.cancel()
+                if not disconnected.done():
+                    await emit(": keep-alive\n\n")
+                continue
+            snapshot = update.result()
+            await emit(format_sse(snapshot))
+            if snapshot.get("final"):
+                break
+    finally:
+        disconnected.cancel()
+        unsubscribe()
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def summary_task(schedule_id, send):
+    """回傳截止統計排程的狀態 (pending / running / done / failed / replaced)。"""
+    record = await asyncio.get_running_loop().run_in_executor(None, summary_scheduler.get, schedule_id)
+    if record is None:
+        await _send_json(send, {"error": "Scheduled summary not found."}, status=404)
+    else:
+        await _send_json(send, record)
+
+
+async def app(scope, receive, send):
+    """ASGI 進入點。"""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await get_graph()
+                # 本機菜單目錄載入行程內的快取 (同步的資料庫查詢，在 executor 中執行)
+                await asyncio.get_running_loop().run_in_executor(None, menu_catalog.warm)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await close_graph()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] != "http":
+        return
+
+    method, path = scope["method"], scope["path"]
+    if method == "OPTIONS":
+        await _send_text(send, "")
+    elif path == "/" and method == "GET":
+        await _send_text(send, "Welcome to the Smart Food Ordering Agent API!")
+    elif path == "/health" and method == "GET":
+        await _send_json(send, {"status": "ok"})
+    elif path == "/api/cache/stats" and method == "GET":
+        await _send_json(send, cache_stats())
+    elif path == "/metrics" and method == "GET":
+        await _send_text(send, render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+    elif path == "/api/db/pool" and method == "GET":
+        await _send_json(send, db_pool_stats())
+    elif path == "/api/chat" and method == "POST":
+        await chat(receive, send)
+    elif path == "/api/restaurants/rank" and method == "GET":
+        # 候選池不在快取中時會查 Maps 快取與資料庫，放到 executor 執行
+        params = dict(parse_qsl(scope.get("query_string", b"").decode("utf-8")))
+        payload, status = await asyncio.get_running_loop().run_in_executor(None, rank_restaurants, params)
+        await _send_json(send, payload, status=status)
+    elif (match := SUMMARY_TASK_RE.match(path)) and method == "GET":
+        await summary_task(match.group("schedule_id"), send)
+    elif (match := THREAD_SUMMARY_TASKS_RE.match(path)) and method == "GET":
+        records = await asyncio.get_running_loop().run_in_executor(
+            None, summary_scheduler.for_thread, match.group("thread_id"))
+        await _send_json(send, records)
+    elif match := ORDER_ROUTE_RE.match(path):
+        order_id, action = match.group("order_id"), match.group("action")
+        if action == "progress" and method == "GET":
+            await order_progress(order_id, send)
+        elif action == "progress/stream" and method == "GET":
+            await order_progress_stream(order_id, receive, send)
+        elif action == "notify" and method == "POST":
+            # Forms watch 通知的接收端：有新回覆時立即更新該訂單的進度
+            await _send_json(send, {"accepted": progress_hub.notify(order_id)}, status=202)
+        else:
+            await _send_json(send, {"error": "Not found"}, status=404)
+    else:
+        await _send_json(send, {"error": "Not found"}, status=404)
@@ -0,0 +1,98 @@
+# benchmarks/chat_load_test.py
+"""
+ASGI 聊天端點的壓測腳本。
+
+LLM 與 Google Maps 以 benchmarks.fakes 中的本機假服務取代，
+在同一個 process 內直接呼叫 ASGI app，同時開啟大量 /api/chat 串流，
+量測首個位元組時間 (TTFB)、完整回應時間與吞吐量。
+
+用法：
+    python -m benchmarks.chat_load_test --concurrency 300 --llm-latency 0.5
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import install_fakes
+
+
+async def run_chat(app, message: str, thread_id: str) -> dict:
+    """模擬一個客戶端呼叫 /api/chat 並讀完整個 SSE 串流。"""
+    body = json.dumps({"message": message, "thread_id": thread_id}).encode("utf-8")
+    scope = {"type": "http", "method": "POST", "path": "/api/chat", "headers": []}
+    received = False
+    start = time.perf_counter()
+    result = {"ttfb": None, "events": []}
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            if result["ttfb"] is None:
+                result["ttfb"] = time.perf_counter() - start
+            for line in message["body"].decode("utf-8").splitlines():
+                if line.startswith("data: "):
+                    result["events"].append(json.loads(line[6:]))
+
+    await app(scope, receive, send)
+    result["total"] = time.perf_counter() - start
+    return result
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+async def main(args):
+    os.environ["CHECKPOINT_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "loadtest.sqlite")
+    fakes = install_fakes(llm_latency=args.llm_latency, maps_latency=args.maps_latency)
+
+    import asgi_app
+    logging.getLogger().setLevel(args.log_level)
+
+    messages = ["你好", "我想找南港軟體園區附近的飲料店"]
+    await asgi_app.get_graph()
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[
+        run_chat(asgi_app.app, messages[i % len(messages)], f"load-test-{i}")
+        for i in range(args.concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+    await asgi_app.close_graph()
+
+    errors = sum(1 for r in results if any(e.get("type") == "error" for e in r["events"]))
+    totals = [r["total"] for r in results]
+    ttfbs = [r["ttfb"] for r in results if r["ttfb"] is not None]
+
+    print(f"concurrent streams : {args.concurrency}")
+    print(f"wall time          : {elapsed:.2f}s")
+    print(f"throughput         : {args.concurrency / elapsed:.1f} chats/s")
+    print(f"errors             : {errors}")
+    print(f"ttfb  p50/p95      : {statistics.median(ttfbs):.3f}s / {_percentile(ttfbs, 0.95):.3f}s")
+    print(f"total p50/p95/max  : {statistics.median(totals):.3f}s / {_percentile(totals, 0.95):.3f}s / {max(totals):.3f}s")
+    print(f"fake maps calls    : {fakes['maps'].calls}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test for the ASGI chat endpoint.")
+    parser.add_argument("--concurrency", type=int, default=300)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--maps-latency", type=float, default=0.3)
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,148 @@
+# benchmarks/checkpoint_benchmark.py
+"""
+Checkpointer 的寫入/讀取延遲與對話長度的關係。
+
+以兩個節點的小 graph 模擬對話 (每輪附加一則使用者訊息與一則回覆，共寫入 3 個 checkpoint)，
+比較原本的 SqliteSaver、BatchedSqliteSaver 與 RedisSaver (有指定 --redis-url 且可連線時)：
+- 對話長度到達每個量測點時，最近幾輪 invoke 的平均時間 (含讀取最新狀態與寫入 checkpoint)
+- 直接讀取最新 checkpoint (get_tuple) 的時間
+- 寫入的資料量 (SQLite 檔案大小)
+- 多個對話並行時每秒可完成的輪數 (批次寫入的效果)
+
+用法：
+    python -m benchmarks.checkpoint_benchmark --turns 400 --concurrency 16
+    python -m benchmarks.checkpoint_benchmark --redis-url redis://localhost:6379/15
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import operator
+import tempfile
+import threading
+from typing import Annotated, Any, TypedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.graph import StateGraph, START, END
+
+from graph.checkpoint import BatchedSqliteSaver, RedisSaver
+
+TEXT = "想訂週五下午茶，大約十五個人，預算每人一百五十元，希望可以外送到公司。" * 4
+
+
+class BenchState(TypedDict):
+    messages: Annotated[list[Any], operator.add]
+    food_type: str | None
+
+
+def think(state: BenchState) -> dict:
+    return {"food_type": f"下午茶 {len(state['messages'])}"}
+
+
+def reply(state: BenchState) -> dict:
+    return {"messages": [AIMessage(content=TEXT)]}
+
+
+def build_graph(saver):
+    workflow = StateGraph(BenchState)
+    workflow.add_node("think", think)
+    workflow.add_node("reply", reply)
+    workflow.add_edge(START, "think")
+    workflow.add_edge("think", "reply")
+    workflow.add_edge("reply", END)
+    return workflow.compile(checkpointer=saver)
+
+
+def _file_size(path: str | None) -> int:
+    if not path:
+        return 0
+    return sum(os.path.getsize(p) for p in (path, f"{path}-wal") if os.path.exists(p))
+
+
+def measure_growth(name: str, saver, path: str | None, turns: int, checkpoints: list[int], window: int) -> None:
+    graph = build_graph(saver)
+    config = {"configurable": {"thread_id": f"growth-{name}"}}
+    durations = []
+    print(f"\n[{name}]")
+    print(f"{'turns':>6} {'messages':>9} {'invoke ms':>10} {'get_tuple ms':>13} {'size KB':>9}")
+    for turn in range(1, turns + 1):
+        start = time.perf_counter()
+        graph.invoke({"messages": [HumanMessage(content=TEXT)]}, config)
+        durations.append(time.perf_counter() - start)
+        if turn in checkpoints:
+            start = time.perf_counter()
+            for _ in range(10):
+                latest = saver.get_tuple(config)
+            read_ms = (time.perf_counter() - start) / 10 * 1000
+            invoke_ms = sum(durations[-window:]) / len(durations[-window:]) * 1000
+            messages = len(latest.checkpoint["channel_values"]["messages"])
+            print(f"{turn:>6} {messages:>9} {invoke_ms:>10.2f} {read_ms:>13.2f} {_file_size(path) / 1024:>9.0f}")
+
+
+def measure_concurrency(name: str, saver, concurrency: int, turns: int) -> float:
+    graph = build_graph(saver)
+
+    def converse(i: int):
+        config = {"configurable": {"thread_id": f"concurrent-{name}-{i}"}}
+        for _ in range(turns):
+            graph.invoke({"messages": [HumanMessage(content=TEXT)]}, config)
+
+    threads = [threading.Thread(target=converse, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if hasattr(saver, "flush"):
+        saver.flush()
+    elapsed = time.perf_counter() - start
+    rate = concurrency * turns / elapsed
+    print(f"[{name}] {concurrency} concurrent conversations x {turns} turns: {rate:.0f} turns/s")
+    return rate
+
+
+def make_savers(directory: str, redis_url: str | None):
+    legacy_path = os.path.join(directory, "legacy.sqlite")
+    yield "SqliteSaver", SqliteSaver(sqlite3.connect(legacy_path, check_same_thread=False)), legacy_path
+
+    batched_path = os.path.join(directory, "batched.sqlite")
+    yield "BatchedSqliteSaver", BatchedSqliteSaver(batched_path), batched_path
+
+    if redis_url:
+        saver = RedisSaver(redis_url, prefix=f"checkpoint-bench-{os.getpid()}")
+        try:
+            saver.ping()
+        except Exception as e:
+            print(f"\nSkipping RedisSaver: cannot connect to {redis_url} ({e})")
+            return
+        yield "RedisSaver", saver, None
+        for thread_id, _ in saver.list_threads():
+            saver.delete_thread(thread_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checkpointer latency vs. thread length benchmark.")
+    parser.add_argument("--turns", type=int, default=400)
+    parser.add_argument("--checkpoints", type=int, nargs="+", default=[10, 50, 100, 200, 400])
+    parser.add_argument("--window", type=int, default=10, help="average invoke time over the last N turns")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--concurrent-turns", type=int, default=20)
+    parser.add_argument("--redis-url", default=None, help="run RedisSaver too (uses a throwaway key prefix)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, saver, path in make_savers(directory, args.redis_url):
+            measure_growth(name, saver, path, args.turns, set(args.checkpoints), args.window)
+            measure_concurrency(name, saver, args.concurrency, args.concurrent_turns)
+            if hasattr(saver, "stats"):
+                print(f"[{name}] {saver.stats()}")
+            if isinstance(saver, BatchedSqliteSaver):
+                saver.close()
+
+
+if __name__ == "__main__":
+    main()
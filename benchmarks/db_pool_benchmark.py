@@ -0,0 +1,85 @@
+# benchmarks/db_pool_benchmark.py
+"""
+資料庫連線池大小與 SQLite WAL 的影響。
+
+以多個執行緒模擬並行的 Flask request / Celery task，每個工作在 session_scope 中讀取一筆訂單、
+更新一筆訂單並 commit，比較不同 pool_size 下取得連線的等待時間、飽和度與吞吐量，
+以及關閉 WAL 時 "database is locked" 的錯誤數。
+
+用法：
+    python -m benchmarks.db_pool_benchmark --workers 32 --jobs 2000
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from sql.engine import build_engine, pool_stats
+from sql.models.model import Base, GroupOrder
+from sql.session import session_scope
+
+ORDERS = 1000
+
+
+def run(path: str, workers: int, jobs: int, pool_size: int, max_overflow: int, wal: bool, work_ms: float) -> dict:
+    engine = build_engine(f"sqlite:///{path}", sqlite_wal=wal, pool_size=pool_size, max_overflow=max_overflow,
+                          pool_timeout=10)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(GroupOrder.__table__.delete())
+        conn.execute(insert(GroupOrder), [
+            {"id": f"o{i}", "restaurant_name": "餐廳", "deadline": datetime.now() + timedelta(hours=1), "status": "open"}
+            for i in range(ORDERS)
+        ])
+    Session = sessionmaker(bind=engine)
+    errors = 0
+
+    def job(i: int):
+        nonlocal errors
+        try:
+            with session_scope(Session) as db:
+                db.execute(select(GroupOrder.status).where(GroupOrder.id == f"o{i % ORDERS}")).first()
+                # 模擬在交易中做其他事 (解析、組訊息…)
+                time.sleep(work_ms / 1000)
+                db.execute(update(GroupOrder).where(GroupOrder.id == f"o{(i * 7) % ORDERS}").values(status="open"))
+        except OperationalError:
+            errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(job, range(jobs)))
+    elapsed = time.perf_counter() - start
+    stats = pool_stats(engine)
+    engine.dispose()
+    return {"elapsed": elapsed, "errors": errors, **stats}
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"workers / jobs : {args.workers} / {args.jobs}")
+        for wal in (False, True):
+            for pool_size in args.pool_sizes:
+                path = os.path.join(tmp, f"pool-{int(wal)}-{pool_size}.sqlite")
+                r = run(path, args.workers, args.jobs, pool_size, 0, wal, args.work_ms)
+                print(f"wal={str(wal):5s} pool_size={pool_size:3d}: {args.jobs / r['elapsed']:7.0f} jobs/s, "
+                      f"locked errors {r['errors']:4d}, wait avg {r['checkout_wait_avg_ms']:7.2f} ms / "
+                      f"max {r['checkout_wait_max_ms']:8.2f} ms, peak saturation {r['peak_saturation']:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Database pool sizing benchmark.")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[4, 16, 32])
+    parser.add_argument("--work-ms", type=float, default=1.0)
+    main(parser.parse_args())
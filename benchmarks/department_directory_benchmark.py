@@ -0,0 +1,109 @@
+# benchmarks/department_directory_benchmark.py
+"""
+部門 Email 查詢：原本的 Department + department.users (N+1 / lazy load) vs. sql.department_directory。
+
+在 SQLite 中建立一個 2,000 人的部門 (及其他部門)，統計每次通知需要的 SQL 查詢數與耗時，
+並確認新增/批次修改 User 後快取會失效。
+
+用法：
+    python -m benchmarks.department_directory_benchmark --members 2000 --notifications 50
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, event, insert, update
+from sqlalchemy.orm import sessionmaker
+
+from sql.models.model import Base, Department, User
+from sql.migrations import run_migrations
+from sql.department_directory import DepartmentDirectory
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def seed(engine, members: int, departments: int) -> None:
+    with engine.begin() as conn:
+        conn.execute(insert(Department), [{"id": f"d{i}", "name": f"部門{i}"} for i in range(departments)])
+        conn.execute(insert(User), [
+            {"id": f"u{i}", "name": f"同事{i}", "email": f"user{i}@example.com",
+             "department_id": "d0" if i < members else f"d{1 + i % (departments - 1)}"}
+            for i in range(members * 3)
+        ])
+
+
+def legacy_emails(Session, name: str) -> list[str]:
+    """原本 get_department_emails_tool 的寫法。"""
+    db = Session()
+    try:
+        department = db.query(Department).filter(Department.name == name).first()
+        return [user.email for user in department.users]
+    finally:
+        db.close()
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'directory.sqlite')}")
+        Base.metadata.create_all(engine)
+        run_migrations(engine)
+        seed(engine, args.members, args.departments)
+        Session = sessionmaker(bind=engine)
+        counter = QueryCounter(engine)
+        directory = DepartmentDirectory(session_factory=Session)
+
+        counter.count = 0
+        start = time.perf_counter()
+        for _ in range(args.notifications):
+            expected = legacy_emails(Session, "部門0")
+        legacy_time, legacy_queries = time.perf_counter() - start, counter.count
+
+        counter.count = 0
+        start = time.perf_counter()
+        for _ in range(args.notifications):
+            emails = directory.emails_for("部門0")
+        directory_time, directory_queries = time.perf_counter() - start, counter.count
+        assert sorted(emails) == sorted(expected) and len(emails) == args.members
+
+        counter.count = 0
+        names = [f"部門{i}" for i in range(args.departments)]
+        directory.invalidate()
+        bulk = directory.emails_for_many(names + ["不存在的部門"])
+        bulk_queries = counter.count
+        assert len(bulk) == args.departments and "不存在的部門" not in bulk
+
+        # 寫入後失效：ORM 新增一位成員、批次把一位成員移到別的部門
+        db = Session()
+        db.add(User(id="new", name="新同事", email="new@example.com", department_id="d0"))
+        db.commit()
+        assert "new@example.com" in directory.emails_for("部門0")
+        db.execute(update(User).where(User.id == "u0").values(department_id="d1"))
+        db.commit()
+        db.close()
+        assert "user0@example.com" not in directory.emails_for("部門0")
+
+    print(f"department members / notifications : {args.members} / {args.notifications}")
+    print(f"legacy Department + users          : {legacy_queries} queries, {legacy_time * 1000:.1f} ms")
+    print(f"department directory               : {directory_queries} queries, {directory_time * 1000:.1f} ms")
+    print(f"bulk lookup of {args.departments} departments       : {bulk_queries} query")
+    print(f"invalidation after writes          : ok ({directory.stats()})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Department directory benchmark.")
+    parser.add_argument("--members", type=int, default=2000)
+    parser.add_argument("--departments", type=int, default=20)
+    parser.add_argument("--notifications", type=int, default=50)
+    main(parser.parse_args())
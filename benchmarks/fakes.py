@@ -0,0 +1,235 @@
+# benchmarks/fakes.py
+"""
+本機假服務，讓 benchmark / 壓測腳本可以在不連線 Azure OpenAI 與 Google API 的情況下執行。
+
+使用方式：在匯入 graph 之前呼叫 install_fakes()。
+"""
+import os
+import re
+import json
+import time
+import asyncio
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from utils.tokens import estimate_tokens
+
+
+def fake_extract(user_input: str) -> dict:
+    """以關鍵字模擬 LLM 的狀態擷取結果。"""
+    extracted = {}
+    if "飲料" in user_input:
+        extracted.update({"location": "南港軟體園區", "food_type": "飲料"})
+    if "我選" in user_input:
+        extracted["selected_restaurant"] = user_input.split(":", 1)[-1].strip()
+    if match := re.search(r"主題是([^，,]+)", user_input):
+        extracted["title"] = match.group(1)
+    if match := re.search(r"(今天|明天)\S*?點", user_input):
+        extracted["deadline"] = match.group(0)
+    if match := re.search(r"[\w.+-]+@[\w-]+\.[\w.]+", user_input):
+        extracted["organizer_email"] = match.group(0)
+    return extracted
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    模擬 LLM 延遲與 token 用量的假聊天模型。
+    狀態擷取 / 融合模式的 prompt 回傳 JSON，其餘 prompt 回傳固定的引導句。
+    延遲 = latency + 每個輸出 token 的 per_token_latency。
+    有串流 callback (graph 的 stream_mode="messages") 時以 _stream 逐段輸出：第一段在 latency 後送出，
+    之後每段間隔該段 token 數 x per_token_latency，最後一段附上 token 用量。
+    """
+    stream_piece_chars: int = 4
+    latency: float = 0.5
+    per_token_latency: float = 0.0
+    reply: str = "請問您想在哪裡訂餐，想吃什麼呢？"
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _respond(self, messages) -> str:
+        prompt = messages[-1].content if messages else ""
+        user_input = prompt.rsplit("使用者的一句話:", 1)[-1].split("\n", 1)[0].strip().strip('"')
+        if '"reply"' in prompt:
+            return json.dumps({"extracted": fake_extract(user_input), "reply": self.reply}, ensure_ascii=False)
+        if "提取資訊" in prompt:
+            return json.dumps(fake_extract(user_input), ensure_ascii=False)
+        return self.reply
+
+    def _result(self, messages) -> tuple[ChatResult, float]:
+        content = self._respond(messages)
+        prompt_tokens = sum(estimate_tokens(m.content) for m in messages)
+        completion_tokens = estimate_tokens(content)
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        message = AIMessage(content=content, usage_metadata={
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        })
+        delay = self.latency + completion_tokens * self.per_token_latency
+        return ChatResult(generations=[ChatGeneration(message=message)]), delay
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        result, delay = self._result(messages)
+        time.sleep(delay)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        result, delay = self._result(messages)
+        await asyncio.sleep(delay)
+        return result
+
+    def _pieces(self, messages) -> list[tuple[ChatGenerationChunk, float]]:
+        result, _ = self._result(messages)
+        message = result.generations[0].message
+        content = message.content
+        size = self.stream_piece_chars
+        pieces = [content[i:i + size] for i in range(0, len(content), size)] or [""]
+        chunks = []
+        for i, piece in enumerate(pieces):
+            usage = message.usage_metadata if i == len(pieces) - 1 else None
+            delay = (self.latency if i == 0 else 0.0) + estimate_tokens(piece) * self.per_token_latency
+            chunks.append((ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage)), delay))
+        return chunks
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        for chunk, delay in self._pieces(messages):
+            time.sleep(delay)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        for chunk, delay in self._pieces(messages):
+            await asyncio.sleep(delay)
+            yield chunk
+
+
+class FakeMapsClient:
+    """模擬 googlemaps.Client.places 的假客戶端。"""
+
+    def __init__(self, latency: float = 0.3, n_results: int = 8):
+        self.latency = latency
+        self.n_results = n_results
+        self.calls = 0
+
+    def places(self, query, language=None, location=None, radius=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return {"results": [
+            {
+                "name": f"{query} 店家 {i}",
+                "rating": 3.5 + (i % 4) * 0.4,
+                "user_ratings_total": 10 + (i * 37) % 500,
+                "price_level": 1 + i % 3,
+                "vicinity": f"台北市南港區園區街 {i} 號",
+                "place_id": f"fake-place-{i}",
+                "types": ["cafe", "food", "establishment"],
+                "geometry": {"location": {"lat": 25.0553 + i * 0.001, "lng": 121.6134 - i * 0.001}},
+            }
+            for i in range(self.n_results)
+        ]}
+
+
+class FakeSpreadsheet:
+    """
+    模擬 gspread.Spreadsheet 的假試算表，只實作增量讀取用到的 API。
+    每次修改都會更新 revision (對應 Drive 的 modifiedTime)，並記錄請求數與傳輸的儲存格數。
+    """
+    _RANGE_RE = re.compile(r"^(?:'?(?P<sheet>.*?)'?!)?(?:[A-Z]+)?(?P<start>\d+):(?:[A-Z]+)?(?P<end>\d+)?$")
+
+    def __init__(self, sheet_id: str, header: list[str], title: str = "表單回應 1",
+                 latency: float = 0.0, per_cell_latency: float = 0.0):
+        self.id = sheet_id
+        self.latency = latency
+        self.per_cell_latency = per_cell_latency
+        self.sheet1 = type("FakeWorksheet", (), {"title": title})()
+        self.values = [list(header)]
+        self.revision = 0
+        self.requests = 0
+        self.cells_transferred = 0
+
+    # --- 測試端操作 ---
+    def append_rows(self, rows: list[list[Any]]) -> None:
+        self.values.extend([str(v) for v in row] for row in rows)
+        self.revision += 1
+
+    def update_row(self, row_number: int, row: list[Any]) -> None:
+        self.values[row_number - 1] = [str(v) for v in row]
+        self.revision += 1
+
+    # --- gspread 相容 API ---
+    def _request(self, cells: int = 0) -> None:
+        self.requests += 1
+        self.cells_transferred += cells
+        time.sleep(self.latency + cells * self.per_cell_latency)
+
+    def get_lastUpdateTime(self) -> str:
+        self._request()
+        return f"rev-{self.revision}"
+
+    def _slice(self, a1_range: str) -> dict:
+        match = self._RANGE_RE.match(a1_range)
+        if not match:
+            raise ValueError(f"Unsupported range: {a1_range}")
+        start = int(match.group("start"))
+        end = int(match.group("end")) if match.group("end") else len(self.values)
+        rows = [list(r) for r in self.values[start - 1:end]]
+        return {"range": a1_range, "values": rows} if rows else {"range": a1_range}
+
+    def values_get(self, range: str, params=None) -> dict:
+        result = self._slice(range)
+        self._request(sum(len(r) for r in result.get("values", [])))
+        return result
+
+    def values_batch_get(self, ranges: list[str], params=None) -> dict:
+        results = [self._slice(r) for r in ranges]
+        self._request(sum(len(r) for result in results for r in result.get("values", [])))
+        return {"valueRanges": results}
+
+    def get_all_records(self) -> list[dict]:
+        """對照組：與 worksheet.get_all_records() 一樣每次下載整張表。"""
+        self._request(sum(len(r) for r in self.values))
+        header = self.values[0]
+        return [dict(zip(header, row + [""] * (len(header) - len(row)))) for row in self.values[1:]]
+
+
+class FakeSheetsClient:
+    """模擬 gspread.Client.open_by_key 的假客戶端。"""
+
+    def __init__(self):
+        self.spreadsheets: dict[str, FakeSpreadsheet] = {}
+
+    def add(self, spreadsheet: FakeSpreadsheet) -> FakeSpreadsheet:
+        self.spreadsheets[spreadsheet.id] = spreadsheet
+        return spreadsheet
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        return self.spreadsheets[key]
+
+
+def install_fakes(llm_latency: float = 0.5, maps_latency: float = 0.3, per_token_latency: float = 0.0) -> dict:
+    """
+    以假服務取代 graph 使用的 LLM 與 Google Maps client。
+    回傳建立好的假物件，方便呼叫端讀取呼叫次數等統計。
+    """
+    # utils.llm_config 在匯入時會檢查金鑰，這裡提供假的設定讓匯入成功 (不會真的連線)。
+    os.environ.setdefault("AZURE_OPENAI_API_KEY", "fake-key")
+    os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://fake.openai.azure.com")
+    os.environ.setdefault("OPENAI_API_VERSION", "2024-07-01-preview")
+
+    import graph.nodes as nodes
+    import graph.tools.google_tools as google_tools
+
+    fake_llm = FakeChatModel(latency=llm_latency, per_token_latency=per_token_latency)
+    fake_maps = FakeMapsClient(latency=maps_latency)
+    nodes.get_llm = lambda: fake_llm
+    google_tools.get_gmaps_client = lambda: fake_maps
+    return {"llm": fake_llm, "maps": fake_maps}
@@ -0,0 +1,79 @@
+# benchmarks/fused_turn_benchmark.py
+"""
+比較「兩段式」(update_state + call_model) 與「融合模式」(FUSED_TURN_MODE) 的每輪延遲與 token 用量。
+
+LLM 以 benchmarks.fakes.FakeChatModel 模擬：固定延遲 + 每個輸出 token 的延遲，
+token 數以 utils.tokens.estimate_tokens 計算。
+
+用法：
+    python -m benchmarks.fused_turn_benchmark --conversations 5 --llm-latency 0.3
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import install_fakes
+
+SCRIPT = [
+    "你好",
+    "我想找南港軟體園區附近的飲料店",
+    "我選這家: 50嵐 南港園區店",
+    "主題是部門下午茶",
+    "今天五點收單",
+]
+
+
+def run_mode(fused: bool, conversations: int, fakes: dict) -> dict:
+    from langchain_core.messages import HumanMessage
+    from langgraph.checkpoint.memory import MemorySaver
+    import graph.nodes as nodes
+    from graph.graph import workflow
+
+    nodes.FUSED_TURN_MODE = fused
+    graph = workflow.compile(checkpointer=MemorySaver())
+    llm = fakes["llm"]
+    llm.calls = llm.prompt_tokens = llm.completion_tokens = 0
+
+    latencies = []
+    for c in range(conversations):
+        config = {"configurable": {"thread_id": f"bench-{fused}-{c}"}}
+        for text in SCRIPT:
+            start = time.perf_counter()
+            graph.invoke({"messages": [HumanMessage(content=text)]}, config)
+            latencies.append(time.perf_counter() - start)
+
+    turns = len(latencies)
+    return {
+        "turns": turns,
+        "latency_mean": statistics.mean(latencies),
+        "latency_p95": sorted(latencies)[int(turns * 0.95) - 1],
+        "llm_calls": llm.calls / turns,
+        "prompt_tokens": llm.prompt_tokens / turns,
+        "completion_tokens": llm.completion_tokens / turns,
+    }
+
+
+def main(args):
+    fakes = install_fakes(llm_latency=args.llm_latency, maps_latency=0.0, per_token_latency=args.per_token_latency)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = {"two-call": run_mode(False, args.conversations, fakes),
+               "fused": run_mode(True, args.conversations, fakes)}
+
+    print(f"{'mode':<10} {'turns':>6} {'mean(s)':>9} {'p95(s)':>8} {'calls/turn':>11} {'prompt tok':>11} {'compl tok':>10}")
+    for mode, r in results.items():
+        print(f"{mode:<10} {r['turns']:>6} {r['latency_mean']:>9.3f} {r['latency_p95']:>8.3f} "
+              f"{r['llm_calls']:>11.2f} {r['prompt_tokens']:>11.1f} {r['completion_tokens']:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-turn latency/token benchmark: two-call vs fused mode.")
+    parser.add_argument("--conversations", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--per-token-latency", type=float, default=0.002)
+    main(parser.parse_args())
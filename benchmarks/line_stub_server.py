@@ -0,0 +1,118 @@
+# benchmarks/line_stub_server.py
+"""
+本機的 LINE Messaging API 假伺服器，記錄收到的 push / multicast / broadcast 請求。
+
+可搭配 LINE_API_HOST 環境變數讓 get_line_notifier() 指向它，
+或直接執行本檔比較「每則訊息一次 push」與 LineNotifier 合併推播的請求數：
+    python -m benchmarks.line_stub_server --orders 40 --users 1200
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_ENDPOINTS = {
+    "/v2/bot/message/push": "push",
+    "/v2/bot/message/multicast": "multicast",
+    "/v2/bot/message/broadcast": "broadcast",
+}
+
+
+class LineStubServer:
+    """在背景執行緒中執行的 LINE API 假伺服器。"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.requests: list[tuple[str, dict]] = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                kind = _ENDPOINTS.get(self.path)
+                if kind is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                if latency:
+                    time.sleep(latency)
+                with stub._lock:
+                    stub.requests.append((kind, body))
+                sent = [{"id": str(len(stub.requests)), "quoteToken": "stub"} for _ in body.get("messages", [])]
+                payload = json.dumps({"sentMessages": sent} if kind == "push" else {}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.send_header("x-line-request-id", "stub")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, kind: str) -> int:
+        return sum(1 for k, _ in self.requests if k == kind)
+
+    def start(self) -> "LineStubServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main(args):
+    from linebot.v3.messaging import Configuration, ApiClient, MessagingApi, PushMessageRequest, TextMessage
+    from graph.tools.line_notifier import LineNotifier
+
+    stub = LineStubServer(latency=args.latency).start()
+    configuration = Configuration(host=stub.url, access_token="stub-token")
+    try:
+        messages = [f"📊 訂單 {i} 統計完成" for i in range(args.orders)]
+
+        # 原本的寫法：每則訊息開一個 ApiClient、推播一次
+        start = time.perf_counter()
+        for text in messages:
+            with ApiClient(configuration) as api_client:
+                MessagingApi(api_client).push_message(PushMessageRequest(to="U-admin", messages=[TextMessage(text=text)]))
+        naive = time.perf_counter() - start
+        naive_requests = len(stub.requests)
+
+        stub.requests.clear()
+        notifier = LineNotifier(configuration)
+        start = time.perf_counter()
+        for text in messages:
+            notifier.enqueue("U-admin", text)
+        notifier.flush()
+        notifier.multicast([f"U{i}" for i in range(args.users)], ["🔔 訂單即將截止"])
+        coalesced = time.perf_counter() - start
+        notifier.close()
+
+        print(f"naive push      : {naive_requests} requests in {naive:.3f}s")
+        print(f"coalesced push  : {stub.count('push')} requests")
+        print(f"multicast       : {stub.count('multicast')} requests for {args.users} users")
+        print(f"notifier total  : {coalesced:.3f}s")
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LINE API stub server and push coalescing demo.")
+    parser.add_argument("--orders", type=int, default=40)
+    parser.add_argument("--users", type=int, default=1200)
+    parser.add_argument("--latency", type=float, default=0.01)
+    main(parser.parse_args())
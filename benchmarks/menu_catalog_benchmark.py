@@ -0,0 +1,110 @@
+# benchmarks/menu_catalog_benchmark.py
+"""
+本機菜單目錄的匯入與查詢成本。
+
+1. 匯入：隨機產生 N 家店 x M 項餐點的 CSV，以 import_catalog() 寫入暫存的 SQLite (含 FTS5 trigram 索引)，
+   回報讀檔 + 寫入的時間；再匯入一次同一份檔案 (全部是更新) 比較。
+2. 查詢：以「店名 + 分店名」(例如 "某某茶坊 南港園區店") 與不存在的店名解析店家並取出表單選項，比較
+   - fts5：全文索引找候選店家 (第一次解析)
+   - scan：沒有全文索引時在行程內的快照逐一比對
+   - cached：同樣的輸入再查一次 (解析結果的快取)
+   並確認 fts5 與 scan 解析出相同的店家。
+
+用法：
+    python -m benchmarks.menu_catalog_benchmark --restaurants 2000 --items 25 --lookups 500
+"""
+import os
+import csv
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHARS = "春水堂茶坊大苑鮮飲珍珠奶綠紅烏龍青檸檬芒果咖啡豆漿麵食館小吃滷味便當屋港式燒臘川菜日式拉麵丼飯早午餐"
+BRANCHES = ["南港園區店", "信義店", "中山店", "板橋站前店", "內湖旗艦店"]
+ITEMS = ["珍珠奶茶", "四季春", "檸檬紅茶", "烏龍綠", "鮮奶茶", "雞腿便當", "排骨飯", "牛肉麵", "餛飩湯", "燒臘飯"]
+
+
+def synthetic_names(n: int, rng: random.Random) -> list[str]:
+    names = set()
+    while len(names) < n:
+        names.add("".join(rng.choice(CHARS) for _ in range(rng.randint(3, 6))))
+    return sorted(names)
+
+
+def write_csv(path: str, names: list[str], items: int, rng: random.Random) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["restaurant", "item", "price", "category"])
+        for name in names:
+            for i in range(items):
+                writer.writerow([name, f"{rng.choice(ITEMS)} {i}", rng.randint(30, 300), "飲料" if i % 2 else "餐點"])
+
+
+def timed_lookups(catalog, queries: list[str]) -> tuple[list[float], list]:
+    latencies, resolved = [], []
+    for query in queries:
+        start = time.perf_counter()
+        entry = catalog.resolve(query)
+        catalog.form_options(query)
+        latencies.append((time.perf_counter() - start) * 1e6)
+        resolved.append(entry.id if entry else None)
+    return latencies, resolved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Menu catalog import / lookup benchmark.")
+    parser.add_argument("--restaurants", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=25)
+    parser.add_argument("--lookups", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(directory, 'catalog.sqlite')}")
+        from sql.models.model import Base, engine
+        from sql.migrations import run_migrations
+        from sql.menu_catalog import MenuCatalog, import_catalog, read_catalog_file
+
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
+
+        rng = random.Random(11)
+        names = synthetic_names(args.restaurants, rng)
+        path = os.path.join(directory, "menus.csv")
+        write_csv(path, names, args.items, rng)
+
+        for label in ("import (new)", "import (update)"):
+            start = time.perf_counter()
+            result = import_catalog(read_catalog_file(path))
+            print(f"{label:<16} {result['restaurants']:>6} restaurants {result['items']:>8} items "
+                  f"{(time.perf_counter() - start) * 1000:>8.0f} ms")
+
+        queries = [f"{rng.choice(names)} {rng.choice(BRANCHES)}" if rng.random() < 0.8
+                   else f"不存在的店{i}" for i in range(args.lookups)]
+
+        fts = MenuCatalog()
+        start = time.perf_counter()
+        fts.warm()
+        warm_ms = (time.perf_counter() - start) * 1000
+        scan = MenuCatalog()
+        scan.warm()
+        scan._snapshot.search_backend = None
+
+        fts_us, fts_ids = timed_lookups(fts, queries)
+        scan_us, scan_ids = timed_lookups(scan, queries)
+        cached_us, _ = timed_lookups(fts, queries)
+
+        print(f"\nwarm-up: {warm_ms:.0f} ms; lookups: {len(queries)} "
+              f"({sum(i is not None for i in fts_ids)} resolved), same restaurants: {fts_ids == scan_ids}")
+        print(f"{'mode':>8} {'mean us':>9} {'p50 us':>9} {'max us':>9}")
+        for mode, values in (("fts5", fts_us), ("scan", scan_us), ("cached", cached_us)):
+            print(f"{mode:>8} {statistics.mean(values):>9.1f} {statistics.median(values):>9.1f} {max(values):>9.1f}")
+        print(f"\nfts5 stats: {fts.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/node_latency_benchmark.py
+"""
+以 InMemorySpanExporter 拆解每輪對話的時間花在哪個節點。
+
+LLM 與 Google Maps 以 benchmarks.fakes 的假服務模擬 (固定延遲 + token 用量)，跑完腳本後從記憶體中的
+span 統計每個節點 / 工具 / LLM 呼叫的次數、p50 / p95、tokens、外部 API 呼叫與快取命中，
+並驗證 /metrics 的輸出包含這些數字；最後在快取暖了之後比較開 / 關追蹤時每輪的延遲，確認包裝本身的成本。
+
+用法：
+    python -m benchmarks.node_latency_benchmark --conversations 5 --llm-latency 0.05 --maps-latency 0.1
+    python -m benchmarks.node_latency_benchmark --async
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import statistics
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import install_fakes
+
+SCRIPT = [
+    "你好",
+    "我想找南港軟體園區附近的飲料店",
+    "我想找南港軟體園區附近的飲料店",
+    "我選這家: 50嵐 南港園區店",
+    "主題是部門下午茶",
+]
+
+
+def run_script(graph, conversations: int, use_async: bool, prefix: str) -> list[float]:
+    from langchain_core.messages import HumanMessage
+
+    async def arun(config, text):
+        return await graph.ainvoke({"messages": [HumanMessage(content=text)]}, config)
+
+    latencies = []
+    for c in range(conversations):
+        config = {"configurable": {"thread_id": f"{prefix}-{c}"}}
+        for text in SCRIPT:
+            start = time.perf_counter()
+            if use_async:
+                asyncio.run(arun(config, text))
+            else:
+                graph.invoke({"messages": [HumanMessage(content=text)]}, config)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def summarize(spans) -> dict:
+    groups = defaultdict(list)
+    for span in spans:
+        groups[span.name].append(span)
+    rows = {}
+    for name, items in sorted(groups.items()):
+        durations = [s.duration * 1000 for s in items]
+        total = defaultdict(float)
+        for s in items:
+            for key, value in s.attributes.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    total[key] += value
+        rows[name] = {"count": len(items), "p50": statistics.median(durations), "p95": _percentile(durations, 0.95),
+                      **total}
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-node latency / token breakdown from in-memory spans.")
+    parser.add_argument("--conversations", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--maps-latency", type=float, default=0.1)
+    parser.add_argument("--async", dest="use_async", action="store_true", help="drive the graph with ainvoke")
+    args = parser.parse_args()
+
+    install_fakes(llm_latency=args.llm_latency, maps_latency=args.maps_latency)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    from langgraph.checkpoint.memory import MemorySaver
+    from graph.graph import workflow
+    from utils import telemetry
+
+    graph = workflow.compile(checkpointer=MemorySaver())
+    telemetry.memory_exporter.clear()
+    traced = run_script(graph, args.conversations, args.use_async, "traced")
+    spans = telemetry.memory_exporter.get_finished_spans()
+
+    print(f"{'span':<30} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'prompt tok':>11} {'compl tok':>10} "
+          f"{'ext calls':>10} {'cache hit':>10} {'cache miss':>11}")
+    for name, r in summarize(spans).items():
+        print(f"{name:<30} {r['count']:>6} {r['p50']:>8.1f} {r['p95']:>8.1f} {r.get('llm.prompt_tokens', 0):>11.0f} "
+              f"{r.get('llm.completion_tokens', 0):>10.0f} {r.get('external_calls', 0):>10.0f} "
+              f"{r.get('cache_hits', 0):>10.0f} {r.get('cache_misses', 0):>11.0f}")
+
+    # 同一個 trace 中，tool / llm span 都應該掛在某個節點 span 底下
+    by_id = {s.span_id: s for s in spans}
+    orphans = [s for s in spans if not s.name.startswith("node ") and s.parent_span_id not in by_id]
+    metrics = telemetry.render_prometheus()
+    print(f"\nspans: {len(spans)}, without a parent node span: {len(orphans)}, "
+          f"/metrics lines: {len(metrics.splitlines())}")
+    for family in ("order_agent_node_duration_seconds_count", "order_agent_llm_tokens_total",
+                   "order_agent_external_calls_total", "order_agent_cache_requests_total"):
+        assert family in metrics, f"{family} missing from /metrics"
+
+    # 第一輪的 Maps / 擷取快取是冷的；開 / 關追蹤的比較都在快取暖了之後進行
+    warm_traced = run_script(graph, args.conversations, args.use_async, "warm-traced")
+    telemetry.tracer.enabled = False
+    warm_untraced = run_script(graph, args.conversations, args.use_async, "warm-untraced")
+    telemetry.tracer.enabled = True
+    print(f"turn latency mean: cold traced {statistics.mean(traced) * 1000:.1f} ms, "
+          f"warm traced {statistics.mean(warm_traced) * 1000:.1f} ms, "
+          f"warm untraced {statistics.mean(warm_untraced) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
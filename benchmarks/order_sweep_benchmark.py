@@ -0,0 +1,123 @@
+# benchmarks/order_sweep_benchmark.py
+"""
+Celery beat 訂單 sweep 的延遲與認領正確性。
+
+對不同數量的 open 訂單 (其中固定 --due 筆已截止)：
+- 量測 sweep_orders() (釋放逾時認領 + 從索引找出到期訂單 + 分片) 的耗時
+- 以多個執行緒模擬 worker 處理分片，且每個分片故意派送兩次 (模擬重疊的 sweep / 重送的 task)，
+  確認每張訂單剛好被統計一次，並量測全部統計完成的時間
+Google Sheet 讀取與通知以固定延遲的假函式取代，量測的是排程本身的成本。
+
+用法：
+    python -m benchmarks.order_sweep_benchmark --open-orders 1000 10000 100000 --due 200 --workers 8
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_tmp = tempfile.mkdtemp()
+# sql.models.model 匯入時會以 DATABASE_URL 建立 engine，db_tools 的 session_scope 使用它
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'orders.sqlite')}"
+
+from sqlalchemy import delete, func, insert, select
+
+from sql.models.model import GroupOrder, engine, init_db
+from graph.tools import db_tools
+
+
+class _Reader:
+    def forget(self, sheet_id):
+        pass
+
+
+class _Notifier:
+    def enqueue(self, *args):
+        pass
+
+    def flush(self):
+        pass
+
+
+def seed(open_orders: int, due: int, now: datetime) -> None:
+    rows = [
+        {"id": f"due-{i:06d}", "restaurant_name": "餐廳", "response_sheet_id": f"sheet-{i}",
+         "deadline": now - timedelta(minutes=1 + i % 60), "status": "open"}
+        for i in range(due)
+    ] + [
+        {"id": f"open-{i:07d}", "restaurant_name": "餐廳", "response_sheet_id": f"sheet-open-{i}",
+         "deadline": now + timedelta(hours=2, minutes=i % 10000), "status": "open"}
+        for i in range(open_orders)
+    ]
+    with engine.begin() as conn:
+        conn.execute(delete(GroupOrder))
+        for i in range(0, len(rows), 10000):
+            conn.execute(insert(GroupOrder), rows[i:i + 10000])
+    # 灌資料留下的 WAL 先寫回主檔，不要算進統計階段
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def run(open_orders: int, due: int, shards: int, workers: int, tally_ms: float) -> dict:
+    now = datetime.now()
+    seed(open_orders, due, now)
+
+    tallied = Counter()
+    lock = threading.Lock()
+
+    def fake_tally(order, reader, notifier):
+        time.sleep(tally_ms / 1000)
+        with lock:
+            tallied[order.id] += 1
+        return {"organizer_email"}, True
+
+    db_tools._tally_order = fake_tally
+    db_tools.get_sheet_reader = lambda: _Reader()
+    db_tools.get_line_notifier = lambda: _Notifier()
+
+    dispatched = []
+    start = time.perf_counter()
+    result = db_tools.sweep_orders(lambda shard, ids: dispatched.append(ids), lambda shard, ids: None,
+                                   shards=shards)
+    sweep_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # 每個分片派送兩次：第二次的認領應該全部落空
+        list(executor.map(db_tools.tally_and_notify_orders, dispatched + dispatched))
+    tally_s = time.perf_counter() - start
+
+    with engine.connect() as conn:
+        closed = conn.execute(select(func.count()).where(GroupOrder.status == "closed")).scalar()
+    return {
+        "open": open_orders, "due": result["due"], "sweep_ms": sweep_ms, "tally_s": tally_s,
+        "tallied": sum(tallied.values()), "duplicates": sum(c - 1 for c in tallied.values()), "closed": closed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Beat-driven order sweep benchmark.")
+    parser.add_argument("--open-orders", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--due", type=int, default=200)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--tally-ms", type=float, default=5.0, help="simulated Sheets + notification time per order")
+    args = parser.parse_args()
+
+    init_db()
+    print(f"{'open':>8} {'due':>5} {'sweep ms':>9} {'tally s':>8} {'tallied':>8} {'dups':>5} {'closed':>7}")
+    for open_orders in args.open_orders:
+        r = run(open_orders, args.due, args.shards, args.workers, args.tally_ms)
+        print(f"{r['open']:>8} {r['due']:>5} {r['sweep_ms']:>9.1f} {r['tally_s']:>8.2f} {r['tallied']:>8} "
+              f"{r['duplicates']:>5} {r['closed']:>7}")
+        assert r["duplicates"] == 0 and r["tallied"] == r["due"] == r["closed"], "orders tallied more than once"
+
+
+if __name__ == "__main__":
+    main()
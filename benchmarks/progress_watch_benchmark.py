@@ -0,0 +1,91 @@
+# benchmarks/progress_watch_benchmark.py
+"""
+多位開團者同時觀看訂單進度：每位觀看者各自 get_all_records() vs. 共用的 ProgressHub。
+
+以 benchmarks.fakes.FakeSpreadsheet 模擬回覆陸續進來；一半的批次以 notify() 模擬 Forms watch
+通知 (立即更新)，另一半等背景輪詢。最後確認所有訂閱者收到的統計與整張表重新統計的結果相同。
+
+用法：
+    python -m benchmarks.progress_watch_benchmark --watchers 200 --batches 20
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import FakeSpreadsheet, FakeSheetsClient
+from benchmarks.sheet_ingest_benchmark import HEADER, make_row
+from graph.tools.sheet_ingest import IncrementalSheetReader, SheetRowStore
+from graph.tools.order_progress import ProgressHub
+from graph.tools.tally import tally_records
+
+
+def main(args):
+    rng = random.Random(11)
+    client = FakeSheetsClient()
+    sheet = client.add(FakeSpreadsheet("sheet-progress", HEADER, latency=args.latency))
+    order = {"order_id": "order-1", "restaurant_name": "飲料店", "response_sheet_id": sheet.id, "deadline": None}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        reader = IncrementalSheetReader(client, SheetRowStore(os.path.join(tmp, "rows.sqlite")))
+        hub = ProgressHub(reader_factory=lambda: reader, load_order=lambda oid: order if oid == "order-1" else None,
+                          poll_interval=args.poll_interval, idle_seconds=60)
+
+        latest = [None] * args.watchers
+        received = [0] * args.watchers
+        cond = threading.Condition()
+
+        def make_callback(i):
+            def callback(snapshot):
+                with cond:
+                    latest[i] = snapshot
+                    received[i] += 1
+                    cond.notify_all()
+            return callback
+
+        unsubscribes = [hub.subscribe("order-1", make_callback(i)) for i in range(args.watchers)]
+
+        start = time.perf_counter()
+        appended = 0
+        for batch in range(args.batches):
+            sheet.append_rows([make_row(rng, appended + i) for i in range(args.batch_size)])
+            appended += args.batch_size
+            if batch % 2 == 0:
+                hub.notify("order-1")  # 模擬 Forms watch 通知
+            with cond:
+                cond.wait_for(lambda: all(s and s["responses"] == appended for s in latest), timeout=10)
+        elapsed = time.perf_counter() - start
+
+        hub_requests, hub_cells = sheet.requests, sheet.cells_transferred
+        expected = tally_records(sheet.get_all_records())
+        final = latest[0]
+        assert all(s["total"] == expected.total for s in latest), "watcher totals diverged"
+        assert {i["label"]: i["count"] for i in final["items"]} == {i.label: i.count for i in expected.items}
+
+        for unsubscribe in unsubscribes:
+            unsubscribe()
+        hub.stop()
+        reader.store.close()
+
+    naive_requests = args.watchers * args.batches
+    print(f"watchers / batches / rows   : {args.watchers} / {args.batches} / {appended}")
+    print(f"per-watcher full reads      : {naive_requests} requests, "
+          f"~{naive_requests * (appended // 2 + 1) * len(HEADER)} cells")
+    print(f"shared progress hub         : {hub_requests} requests, {hub_cells} cells")
+    print(f"updates delivered           : {sum(received)} in {elapsed:.2f}s ({hub.stats()})")
+    print("snapshots match full tally  : yes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Order progress hub benchmark.")
+    parser.add_argument("--watchers", type=int, default=200)
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=25)
+    parser.add_argument("--poll-interval", type=float, default=0.3)
+    parser.add_argument("--latency", type=float, default=0.02)
+    main(parser.parse_args())
@@ -0,0 +1,151 @@
+# benchmarks/ranking_benchmark.py
+"""
+推薦排序引擎的效能與行為。
+
+1. 排序本身：隨機產生 N 家店的候選池，比較 place_ranking.rank() (一次 NumPy 運算) 與逐家計算的
+   純 Python 版本 (相同公式) 每次排序的時間，並確認兩者的前 k 名相同。
+2. 重新排序：以假的 Maps client (固定延遲) 與暫存的 SQLite (含歷史訂單) 執行一次搜尋，
+   接著用不同的篩選條件呼叫 --reranks 次 rank_restaurants()，回報 Maps API 呼叫次數與每次的延遲。
+
+用法：
+    python -m benchmarks.ranking_benchmark --sizes 20 200 2000 20000 --reranks 20
+"""
+import os
+import sys
+import math
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ORIGIN = (25.0553, 121.6134)
+
+
+def synthetic_places(n: int, seed: int = 7) -> list[dict]:
+    rng = random.Random(seed)
+    types = ["cafe", "bakery", "meal_takeaway", "bubble_tea_store", "restaurant"]
+    places = []
+    for i in range(n):
+        place = {
+            "name": f"店家 {i}",
+            "place_id": f"place-{i}",
+            "vicinity": f"台北市南港區 {i} 號",
+            "types": [rng.choice(types), "food", "establishment"],
+            "geometry": {"location": {"lat": ORIGIN[0] + rng.uniform(-0.04, 0.04),
+                                      "lng": ORIGIN[1] + rng.uniform(-0.04, 0.04)}},
+        }
+        if rng.random() > 0.1:
+            place["rating"] = round(rng.uniform(2.5, 5.0), 1)
+            place["user_ratings_total"] = rng.randint(1, 3000)
+        if rng.random() > 0.3:
+            place["price_level"] = rng.randint(1, 4)
+        places.append(place)
+    return places
+
+
+def python_rank(pool, origin, filters, k, weights, prior_votes, scale_km) -> list[str]:
+    """逐家計算的對照組，公式與 place_ranking.rank() 相同。"""
+    w_rating, w_distance, w_popularity = weights
+    rated = [r for r in pool.rating if r > 0]
+    prior = sum(rated) / len(rated) if rated else 3.5
+    max_orders = max(pool.orders)
+    scored = []
+    for i, place in enumerate(pool.places):
+        rating, votes, price = pool.rating[i], pool.votes[i], pool.price[i]
+        if filters.min_rating > 0 and rating < filters.min_rating:
+            continue
+        if filters.price_levels and price >= 0 and price not in filters.price_levels:
+            continue
+        lat1, lng1, lat2, lng2 = map(math.radians, (origin[0], origin[1], pool.lat[i], pool.lng[i]))
+        a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+        distance = 2 * 6371.0088 * math.asin(math.sqrt(a))
+        if filters.max_distance_km is not None and distance > filters.max_distance_km:
+            continue
+        rating_score = ((votes * rating + prior_votes * prior) / (votes + prior_votes) if rating > 0 else prior) / 5
+        popularity = math.log1p(pool.orders[i]) / math.log1p(max_orders) if max_orders > 0 else 0.0
+        score = w_rating * rating_score + w_distance * math.exp(-distance / scale_km) + w_popularity * popularity
+        scored.append((-score, i, place["name"]))
+    return [name for _, _, name in sorted(scored)[:k]]
+
+
+def bench_rank(sizes: list[int], repeats: int) -> None:
+    from graph.tools.place_ranking import build_pool, rank, RankFilters
+    from config import RANKING_WEIGHTS, RANKING_RATING_PRIOR_VOTES, RANKING_DISTANCE_SCALE_KM
+
+    filters = RankFilters(min_rating=3.5, price_levels=(1, 2), max_distance_km=3.0)
+    print(f"{'pool':>7} {'build ms':>9} {'numpy us':>9} {'python us':>10} {'speedup':>8} {'same top-k':>11}")
+    for n in sizes:
+        places = synthetic_places(n)
+        counts = {f"店家 {i}": (i * 7) % 13 for i in range(0, n, 3)}
+        start = time.perf_counter()
+        pool = build_pool("南港的飲料", places, counts)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            ranked = rank(pool, ORIGIN, filters)
+        numpy_us = (time.perf_counter() - start) / repeats * 1e6
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            expected = python_rank(pool, ORIGIN, filters, 8, RANKING_WEIGHTS, RANKING_RATING_PRIOR_VOTES,
+                                   RANKING_DISTANCE_SCALE_KM)
+        python_us = (time.perf_counter() - start) / repeats * 1e6
+
+        same = [r["name"] for r in ranked] == expected
+        print(f"{n:>7} {build_ms:>9.2f} {numpy_us:>9.1f} {python_us:>10.1f} {python_us / numpy_us:>7.1f}x {str(same):>11}")
+
+
+def bench_rerank(reranks: int, maps_latency: float) -> None:
+    from benchmarks.fakes import install_fakes
+    fakes = install_fakes(maps_latency=maps_latency)
+    fakes["maps"].n_results = 20
+
+    from datetime import datetime
+    from sql.models.model import Base, engine, GroupOrder
+    from sql.session import session_scope
+    from graph.tools.google_tools import rank_restaurants
+
+    Base.metadata.create_all(bind=engine)
+    query = "南港軟體園區的飲料"
+    with session_scope() as db:
+        for i in range(60):
+            db.add(GroupOrder(id=f"order-{i}", restaurant_name=f"{query} 店家 {i % 5}", deadline=datetime.now()))
+
+    start = time.perf_counter()
+    first, _ = rank_restaurants({"query": query})
+    first_ms = (time.perf_counter() - start) * 1000
+
+    variants = [{"min_rating": "4"}, {"price": "$,$$"}, {"max_distance_km": "1"}, {"price": "3", "min_rating": "3.8"},
+                {"k": "3"}]
+    latencies = []
+    for i in range(reranks):
+        start = time.perf_counter()
+        rank_restaurants({"query": query, **variants[i % len(variants)]})
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    top = ", ".join(f"{r['name'][-4:]} ({r['order_count']} orders)" for r in first["results"][:3])
+    print(f"\nfirst search: {first_ms:.1f} ms (pool of {first['pool_size']}); top 3: {top}")
+    print(f"{reranks} re-ranks with different filters: mean {statistics.mean(latencies):.2f} ms, "
+          f"max {max(latencies):.2f} ms, Maps API calls in total: {fakes['maps'].calls}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Place ranking engine benchmark.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 200, 2000, 20000])
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--reranks", type=int, default=20)
+    parser.add_argument("--maps-latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(directory, 'ranking.sqlite')}")
+        bench_rank(args.sizes, args.repeats)
+        bench_rerank(args.reranks, args.maps_latency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/sheet_ingest_benchmark.py
+"""
+截止前的即時統計：每次都 get_all_records() 重新下載整張表 vs. IncrementalSheetReader 只抓新增的列。
+
+以 benchmarks.fakes.FakeSpreadsheet 模擬回覆陸續進來，每批新回覆後各統計一次，
+比較傳輸的儲存格數、請求數，並確認兩者的統計結果完全相同 (包含中途有人修改既有回覆的情況)，
+最後以 full=True 做一次截止後的最終統計。
+
+用法：
+    python -m benchmarks.sheet_ingest_benchmark --responses 3000 --batches 60
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import FakeSpreadsheet, FakeSheetsClient
+from graph.tools.sheet_ingest import IncrementalSheetReader, SheetRowStore
+from graph.tools.tally import tally_records, format_summary_text
+
+HEADER = ["時間戳記", "您的姓名", "您的 Email", "您要點的餐點", "備註"]
+MENU = ["珍珠奶茶", "四季春青茶", "檸檬紅茶", "經典奶蓋", "百香雙響炮"]
+
+
+def make_row(rng: random.Random, i: int) -> list[str]:
+    return [f"2025/06/20 12:{i % 60:02d}", f"同事{i}", f"user{i}@example.com",
+            f"{rng.choice(MENU)} ({rng.choice(['大杯', '中杯'])}, {rng.choice(['半糖', '微糖'])})",
+            rng.choice(["", "", "去冰"])]
+
+
+def main(args):
+    rng = random.Random(7)
+    network = {"latency": args.latency, "per_cell_latency": args.per_cell_latency}
+    full = FakeSpreadsheet("sheet-full", HEADER, **network)
+    client = FakeSheetsClient()
+    incremental = client.add(FakeSpreadsheet("sheet-inc", HEADER, **network))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        reader = IncrementalSheetReader(client, SheetRowStore(os.path.join(tmp, "rows.sqlite")))
+        per_batch = args.responses // args.batches
+        full_time = inc_time = 0.0
+        for batch in range(args.batches):
+            if batch == args.batches // 2:
+                # 有人回頭修改自己的回覆：增量讀取器必須整張重新同步
+                edited = make_row(rng, 0)
+                full.update_row(2, edited)
+                incremental.update_row(2, edited)
+            else:
+                rows = [make_row(rng, batch * per_batch + i) for i in range(per_batch)]
+                full.append_rows(rows)
+                incremental.append_rows(rows)
+
+            for _ in range(args.polls):
+                start = time.perf_counter()
+                expected = format_summary_text("bench", tally_records(full.get_all_records()))
+                full_time += time.perf_counter() - start
+
+                start = time.perf_counter()
+                actual = format_summary_text("bench", tally_records(reader.read("sheet-inc")))
+                inc_time += time.perf_counter() - start
+                assert actual == expected, f"tally mismatch at batch {batch}"
+
+        final = format_summary_text("bench", tally_records(reader.read("sheet-inc", full=True)))
+        assert final == expected, "final tally mismatch"
+        reader.store.close()
+
+    print(f"responses / batches / polls : {args.responses} / {args.batches} / {args.polls}")
+    print(f"get_all_records             : {full.requests} requests, {full.cells_transferred} cells, {full_time:.3f}s")
+    print(f"incremental reader          : {incremental.requests} requests, {incremental.cells_transferred} cells, {inc_time:.3f}s")
+    print(f"reader stats                : {reader.stats()}")
+    print("tallies identical           : yes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental sheet ingestion benchmark.")
+    parser.add_argument("--responses", type=int, default=3000)
+    parser.add_argument("--batches", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.1, help="每個 API 請求的往返時間 (秒)")
+    parser.add_argument("--per-cell-latency", type=float, default=2e-5, help="每個儲存格的傳輸時間 (秒，約 20 bytes 的 JSON)")
+    parser.add_argument("--polls", type=int, default=3, help="每批新回覆後統計幾次 (模擬多個輪詢者)")
+    main(parser.parse_args())
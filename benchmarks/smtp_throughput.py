@@ -0,0 +1,86 @@
+# benchmarks/smtp_throughput.py
+"""
+SMTP 寄信吞吐量比較：每封信重新連線 vs. 連線池 vs. 連線池大量寄信。
+
+以 aiosmtpd 在本機啟動一個 SMTP 假伺服器 (pip install aiosmtpd)，不會真的寄出信件。
+
+用法：
+    python -m benchmarks.smtp_throughput --messages 500 --pool-size 4
+"""
+import os
+import sys
+import time
+import smtplib
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from graph.tools.mail_transport import SMTPConnectionPool, OutgoingEmail, build_message
+
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+
+def _emails(n: int) -> list[OutgoingEmail]:
+    return [OutgoingEmail(recipients=[f"user{i}@example.com"], subject=f"訂餐統計 #{i}", body=f"<p>您好 {i}</p>")
+            for i in range(n)]
+
+
+def send_without_pool(host, port, emails):
+    """原本的寫法：每封信都建立新連線。"""
+    for email in emails:
+        server = smtplib.SMTP(host, port)
+        server.sendmail("bot@example.com", email.recipients, build_message("bot@example.com", email).as_string())
+        server.quit()
+
+
+def main(args):
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        sys.exit("This benchmark needs aiosmtpd: pip install aiosmtpd")
+
+    handler = CountingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=args.port)
+    controller.start()
+    try:
+        emails = _emails(args.messages)
+
+        start = time.perf_counter()
+        send_without_pool("127.0.0.1", args.port, emails)
+        naive = time.perf_counter() - start
+
+        pool = SMTPConnectionPool("127.0.0.1", args.port, use_tls=False, max_size=args.pool_size,
+                                  sender="bot@example.com")
+        start = time.perf_counter()
+        for email in emails:
+            pool.send(email)
+        pooled = time.perf_counter() - start
+        pooled_connects = pool.connects
+
+        start = time.perf_counter()
+        errors = [e for e in pool.send_bulk(emails) if e]
+        bulk = time.perf_counter() - start
+        pool.close()
+
+        print(f"messages per run        : {args.messages}")
+        print(f"new connection per mail : {naive:.3f}s ({args.messages / naive:.0f} msg/s)")
+        print(f"pooled, sequential      : {pooled:.3f}s ({args.messages / pooled:.0f} msg/s, {pooled_connects} connects)")
+        print(f"pooled, send_bulk       : {bulk:.3f}s ({args.messages / bulk:.0f} msg/s, {len(errors)} errors)")
+        print(f"server received         : {handler.received}")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SMTP throughput: per-message connections vs pooled transport.")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8025)
+    main(parser.parse_args())
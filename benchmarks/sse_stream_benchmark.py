@@ -0,0 +1,143 @@
+# benchmarks/sse_stream_benchmark.py
+"""
+/api/chat 串流的成本比較：舊的 stream_mode="values" vs. ChatStreamEncoder。
+
+以 benchmarks.fakes 的假 LLM / Google Maps 跑固定腳本，比較三種串流方式每輪的：
+- CPU ms (process_time)、SSE bytes、log bytes (根 logger 設為 INFO，寫到計數用的 stream)
+- 第一個 SSE 事件的時間 (TTFB) 與整輪完成的時間
+模式：
+- values：舊做法，每一步產生完整 state，以 pretty_repr() 記 log，並 json.loads 每則內容判斷格式
+- updates：只取節點新增的訊息，事件類型來自訊息本身，log 依 --sample-rate 抽樣
+- tokens：updates + "messages"，call_model (或融合模式 JSON 中的 reply) 以 delta 事件逐段送出
+
+用法：
+    python -m benchmarks.sse_stream_benchmark --conversations 5 --llm-latency 0.05 --per-token-latency 0.01
+    python -m benchmarks.sse_stream_benchmark --sample-rate 1.0 --maps-results 40
+    FUSED_TURN_MODE=true python -m benchmarks.sse_stream_benchmark
+"""
+import os
+import io
+import sys
+import json
+import time
+import logging
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import install_fakes
+
+SCRIPT = [
+    "你好",
+    "我想找南港軟體園區附近的飲料店",
+    "我選這家: 50嵐 南港園區店",
+    "主題是部門下午茶",
+    "謝謝",
+]
+
+
+def _legacy_is_json(s):
+    try:
+        json.loads(s)
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+def legacy_stream(graph, inputs, config, thread_id):
+    """重現改版前 app.py 的 event_stream。"""
+    from utils.sse import format_sse
+
+    for event in graph.stream(inputs, config, stream_mode="values"):
+        last_message = event["messages"][-1]
+        logging.info(f"Streaming event for thread_id {thread_id}: {last_message.pretty_repr()}")
+        if not last_message.content:
+            continue
+        if isinstance(last_message.content, str) and _legacy_is_json(last_message.content):
+            yield format_sse(last_message.content)
+        else:
+            yield format_sse({"type": "message", "content": last_message.content})
+    yield format_sse({"type": "end", "thread_id": thread_id})
+
+
+def encoder_stream(graph, inputs, config, thread_id, stream_tokens):
+    from utils.sse import ChatStreamEncoder
+
+    encoder = ChatStreamEncoder(thread_id, stream_tokens=stream_tokens)
+    for chunk in graph.stream(inputs, config, stream_mode=encoder.stream_mode):
+        yield from encoder.encode(chunk)
+    yield encoder.end()
+
+
+def run_mode(graph, mode: str, conversations: int, log_stream: io.StringIO) -> dict:
+    from langchain_core.messages import HumanMessage
+
+    cpu, wall, ttfb, sse_bytes, deltas = [], [], [], 0, 0
+    log_stream.seek(0)
+    log_stream.truncate()
+    for c in range(conversations):
+        thread_id = f"{mode}-{c}"
+        config = {"configurable": {"thread_id": thread_id}}
+        for text in SCRIPT:
+            inputs = {"messages": [HumanMessage(content=text)]}
+            if mode == "values":
+                events = legacy_stream(graph, inputs, config, thread_id)
+            else:
+                events = encoder_stream(graph, inputs, config, thread_id, stream_tokens=(mode == "tokens"))
+            start, cpu_start, first = time.perf_counter(), time.process_time(), None
+            for event in events:
+                if first is None:
+                    first = time.perf_counter() - start
+                sse_bytes += len(event.encode("utf-8"))
+                deltas += '"type": "delta"' in event
+            wall.append(time.perf_counter() - start)
+            cpu.append(time.process_time() - cpu_start)
+            ttfb.append(first)
+    turns = len(wall)
+    return {
+        "cpu_ms": statistics.mean(cpu) * 1000,
+        "ttfb_ms": statistics.mean(ttfb) * 1000,
+        "turn_ms": statistics.mean(wall) * 1000,
+        "sse_bytes": sse_bytes / turns,
+        "log_bytes": len(log_stream.getvalue().encode("utf-8")) / turns,
+        "deltas": deltas / turns,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SSE streaming modes of /api/chat.")
+    parser.add_argument("--conversations", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--per-token-latency", type=float, default=0.01)
+    parser.add_argument("--maps-latency", type=float, default=0.0)
+    parser.add_argument("--maps-results", type=int, default=8, help="places returned by the fake Maps client")
+    parser.add_argument("--sample-rate", type=float, default=0.1, help="CHAT_STREAM_LOG_SAMPLE_RATE for the new modes")
+    args = parser.parse_args()
+
+    fakes = install_fakes(llm_latency=args.llm_latency, maps_latency=args.maps_latency,
+                          per_token_latency=args.per_token_latency)
+    fakes["maps"].n_results = args.maps_results
+
+    log_stream = io.StringIO()
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(logging.StreamHandler(log_stream))
+    root.setLevel(logging.INFO)
+
+    import utils.sse
+    from langgraph.checkpoint.memory import MemorySaver
+    from graph.graph import workflow
+
+    utils.sse.CHAT_STREAM_LOG_SAMPLE_RATE = args.sample_rate
+    graph = workflow.compile(checkpointer=MemorySaver())
+
+    print(f"{'mode':>8} {'cpu ms':>8} {'ttfb ms':>8} {'turn ms':>8} {'sse B':>8} {'log B':>8} {'deltas':>7}")
+    for mode in ("values", "updates", "tokens"):
+        r = run_mode(graph, mode, args.conversations, log_stream)
+        print(f"{mode:>8} {r['cpu_ms']:>8.1f} {r['ttfb_ms']:>8.1f} {r['turn_ms']:>8.1f} {r['sse_bytes']:>8.0f} "
+              f"{r['log_bytes']:>8.0f} {r['deltas']:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/startup_benchmark.py
+"""
+冷啟動 (匯入) 時間：以 `python -X importtime` 在全新的 process 中匯入各個進入點。
+
+對每個模組 (預設 app、asgi_app、celery_worker) 執行 --runs 次，回報：
+- wall ms：整個 process 從啟動到匯入完成的時間 (中位數，含直譯器啟動)
+- import ms：-X importtime 記錄的該模組累計匯入時間 (中位數)
+- 自身匯入時間最多的頂層套件 (例如 langgraph、sqlalchemy)，找出下一個該延遲匯入的對象
+自動擴展的容器每次啟動都要付這個成本，可以用 --json 把結果存下來追蹤。
+
+用法：
+    python -m benchmarks.startup_benchmark --runs 5
+    python -m benchmarks.startup_benchmark --modules celery_worker --top 15 --json startup.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _env(directory: str) -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    # 匯入時需要的設定；不會真的連線
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(directory, 'startup.sqlite')}")
+    env.setdefault("CHECKPOINT_BACKEND", "memory")
+    env.setdefault("AZURE_OPENAI_API_KEY", "fake-key")
+    env.setdefault("AZURE_OPENAI_ENDPOINT", "https://fake.openai.azure.com")
+    env.setdefault("OPENAI_API_VERSION", "2024-07-01-preview")
+    return env
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """解析 -X importtime 的輸出，回傳 (模組, 自身 us, 累計 us)。"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure(module: str, env: dict) -> dict:
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = parse_importtime(proc.stderr)
+    by_package = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+    import_us = next((cumulative for name, _, cumulative in rows if name == module), 0)
+    return {"wall_ms": wall_ms, "import_ms": import_us / 1000, "modules": len(rows),
+            "packages": {k: v / 1000 for k, v in by_package.items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start (import time) benchmark.")
+    parser.add_argument("--modules", nargs="+", default=["app", "asgi_app", "celery_worker"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="show the N packages with the most self import time")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        env = _env(directory)
+        print(f"{'module':>14} {'wall ms':>9} {'import ms':>10} {'modules':>8}")
+        for module in args.modules:
+            runs = [measure(module, env) for _ in range(args.runs)]
+            packages = {name: statistics.median(r["packages"].get(name, 0) for r in runs)
+                        for name in runs[0]["packages"]}
+            results[module] = {
+                "wall_ms": statistics.median(r["wall_ms"] for r in runs),
+                "import_ms": statistics.median(r["import_ms"] for r in runs),
+                "modules": runs[0]["modules"],
+                "top_packages": dict(sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:args.top]),
+            }
+            r = results[module]
+            print(f"{module:>14} {r['wall_ms']:>9.0f} {r['import_ms']:>10.0f} {r['modules']:>8}")
+            print("               " + ", ".join(f"{k} {v:.0f}ms" for k, v in r["top_packages"].items()))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# benchmarks/tally_benchmark.py
+"""
+統計引擎效能比較：原本逐品項重新過濾整個 DataFrame 的寫法 vs. graph.tools.tally 的單次 groupby。
+
+用法：
+    python -m benchmarks.tally_benchmark --rows 20000 --items 60
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from graph.tools.tally import tally_records, format_summary_text
+
+
+def make_responses(rows: int, items: int) -> pd.DataFrame:
+    rng = random.Random(42)
+    menu = [f"品項{i}" for i in range(items)]
+    return pd.DataFrame({
+        "時間戳記": [f"2025/06/20 12:{i % 60:02d}" for i in range(rows)],
+        "您的姓名": [f"同事{i}" for i in range(rows)],
+        "餐點選擇": [f"{rng.choice(menu)} ({rng.choice(['大杯', '中杯'])}, {rng.choice(['半糖', '微糖'])})"
+                 for _ in range(rows)],
+        "備註": [rng.choice(["", "", "", "去冰"]) for _ in range(rows)],
+    })
+
+
+def legacy_tally(title: str, orders_df: pd.DataFrame) -> str:
+    """原本 tally_and_notify_task 中的寫法 (O(品項數 × 列數))。"""
+    order_counts = orders_df['餐點選擇'].value_counts().reset_index()
+    order_counts.columns = ['item', 'count']
+    summary_lines = [f"【{title} 訂單統計 - 總計 {len(orders_df)} 份】"]
+    for _, row in order_counts.iterrows():
+        patrons = orders_df[orders_df['餐點選擇'] == row['item']]['您的姓名'].tolist()
+        summary_lines.append(f"- {row['item']} x {row['count']} ({', '.join(patrons)})")
+    return "\n".join(summary_lines)
+
+
+def _best_of(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(args):
+    df = make_responses(args.rows, args.items)
+    records = df.to_dict("records")
+    groups = df["餐點選擇"].nunique()
+
+    legacy = _best_of(lambda: legacy_tally("bench", df), args.repeat)
+    engine_df = _best_of(lambda: format_summary_text("bench", tally_records(df)), args.repeat)
+    engine_records = _best_of(lambda: tally_records(records), args.repeat)
+
+    print(f"rows / distinct item+options : {args.rows} / {groups}")
+    print(f"legacy per-item filtering    : {legacy * 1000:.1f} ms")
+    print(f"groupby engine (DataFrame)   : {engine_df * 1000:.1f} ms")
+    print(f"groupby engine (records)     : {engine_records * 1000:.1f} ms")
+    print(f"speedup                      : {legacy / engine_df:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tally engine benchmark.")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--items", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    main(parser.parse_args())
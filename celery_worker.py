@@ -3,9 +3,13 @@ from celery import Celery
 from celery.schedules import crontab
 import datetime
 import json
-from graph.tools.google_tools import read_google_sheet
-from graph.tools.line_tools import send_line_message
-from graph.tools.email_tools import send_email_tool
+from config import (
+    CHECKPOINT_KEEP_PER_THREAD,
+    CHECKPOINT_COMPACT_INTERVAL_SECONDS,
+    CHECKPOINT_RETENTION_INTERVAL_SECONDS,
+    CHECKPOINT_VACUUM_HOUR,
+    ORDER_SWEEP_INTERVAL_SECONDS,
+)
 
 # --- Celery Configuration ---
 # It's crucial that the broker and backend URLs are correctly configured,
@@ -28,11 +32,31 @@ celery.conf.update(
     enable_utc=True,
 )
 
+# --- Celery Beat 排程 (celery -A celery_worker.celery beat) ---
+celery.conf.beat_schedule = {
+    "sweep-orders": {
+        "task": "sweep_orders_task",
+        "schedule": ORDER_SWEEP_INTERVAL_SECONDS,
+    },
+    "compact-checkpoints": {
+        "task": "compact_checkpoints_task",
+        "schedule": CHECKPOINT_COMPACT_INTERVAL_SECONDS,
+    },
+    "checkpoint-retention": {
+        "task": "checkpoint_retention_task",
+        "schedule": CHECKPOINT_RETENTION_INTERVAL_SECONDS,
+    },
+    "vacuum-checkpoints": {
+        "task": "vacuum_checkpoints_task",
+        "schedule": crontab(hour=CHECKPOINT_VACUUM_HOUR, minute=0),
+    },
+}
+
 
 # --- Celery Tasks ---
 
-@celery.task(name="tally_and_notify_task")
-def tally_and_notify_task(sheet_url: str, title: str, notification_channels: dict):
+@celery.task(name="tally_and_notify_task", bind=True)
+def tally_and_notify_task(self, sheet_url: str, title: str, notification_channels: dict, schedule_id: str = None):
     """
     A Celery task to read Google Sheet responses, tally them up,
     and send a summary notification to LINE and/or Email.
@@ -41,57 +65,164 @@ def tally_and_notify_task(sheet_url: str, title: str, notification_channels: dic
         sheet_url (str): The URL of the Google Sheet containing order responses.
         title (str): The title of the group order for the notification message.
         notification_channels (dict): A dictionary containing 'line_token' and/or 'emails'.
+        schedule_id (str): 由 summary_scheduler 排定時的冪等鍵；已被取代或已執行過的排程直接略過。
     """
-    print(f"Executing task for '{title}' with sheet: {sheet_url}")
-
+    if schedule_id is None:
+        return _tally_and_notify(sheet_url, title, notification_channels)
+
+    from graph.tools.summary_schedule import summary_scheduler
+    skipped = summary_scheduler.start(schedule_id, self.request.id)
+    if skipped:
+        print(f"Skipping tally for '{title}' ({schedule_id}): {skipped}")
+        return f"Skipped: {skipped}"
     try:
-        # 1. Read data from Google Sheet
-        orders_df = read_google_sheet(sheet_url)
+        result = _tally_and_notify(sheet_url, title, notification_channels)
+    except BaseException as e:
+        summary_scheduler.finish(schedule_id, ok=False, result=str(e))
+        raise
+    # 有通道沒送達時記為 failed (可以重新排程)，不記為 done
+    summary_scheduler.finish(schedule_id, ok=isinstance(result, dict) and result["delivery"]["ok"], result=result)
+    return result
+
+
+def _tally_and_notify(sheet_url: str, title: str, notification_channels: dict):
+    """讀取回覆、統計並送出通知；成功時回傳 dict，失敗時回傳錯誤訊息字串。"""
+    # worker 只在真的要統計時才匯入 Google / LINE / pandas，啟動時不載入 LangGraph 與工具模組
+    from graph.tools.google_tools import read_google_sheet
+    from graph.tools.line_tools import send_line_message
+    from graph.tools.email_tools import send_email_tool
+    from graph.tools.notification_dispatcher import Delivery, dispatch
+    from graph.tools.tally import tally_records, format_summary_text
 
-        if orders_df.empty:
-            summary = f"【{title} 訂單統計】\n\n本次揪團沒有人訂餐喔！"
-        else:
-            # 2. Tally the orders
-            # Ensure the column names match your Google Form questions exactly.
-            # We assume columns like '您的姓名', '餐點選擇', '備註' exist.
-            # Adjust these column names if they are different in your form.
-            if '餐點選擇' not in orders_df.columns:
-                return f"Error: '餐點選擇' column not found in the sheet. Available columns: {orders_df.columns.tolist()}"
-
-            order_counts = orders_df['餐點選擇'].value_counts().reset_index()
-            order_counts.columns = ['item', 'count']
+    print(f"Executing task for '{title}' with sheet: {sheet_url}")
 
-            # Create a detailed summary string
-            summary_lines = [f"【{title} 訂單統計 - 總計 {len(orders_df)} 份】"]
+    try:
+        # 1. Read data from Google Sheet (最終統計整張重新同步，確保包含被修改過的回覆)
+        orders_df = read_google_sheet.invoke({"sheet_url": sheet_url, "full": True})
 
-            for _, row in order_counts.iterrows():
-                # Find who ordered each item
-                patrons = orders_df[orders_df['餐點選擇'] == row['item']]['您的姓名'].tolist()
-                summary_lines.append(f"- {row['item']} x {row['count']} ({', '.join(patrons)})")
+        # 2. Tally the orders (one groupby pass; column aliases such as '您要點的餐點' are accepted)
+        result = tally_records(orders_df)
+        if result is None:
+            return f"Error: '餐點選擇' column not found in the sheet. Available columns: {orders_df.columns.tolist()}"
 
-            summary = "\n".join(summary_lines)
+        summary = format_summary_text(title, result)
 
         print("Generated Summary:\n", summary)
 
-        # 3. Send notifications
+        # 3. Send notifications (all channels concurrently, each with its own timeout/retries)
         line_token = notification_channels.get("line_token")
         emails = notification_channels.get("emails")
+        deliveries = []
 
         if line_token:
             print(f"Sending notification to LINE with token: {line_token}")
-            send_line_message(line_token, summary)
+            deliveries.append(Delivery("line", lambda: send_line_message.invoke(
+                {"line_token": line_token, "message": summary})))
 
         if emails and isinstance(emails, list):
             print(f"Sending notification to emails: {emails}")
             email_subject = f"訂單統計結果: {title}"
-            send_email_tool(emails, email_subject, summary)
+            deliveries.append(Delivery("email", lambda: send_email_tool.invoke(
+                {"recipients": emails, "subject": email_subject, "body": summary})))
 
-        return f"Task completed successfully for '{title}'. Summary sent."
+        report = dispatch(deliveries)
+        print(f"Delivery report for '{title}': {report.to_dict()}")
+        return {
+            "message": f"Task completed for '{title}'. Summary sent." if report.ok
+            else f"Task completed for '{title}', but some notifications failed: {report.failed}",
+            "delivery": report.to_dict(),
+        }
 
     except Exception as e:
         print(f"An error occurred in tally_and_notify_task: {e}")
         # You might want to add more robust error handling/retry logic here
         return f"Task failed for '{title}'. Error: {str(e)}"
+    finally:
+        # 最終統計之後不再讀這張表，清掉本機的增量儲存 (重跑時會整張重新同步)
+        _forget_sheet(sheet_url)
+
+
+def _forget_sheet(sheet_url: str) -> None:
+    from graph.tools.sheet_ingest import get_sheet_reader
+
+    reader = get_sheet_reader()
+    if reader is None:
+        return
+    try:
+        reader.forget_url(sheet_url)
+    except Exception as e:
+        print(f"Failed to forget local rows of {sheet_url}: {e}")
+
+@celery.task(name="sweep_orders_task")
+def sweep_orders_task():
+    """找出已截止 / 即將截止的訂單，依訂單 id 分片後交給 worker 統計或提醒。"""
+    from graph.tools.db_tools import sweep_orders
+    result = sweep_orders(
+        send_tally=lambda shard, ids: tally_orders_shard_task.delay(shard, ids),
+        send_reminders=lambda shard, ids: remind_orders_shard_task.delay(shard, ids),
+    )
+    print(f"Order sweep: {result}")
+    return result
+
+
+@celery.task(name="tally_orders_shard_task")
+def tally_orders_shard_task(shard: int, order_ids: list):
+    """統計一個分片的訂單；每張訂單先以狀態轉換認領，重複派送也不會統計兩次。"""
+    from graph.tools.db_tools import tally_and_notify_orders
+    tally_and_notify_orders(order_ids)
+    return {"shard": shard, "orders": len(order_ids)}
+
+
+@celery.task(name="remind_orders_shard_task")
+def remind_orders_shard_task(shard: int, order_ids: list):
+    """提醒一個分片中即將截止的訂單。"""
+    from graph.tools.db_tools import check_and_remind_orders
+    check_and_remind_orders(order_ids)
+    return {"shard": shard, "orders": len(order_ids)}
+
+
+_checkpointer = None
+
+
+def get_checkpointer():
+    """worker 內共用的 checkpointer (與 Flask 相同的後端設定)，第一次使用時才建立。"""
+    global _checkpointer
+    if _checkpointer is None:
+        from graph.checkpoint import build_checkpointer
+        _checkpointer = build_checkpointer()
+    return _checkpointer
+
+
+@celery.task(name="compact_checkpoints_task")
+def compact_checkpoints_task(keep: int = CHECKPOINT_KEEP_PER_THREAD):
+    """每個對話只保留最新的 keep 個 checkpoint，刪除較舊的 checkpoint 與不再被引用的訊息 blob。"""
+    saver = get_checkpointer()
+    if not hasattr(saver, "compact_all"):
+        return f"Checkpointer {type(saver).__name__} does not support compaction."
+    result = saver.compact_all(keep=keep)
+    print(f"Checkpoint compaction: {result}")
+    return result
+
+
+@celery.task(name="checkpoint_retention_task")
+def checkpoint_retention_task():
+    """封存閒置的已完成對話到冷儲存，刪除閒置超過 TTL 的對話。"""
+    from graph.checkpoint.retention import sweep
+    result = sweep(get_checkpointer())
+    print(f"Checkpoint retention: {result}")
+    return result
+
+
+@celery.task(name="vacuum_checkpoints_task")
+def vacuum_checkpoints_task():
+    """回收 checkpoint 儲存中已刪除資料的空間 (SQLite VACUUM)。"""
+    saver = get_checkpointer()
+    if not hasattr(saver, "vacuum"):
+        return f"Checkpointer {type(saver).__name__} does not support vacuum."
+    result = saver.vacuum()
+    print(f"Checkpoint vacuum: {result}")
+    return result
+
 
 # Example of how to call this task with a delay/ETA
 # from celery_worker import tally_and_notify_task
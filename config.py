@@ -35,3 +35,144 @@ MONGODB_COLLECTION_NAME = os.getenv("MONGODB_COLLECTION_NAME")
 LINE_CHANNEL_ACCESS_TOKEN = os.getenv("LINE_CHANNEL_ACCESS_TOKEN")
 # 接收通知的使用者 ID 或群組 ID
 LINE_TARGET_ID = os.getenv("LINE_TARGET_ID")
+
+
+# (新增) 融合模式：一次 LLM 呼叫同時提取狀態並產生回覆
+FUSED_TURN_MODE = os.getenv("FUSED_TURN_MODE", "false").lower() in ("1", "true", "yes")
+
+# (新增) 對話歷史的 token 預算：超過預算的舊訊息會被增量摘要，每輪 prompt 大小維持固定
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1200"))
+# 超出預算多少 token 才觸發一次摘要，避免每輪都多一次 LLM 呼叫
+HISTORY_SUMMARY_TRIGGER_TOKENS = int(os.getenv("HISTORY_SUMMARY_TRIGGER_TOKENS", "400"))
+
+# (新增) Redis 連線 (快取等用途)，預設使用 docker-compose 中的 redis 服務
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/1")
+
+# (新增) Google Maps 搜尋結果快取
+MAPS_CACHE_BACKEND = os.getenv("MAPS_CACHE_BACKEND", "memory")  # memory | redis
+MAPS_CACHE_TTL_SECONDS = int(os.getenv("MAPS_CACHE_TTL_SECONDS", "21600"))
+MAPS_CACHE_MAXSIZE = int(os.getenv("MAPS_CACHE_MAXSIZE", "2048"))
+# geohash 精度 6 約為 1.2km x 0.6km 的格子，同一棟辦公大樓附近的座標會落在同一格
+MAPS_CACHE_GEOHASH_PRECISION = int(os.getenv("MAPS_CACHE_GEOHASH_PRECISION", "6"))
+
+# (新增) update_state 擷取結果快取 (精確比對 + n-gram 相似度)
+EXTRACTION_CACHE_BACKEND = os.getenv("EXTRACTION_CACHE_BACKEND", "memory")  # memory | redis
+EXTRACTION_CACHE_TTL_SECONDS = int(os.getenv("EXTRACTION_CACHE_TTL_SECONDS", "86400"))
+EXTRACTION_CACHE_MAXSIZE = int(os.getenv("EXTRACTION_CACHE_MAXSIZE", "5000"))
+EXTRACTION_SIMILARITY_THRESHOLD = float(os.getenv("EXTRACTION_SIMILARITY_THRESHOLD", "0.8"))
+
+# (新增) Google API 連線池設定
+GOOGLE_HTTP_POOL_SIZE = int(os.getenv("GOOGLE_HTTP_POOL_SIZE", "32"))
+GOOGLE_HTTP_TIMEOUT_SECONDS = float(os.getenv("GOOGLE_HTTP_TIMEOUT_SECONDS", "60"))
+
+# (新增) SMTP 連線池設定
+SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "true").lower() in ("1", "true", "yes")
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+# 閒置超過此秒數的連線在使用前會先以 NOOP 檢查是否仍有效
+SMTP_MAX_IDLE_SECONDS = float(os.getenv("SMTP_MAX_IDLE_SECONDS", "30"))
+# 單一連線最多寄出的信件數，超過後重新連線 (避免被伺服器限制)
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "200"))
+
+# (新增) LINE Messaging API 限流設定 (依官方文件的各端點上限，留一些餘裕)
+LINE_PUSH_RATE_PER_SECOND = float(os.getenv("LINE_PUSH_RATE_PER_SECOND", "1000"))
+LINE_MULTICAST_RATE_PER_SECOND = float(os.getenv("LINE_MULTICAST_RATE_PER_SECOND", "100"))
+LINE_BROADCAST_RATE_PER_HOUR = float(os.getenv("LINE_BROADCAST_RATE_PER_HOUR", "50"))
+
+# (新增) 通知派送：每個通道的逾時、重試次數與退避秒數
+NOTIFY_TIMEOUT_SECONDS = float(os.getenv("NOTIFY_TIMEOUT_SECONDS", "20"))
+NOTIFY_RETRIES = int(os.getenv("NOTIFY_RETRIES", "2"))
+NOTIFY_BACKOFF_SECONDS = float(os.getenv("NOTIFY_BACKOFF_SECONDS", "1"))
+
+# (新增) Google Sheet 回覆增量讀取的本機儲存 (SQLite)
+SHEET_STORE_PATH = os.getenv("SHEET_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sheet_rows.sqlite"))
+
+# (新增) 訂單即時進度：共用輪詢的週期，以及沒人觀看多久後停止追蹤
+PROGRESS_POLL_INTERVAL_SECONDS = float(os.getenv("PROGRESS_POLL_INTERVAL_SECONDS", "15"))
+PROGRESS_IDLE_SECONDS = float(os.getenv("PROGRESS_IDLE_SECONDS", "300"))
+
+# (新增) 部門 Email 名錄快取 (寫入時以版本號失效，TTL 為跨 process 的上限)
+DEPARTMENT_DIRECTORY_TTL_SECONDS = float(os.getenv("DEPARTMENT_DIRECTORY_TTL_SECONDS", "300"))
+DEPARTMENT_DIRECTORY_MAXSIZE = int(os.getenv("DEPARTMENT_DIRECTORY_MAXSIZE", "1024"))
+
+# (新增) 資料庫連線池 (SQLite 記憶體資料庫以外都適用)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# SQLite：WAL 讓讀寫可以並行，busy_timeout 讓寫入衝突時等待而不是立即失敗
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() in ("1", "true", "yes")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# (新增) LangGraph checkpointer：sqlite (WAL + 批次寫入) | redis | memory
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "sqlite")
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "checkpointer.sqlite"))
+# 與快取分開的 Redis 資料庫；checkpoint 沒有 TTL，Redis 的 maxmemory-policy 請用 volatile-* 或 noeviction
+CHECKPOINT_REDIS_URL = os.getenv("CHECKPOINT_REDIS_URL", "redis://redis:6379/2")
+# SQLite 批次寫入：最多等待幾毫秒、累積幾筆寫入後一起 commit
+CHECKPOINT_FLUSH_INTERVAL_MS = float(os.getenv("CHECKPOINT_FLUSH_INTERVAL_MS", "20"))
+CHECKPOINT_MAX_BATCH = int(os.getenv("CHECKPOINT_MAX_BATCH", "256"))
+# 訊息列表以增量儲存，每隔幾版存一次完整內容 (讀取時最多串接這麼多段)
+CHECKPOINT_KEYFRAME_INTERVAL = int(os.getenv("CHECKPOINT_KEYFRAME_INTERVAL", "32"))
+# 壓縮：每個對話保留最新的幾個 checkpoint；比這個秒數新的 checkpoint 一律保留
+CHECKPOINT_KEEP_PER_THREAD = int(os.getenv("CHECKPOINT_KEEP_PER_THREAD", "20"))
+CHECKPOINT_COMPACT_MIN_AGE_SECONDS = float(os.getenv("CHECKPOINT_COMPACT_MIN_AGE_SECONDS", "3600"))
+CHECKPOINT_COMPACT_INTERVAL_SECONDS = float(os.getenv("CHECKPOINT_COMPACT_INTERVAL_SECONDS", "3600"))
+
+# (新增) 對話狀態的保存期限：閒置超過 TTL 的對話刪除；已完成 (到過 finish 節點) 且閒置
+# 超過 ARCHIVE_AFTER 的對話壓縮後移到冷儲存 (CHECKPOINT_ARCHIVE_DIR)，再次使用時自動還原
+CHECKPOINT_THREAD_TTL_SECONDS = float(os.getenv("CHECKPOINT_THREAD_TTL_SECONDS", str(7 * 24 * 3600)))
+CHECKPOINT_ARCHIVE_AFTER_SECONDS = float(os.getenv("CHECKPOINT_ARCHIVE_AFTER_SECONDS", "3600"))
+CHECKPOINT_ARCHIVE_DIR = os.getenv("CHECKPOINT_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "checkpoint_archive"))
+CHECKPOINT_RETENTION_INTERVAL_SECONDS = float(os.getenv("CHECKPOINT_RETENTION_INTERVAL_SECONDS", "3600"))
+# 每天幾點 (Asia/Taipei) 回收 SQLite checkpoint 檔案的空間
+CHECKPOINT_VACUUM_HOUR = int(os.getenv("CHECKPOINT_VACUUM_HOUR", "4"))
+
+# (新增) 訂單排程 (Celery beat)：掃描週期、分片數、認領逾時與截止前提醒的時間窗
+ORDER_SWEEP_INTERVAL_SECONDS = float(os.getenv("ORDER_SWEEP_INTERVAL_SECONDS", "60"))
+ORDER_SWEEP_SHARDS = int(os.getenv("ORDER_SWEEP_SHARDS", "4"))
+ORDER_CLAIM_TIMEOUT_SECONDS = float(os.getenv("ORDER_CLAIM_TIMEOUT_SECONDS", "900"))
+ORDER_REMINDER_WINDOW_SECONDS = float(os.getenv("ORDER_REMINDER_WINDOW_SECONDS", "3600"))
+# 截止統計的通知最多派送幾次 (每次只重送尚未送達的通道)，之後訂單改為 notify_failed
+ORDER_NOTIFY_MAX_ATTEMPTS = int(os.getenv("ORDER_NOTIFY_MAX_ATTEMPTS", "3"))
+
+# (新增) 截止統計的冪等排程紀錄 (pending / running / done)；與快取分開的 Redis 資料庫，截止後保留的秒數
+SUMMARY_SCHEDULE_REDIS_URL = os.getenv("SUMMARY_SCHEDULE_REDIS_URL", "redis://redis:6379/3")
+SUMMARY_SCHEDULE_RETENTION_SECONDS = float(os.getenv("SUMMARY_SCHEDULE_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+# (新增) 節點 / 工具 / LLM 的追蹤與 Prometheus 指標 (/metrics)
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "true").lower() in ("1", "true", "yes")
+# 結束的 span 送到哪裡：memory (只保留在行程內) | log (另外每個 span 寫一行 JSON log) | none
+TELEMETRY_SPAN_EXPORTER = os.getenv("TELEMETRY_SPAN_EXPORTER", "memory")
+TELEMETRY_SPAN_BUFFER = int(os.getenv("TELEMETRY_SPAN_BUFFER", "1000"))
+
+# (新增) 聊天 SSE 串流與 log
+# 根 logger 的等級 (app.py / asgi_app.py)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# 每個串流事件的 log 等級與抽樣比例 (0~1，以整條串流為單位抽樣)；訊息全文只在 LOG_LEVEL=DEBUG 時輸出
+CHAT_STREAM_LOG_LEVEL = os.getenv("CHAT_STREAM_LOG_LEVEL", "INFO")
+CHAT_STREAM_LOG_SAMPLE_RATE = float(os.getenv("CHAT_STREAM_LOG_SAMPLE_RATE", "0.1"))
+# request 沒有指定 stream_tokens 時，是否把 LLM 回覆逐 token 以 delta 事件送出
+CHAT_STREAM_TOKENS = os.getenv("CHAT_STREAM_TOKENS", "false").lower() in ("1", "true", "yes")
+# 串流回覆時請 API 在最後一個 chunk 附上 token 用量 (stream_options.include_usage)，/metrics 的 token 統計才不會少算
+LLM_STREAM_USAGE = os.getenv("LLM_STREAM_USAGE", "true").lower() in ("1", "true", "yes")
+
+# (新增) 餐廳推薦排序：候選池 (Maps 結果 + 預先算好的特徵與歷史訂單數) 的快取，以及評分權重
+RANKING_POOL_TTL_SECONDS = float(os.getenv("RANKING_POOL_TTL_SECONDS", "600"))
+RANKING_POOL_MAXSIZE = int(os.getenv("RANKING_POOL_MAXSIZE", "512"))
+RANKING_TOP_K = int(os.getenv("RANKING_TOP_K", "8"))
+# 評分 = 評價 x 距離 x 人氣 的加權和 (依序)
+RANKING_WEIGHTS = tuple(float(w) for w in os.getenv("RANKING_WEIGHTS", "0.5,0.3,0.2").split(","))
+# 評價以貝氏平均修正：評論數少的店往候選池的平均評價靠攏，相當於預先加上這麼多則平均評價
+RANKING_RATING_PRIOR_VOTES = float(os.getenv("RANKING_RATING_PRIOR_VOTES", "20"))
+# 距離分數 = exp(-距離 / 這個公里數)
+RANKING_DISTANCE_SCALE_KM = float(os.getenv("RANKING_DISTANCE_SCALE_KM", "1.0"))
+
+# (新增) 本機菜單目錄 (sql/menu_catalog.py)：啟動時載入行程內的快照，超過 TTL 後的下一次查詢重新載入
+MENU_CATALOG_TTL_SECONDS = float(os.getenv("MENU_CATALOG_TTL_SECONDS", "600"))
+# 店名解析結果 (使用者輸入的店名 -> 目錄中的店家) 的快取大小
+MENU_CATALOG_RESOLVE_MAXSIZE = int(os.getenv("MENU_CATALOG_RESOLVE_MAXSIZE", "2048"))
+# 全文索引找到的候選店家，店名的 trigram 至少要有這個比例出現在輸入中才算同一家
+MENU_CATALOG_MIN_MATCH = float(os.getenv("MENU_CATALOG_MIN_MATCH", "0.6"))
+# 表單「餐點選擇」最多列出幾項
+MENU_CATALOG_MAX_FORM_ITEMS = int(os.getenv("MENU_CATALOG_MAX_FORM_ITEMS", "40"))
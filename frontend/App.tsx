@@ -49,7 +49,8 @@ const App: React.FC = () => {
             const response = await fetch(getApiUrl('/api/chat'), { // 使用 getApiUrl 產生完整路徑
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ message: content, thread_id: threadId }),
+                // stream_tokens: 回覆以 delta 事件逐段送達，不必等整段產生完
+                body: JSON.stringify({ message: content, thread_id: threadId, stream_tokens: true }),
             });
 
             if (!response.body) return;
@@ -101,6 +102,8 @@ const App: React.FC = () => {
     // Handles different types of data from the stream
     const handleStreamedData = (data: any) => {
         if (data.type === 'end') {
+            // 沒有等到同 id 完整訊息的 delta 是沒被採用的暫時回覆 (例如這一輪改成顯示餐廳列表)，移除
+            setMessages(prev => prev.filter(msg => !msg.streaming));
             setIsLoading(false);
             if (data.thread_id) {
                 setThreadId(data.thread_id); // Ensure thread_id is persisted
@@ -110,7 +113,22 @@ const App: React.FC = () => {
 
         if (data.type === 'error') {
             const errorMessage = { role: 'assistant', content: `發生錯誤: ${data.content}` };
-            setMessages(prev => [...prev, errorMessage]);
+            setMessages(prev => [...prev.filter(msg => !msg.streaming), errorMessage]);
+            return;
+        }
+
+        // --- Token Streaming ---
+        if (data.type === 'delta') {
+            // 同一個 id 的 delta 接在同一個對話框後面，邊收邊顯示
+            setMessages(prev => {
+                const index = prev.findIndex(msg => msg.id === data.id);
+                if (index === -1) {
+                    return [...prev, { role: 'assistant', id: data.id, content: data.content, streaming: true }];
+                }
+                const updated = [...prev];
+                updated[index] = { ...updated[index], content: updated[index].content + data.content };
+                return updated;
+            });
             return;
         }
 
@@ -133,8 +151,15 @@ const App: React.FC = () => {
 
         // Default message handling
         if (data.content) {
-            const message = { role: 'assistant', content: data.content };
+            const message = { role: 'assistant', id: data.id, content: data.content };
              setMessages(prev => {
+                // 完整訊息送達：取代同 id 的串流內容 (以伺服器的全文為準)
+                const index = data.id ? prev.findIndex(msg => msg.id === data.id) : -1;
+                if (index !== -1) {
+                    const updated = [...prev];
+                    updated[index] = message;
+                    return updated;
+                }
                 // To avoid duplicate messages if the last one is the same
                 if(prev.length > 0 && prev[prev.length - 1].content === message.content) {
                     return prev;
@@ -158,7 +183,8 @@ const App: React.FC = () => {
                     </div>
                 ))}
 
-                {isLoading && <LoadingSpinner />}
+                {/* 回覆已經開始串流時就不再顯示載入中 */}
+                {isLoading && !messages.some(msg => msg.streaming) && <LoadingSpinner />}
 
                 {restaurants.length > 0 && (
                     <FoodList
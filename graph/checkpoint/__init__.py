@@ -0,0 +1,39 @@
+# graph/checkpoint/__init__.py
+"""
+可替換的 LangGraph checkpointer。
+
+    from graph.checkpoint import build_checkpointer
+    graph = workflow.compile(checkpointer=build_checkpointer())
+
+後端由 config.CHECKPOINT_BACKEND 決定：
+- sqlite：BatchedSqliteSaver (預設)，WAL + 批次寫入，存在 CHECKPOINT_DB_PATH。
+- redis：RedisSaver，存在 CHECKPOINT_REDIS_URL；無法連線時退回 sqlite。
+- memory：LangGraph 的 MemorySaver，只適合開發與測試。
+"""
+import logging
+
+from graph.checkpoint.base import DeltaCheckpointSaver
+from graph.checkpoint.sqlite_saver import BatchedSqliteSaver
+from graph.checkpoint.redis_saver import RedisSaver
+from config import CHECKPOINT_BACKEND, CHECKPOINT_DB_PATH, CHECKPOINT_REDIS_URL
+
+__all__ = ["DeltaCheckpointSaver", "BatchedSqliteSaver", "RedisSaver", "build_checkpointer"]
+
+
+def build_checkpointer(backend: str = CHECKPOINT_BACKEND):
+    """依設定建立 checkpointer；Redis 後端建立失敗時退回 SQLite。"""
+    if backend == "memory":
+        from langgraph.checkpoint.memory import MemorySaver
+        return MemorySaver()
+    if backend == "redis":
+        try:
+            saver = RedisSaver(CHECKPOINT_REDIS_URL)
+            saver.ping()
+            logging.info(f"Using Redis checkpointer at {CHECKPOINT_REDIS_URL}")
+            return saver
+        except Exception as e:
+            logging.warning(f"無法連線到 Redis checkpointer，改用 SQLite: {e}")
+    elif backend != "sqlite":
+        logging.warning(f"未知的 CHECKPOINT_BACKEND '{backend}'，改用 SQLite。")
+    logging.info(f"Using SQLite checkpointer at {CHECKPOINT_DB_PATH}")
+    return BatchedSqliteSaver(CHECKPOINT_DB_PATH)
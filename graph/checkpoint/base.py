@@ -0,0 +1,390 @@
+# graph/checkpoint/base.py
+"""
+以「每個 channel 版本一筆 blob」儲存的 checkpointer 共用邏輯，SQLite 與 Redis 後端只需實作讀寫原語。
+
+SqliteSaver 每一步都把整份 channel_values (包含越來越長的 messages) 序列化後寫入一次，
+對話越長每次寫入越大。這裡改為：
+- checkpoint 本身只存 channel_versions 等中繼資料；channel 的值依 (channel, version) 另存為 blob，
+  只有這一步有變動的 channel (new_versions) 才寫入。
+- list 型態的 channel (messages) 若只是在上一版後面附加，只存新增的部分 (delta)，並記下從
+  完整版本 (keyframe) 到上一版的版本鏈；讀取時一次抓齊整條鏈再串接。每 keyframe_interval 版
+  存一次完整內容，讀取的鏈長有上限。
+- 判斷「只是附加」需要上一版的內容，這裡保留每個對話最後寫入/讀取的 list (_tails)。
+  快取沒有命中 (例如 process 重啟) 時直接存完整內容，不會算錯。
+- compact() 刪除每個對話較舊的 checkpoint 與只被它們引用的 blob。
+"""
+from __future__ import annotations
+
+import random
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Iterable, Iterator, Sequence
+
+from cachetools import TTLCache
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from config import (
+    CHECKPOINT_KEYFRAME_INTERVAL,
+    CHECKPOINT_KEEP_PER_THREAD,
+    CHECKPOINT_COMPACT_MIN_AGE_SECONDS,
+)
+
+_EMPTY = object()
+_metadata_serde = JsonPlusSerializer()
+
+
+@dataclass
+class CheckpointRecord:
+    thread_id: str
+    checkpoint_ns: str
+    checkpoint_id: str
+    parent_checkpoint_id: str | None
+    type: str
+    checkpoint: bytes
+    metadata: bytes
+    created_at: float
+
+
+@dataclass
+class BlobRecord:
+    channel: str
+    version: str
+    kind: str  # full | delta | empty
+    type: str | None = None
+    value: bytes | None = None
+    # delta：從 keyframe 到上一版的版本號
+    chain: tuple[str, ...] = ()
+
+
+@dataclass
+class WriteRecord:
+    task_id: str
+    task_path: str
+    idx: int
+    channel: str
+    type: str
+    value: bytes
+
+
+class DeltaCheckpointSaver(BaseCheckpointSaver[str]):
+    """以 blob + 訊息增量儲存的 checkpointer 基底類別；子類別實作底下以 _ 開頭的讀寫原語。"""
+
+    def __init__(self, *, serde=None, keyframe_interval: int = CHECKPOINT_KEYFRAME_INTERVAL,
+                 tail_cache_size: int = 1024):
+        super().__init__(serde=serde)
+        self.keyframe_interval = max(1, keyframe_interval)
+        # (thread_id, ns, channel) -> (version, list 內容, 重建這一版需要的版本鏈)
+        # 存活時間比壓縮的最小年齡短，增量引用的上一版不會在使用前被壓縮掉
+        self._tails: TTLCache = TTLCache(maxsize=tail_cache_size, ttl=CHECKPOINT_COMPACT_MIN_AGE_SECONDS / 2)
+        self._tails_lock = threading.Lock()
+        self.delta_blobs = 0
+        self.full_blobs = 0
+        self.tail_hits = 0
+
+    # --- 後端讀寫原語 ---
+    def _store_checkpoint(self, record: CheckpointRecord, blobs: list[BlobRecord]) -> None:
+        raise NotImplementedError
+
+    def _store_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str,
+                      writes: list[WriteRecord], replace: bool) -> None:
+        raise NotImplementedError
+
+    def _fetch_checkpoint(self, thread_id: str, checkpoint_ns: str,
+                          checkpoint_id: str | None) -> CheckpointRecord | None:
+        """checkpoint_id 為 None 時回傳最新的 checkpoint。"""
+        raise NotImplementedError
+
+    def _fetch_checkpoints(self, thread_id: str | None, checkpoint_ns: str | None,
+                           before_id: str | None, limit: int | None) -> Iterable[CheckpointRecord]:
+        """依 checkpoint_id 由新到舊列出；thread_id / checkpoint_ns 為 None 時不限制。"""
+        raise NotImplementedError
+
+    def _fetch_blobs(self, thread_id: str, checkpoint_ns: str,
+                     keys: list[tuple[str, str]]) -> dict[tuple[str, str], BlobRecord]:
+        raise NotImplementedError
+
+    def _fetch_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> list[WriteRecord]:
+        """依 (task_id, idx) 排序。"""
+        raise NotImplementedError
+
+    def _prune(self, thread_id: str, checkpoints: list[tuple[str, str]],
+               blobs: list[tuple[str, str, str]]) -> None:
+        """刪除 (ns, checkpoint_id) 的 checkpoint 與其 writes，以及 (ns, channel, version) 的 blob。"""
+        raise NotImplementedError
+
+    def _delete_thread(self, thread_id: str) -> None:
+        raise NotImplementedError
+
+    def list_threads(self) -> list[tuple[str, float]]:
+        """回傳所有對話的 (thread_id, 最後寫入時間)。"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def vacuum(self) -> dict:
+        """回收刪除資料後留下的空間；預設不需要 (例如 Redis 刪除鍵即釋放記憶體)。"""
+        return {}
+
+    def latest_metadata(self, thread_id: str, checkpoint_ns: str = "") -> CheckpointMetadata | None:
+        """只讀取最新 checkpoint 的 metadata，不載入 channel 的值。"""
+        record = self._fetch_checkpoint(thread_id, checkpoint_ns, None)
+        return _metadata_serde.loads(record.metadata) if record is not None else None
+
+    # --- 編碼 ---
+    def _encode_blob(self, thread_id: str, checkpoint_ns: str, channel: str, version: str, value: Any) -> BlobRecord:
+        if value is _EMPTY:
+            return BlobRecord(channel, version, "empty")
+        if not isinstance(value, list):
+            return BlobRecord(channel, version, "full", *self.serde.dumps_typed(value))
+
+        key = (thread_id, checkpoint_ns, channel)
+        with self._tails_lock:
+            tail = self._tails.get(key)
+        record = None
+        if tail is not None:
+            base_version, base, chain = tail
+            if (len(chain) < self.keyframe_interval and len(value) >= len(base)
+                    and all(a is b or a == b for a, b in zip(base, value))):
+                record = BlobRecord(channel, version, "delta", *self.serde.dumps_typed(value[len(base):]), chain=chain)
+        if record is None:
+            self.full_blobs += 1
+            record = BlobRecord(channel, version, "full", *self.serde.dumps_typed(value))
+        else:
+            self.delta_blobs += 1
+        with self._tails_lock:
+            self._tails[key] = (version, list(value), record.chain + (version,))
+        return record
+
+    def _load_values(self, thread_id: str, checkpoint_ns: str, channel_versions: ChannelVersions) -> dict:
+        values = {}
+        keys = []
+        for channel, version in channel_versions.items():
+            version = str(version)
+            with self._tails_lock:
+                tail = self._tails.get((thread_id, checkpoint_ns, channel))
+            if tail is not None and tail[0] == version:
+                # 最新一版的訊息剛寫入/讀取過，不必再反序列化整段對話
+                values[channel] = list(tail[1])
+                self.tail_hits += 1
+            else:
+                keys.append((channel, version))
+        blobs = self._fetch_blobs(thread_id, checkpoint_ns, keys)
+        missing = {(blob.channel, v) for blob in blobs.values() if blob.kind == "delta" for v in blob.chain}
+        missing.difference_update(blobs)
+        if missing:
+            blobs.update(self._fetch_blobs(thread_id, checkpoint_ns, list(missing)))
+
+        for channel, version in keys:
+            blob = blobs.get((channel, version))
+            if blob is None or blob.kind == "empty":
+                continue
+            if blob.kind == "full":
+                values[channel] = self.serde.loads_typed((blob.type, blob.value))
+                chain = (version,)
+            else:
+                value = []
+                for part_version in blob.chain + (version,):
+                    part = blobs[(channel, part_version)]
+                    value.extend(self.serde.loads_typed((part.type, part.value)))
+                values[channel] = value
+                chain = blob.chain + (version,)
+            if isinstance(values[channel], list):
+                # 讓下一次寫入可以只存增量
+                with self._tails_lock:
+                    self._tails.setdefault((thread_id, checkpoint_ns, channel), (version, list(values[channel]), chain))
+        return values
+
+    def _to_tuple(self, record: CheckpointRecord, metadata: CheckpointMetadata | None = None) -> CheckpointTuple:
+        checkpoint: Checkpoint = self.serde.loads_typed((record.type, record.checkpoint))
+        checkpoint["channel_values"] = self._load_values(record.thread_id, record.checkpoint_ns,
+                                                         checkpoint["channel_versions"])
+        writes = self._fetch_writes(record.thread_id, record.checkpoint_ns, record.checkpoint_id)
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": record.thread_id,
+                "checkpoint_ns": record.checkpoint_ns,
+                "checkpoint_id": record.checkpoint_id,
+            }},
+            checkpoint=checkpoint,
+            metadata=metadata if metadata is not None else _metadata_serde.loads(record.metadata),
+            parent_config={"configurable": {
+                "thread_id": record.thread_id,
+                "checkpoint_ns": record.checkpoint_ns,
+                "checkpoint_id": record.parent_checkpoint_id,
+            }} if record.parent_checkpoint_id else None,
+            pending_writes=[(w.task_id, w.channel, self.serde.loads_typed((w.type, w.value))) for w in writes],
+        )
+
+    # --- BaseCheckpointSaver ---
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        configurable = config["configurable"]
+        record = self._fetch_checkpoint(configurable["thread_id"], configurable.get("checkpoint_ns", ""),
+                                        get_checkpoint_id(config))
+        return self._to_tuple(record) if record is not None else None
+
+    def list(self, config: RunnableConfig | None, *, filter: dict[str, Any] | None = None,
+             before: RunnableConfig | None = None, limit: int | None = None) -> Iterator[CheckpointTuple]:
+        configurable = (config or {}).get("configurable", {})
+        thread_id = configurable.get("thread_id")
+        checkpoint_ns = configurable.get("checkpoint_ns")
+        checkpoint_id = configurable.get("checkpoint_id")
+        if checkpoint_id is not None:
+            record = self._fetch_checkpoint(thread_id, checkpoint_ns or "", checkpoint_id)
+            records = [record] if record is not None else []
+        else:
+            records = self._fetch_checkpoints(thread_id, checkpoint_ns, get_checkpoint_id(before) if before else None,
+                                              None if filter else limit)
+        count = 0
+        for record in records:
+            metadata = _metadata_serde.loads(record.metadata)
+            if filter and any(metadata.get(k) != v for k, v in filter.items()):
+                continue
+            yield self._to_tuple(record, metadata)
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        copy = checkpoint.copy()
+        values = copy.pop("channel_values")
+        blobs = [
+            self._encode_blob(thread_id, checkpoint_ns, channel, str(version), values.get(channel, _EMPTY))
+            for channel, version in new_versions.items()
+        ]
+        type_, data = self.serde.dumps_typed(copy)
+        self._store_checkpoint(CheckpointRecord(
+            thread_id=thread_id,
+            checkpoint_ns=checkpoint_ns,
+            checkpoint_id=checkpoint["id"],
+            parent_checkpoint_id=configurable.get("checkpoint_id"),
+            type=type_,
+            checkpoint=data,
+            metadata=_metadata_serde.dumps(get_checkpoint_metadata(config, metadata)),
+            created_at=time.time(),
+        ), blobs)
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        configurable = config["configurable"]
+        records = [
+            WriteRecord(task_id, task_path, WRITES_IDX_MAP.get(channel, idx), channel, *self.serde.dumps_typed(value))
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        # 與 SqliteSaver 相同：特殊 channel (錯誤、中斷等) 可覆寫，一般寫入已存在時保留原值
+        replace = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+        self._store_writes(configurable["thread_id"], configurable.get("checkpoint_ns", ""),
+                           configurable["checkpoint_id"], records, replace)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._delete_thread(thread_id)
+        self._forget_tails({thread_id})
+
+    def _forget_tails(self, thread_ids: set[str]) -> None:
+        """丟棄這些對話的 _tails，下一次寫入存完整內容 (例如寫入失敗，增量依附的版本沒有 commit)。"""
+        with self._tails_lock:
+            for key in [k for k in self._tails if k[0] in thread_ids]:
+                self._tails.pop(key, None)
+
+    def get_next_version(self, current: str | None, channel) -> str:
+        # 與 SqliteSaver 相同的版本格式：遞增的序號加上隨機尾碼
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # --- 非同步版本：在 executor 中執行同步方法，讓 ASGI 版本也能使用 ---
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_tuple, config)
+
+    async def alist(self, config: RunnableConfig | None, *, filter: dict[str, Any] | None = None,
+                    before: RunnableConfig | None = None, limit: int | None = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.delete_thread, thread_id)
+
+    # --- 壓縮 ---
+    def compact(self, thread_id: str, keep: int = CHECKPOINT_KEEP_PER_THREAD,
+                min_age: float = CHECKPOINT_COMPACT_MIN_AGE_SECONDS) -> int:
+        """
+        每個 checkpoint namespace 只保留最新的 keep 個 checkpoint (比 min_age 秒新的一律保留)，
+        刪除其餘的 checkpoint、writes，以及只被它們引用的 blob。回傳刪除的 checkpoint 數。
+        """
+        cutoff = time.time() - min_age
+        by_ns: dict[str, list[CheckpointRecord]] = {}
+        for record in self._fetch_checkpoints(thread_id, None, None, None):
+            by_ns.setdefault(record.checkpoint_ns, []).append(record)
+
+        dropped_checkpoints, dropped_blobs = [], []
+        for checkpoint_ns, records in by_ns.items():
+            kept = [r for i, r in enumerate(records) if i < keep or r.created_at > cutoff]
+            dropped = [r for i, r in enumerate(records) if not (i < keep or r.created_at > cutoff)]
+            if not dropped:
+                continue
+            keep_keys = self._referenced_blobs(thread_id, checkpoint_ns, kept)
+            drop_keys = self._referenced_blobs(thread_id, checkpoint_ns, dropped) - keep_keys
+            dropped_checkpoints.extend((checkpoint_ns, r.checkpoint_id) for r in dropped)
+            dropped_blobs.extend((checkpoint_ns, channel, version) for channel, version in drop_keys)
+        if dropped_checkpoints:
+            self._prune(thread_id, dropped_checkpoints, dropped_blobs)
+        return len(dropped_checkpoints)
+
+    def _referenced_blobs(self, thread_id: str, checkpoint_ns: str,
+                          records: list[CheckpointRecord]) -> set[tuple[str, str]]:
+        """checkpoint 直接引用的 blob，加上重建 delta 需要的整條版本鏈。"""
+        keys = set()
+        for record in records:
+            checkpoint = self.serde.loads_typed((record.type, record.checkpoint))
+            keys.update((channel, str(version)) for channel, version in checkpoint["channel_versions"].items())
+        blobs = self._fetch_blobs(thread_id, checkpoint_ns, list(keys))
+        for blob in blobs.values():
+            keys.update((blob.channel, version) for version in blob.chain)
+        return keys
+
+    def compact_all(self, keep: int = CHECKPOINT_KEEP_PER_THREAD,
+                    min_age: float = CHECKPOINT_COMPACT_MIN_AGE_SECONDS) -> dict:
+        """壓縮所有對話；回傳處理的對話數與刪除的 checkpoint 數。"""
+        threads = pruned = 0
+        for thread_id, _ in self.list_threads():
+            threads += 1
+            pruned += self.compact(thread_id, keep=keep, min_age=min_age)
+        return {"threads": threads, "pruned_checkpoints": pruned}
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__, "full_list_blobs": self.full_blobs, "delta_blobs": self.delta_blobs,
+                "tail_hits": self.tail_hits}
@@ -0,0 +1,222 @@
+# graph/checkpoint/redis_saver.py
+"""
+Redis 版本的 checkpointer，與 Celery 共用已部署的 Redis (使用另一個資料庫編號)。
+
+鍵的配置 (prefix 預設為 "checkpoint")：
+- {prefix}:cp:{thread}:{ns}:{checkpoint_id}   hash：checkpoint 本身與 metadata
+- {prefix}:idx:{thread}:{ns}                   sorted set (score 皆為 0，以字典序排列 checkpoint_id)
+- {prefix}:ns:{thread}                         set：這個對話用過的 namespace
+- {prefix}:blob:{thread}:{ns}:{channel}:{ver}  hash：channel 值或訊息增量
+- {prefix}:blobs:{thread}                      set：這個對話所有 blob 的鍵，刪除對話時使用
+- {prefix}:writes:{thread}:{ns}:{id}           hash：{task_id}:{idx} -> 值；writes_meta 存 channel 等欄位
+- {prefix}:threads                             sorted set：thread_id -> 最後寫入時間
+
+每次 put 以一個 MULTI/EXEC pipeline 寫入，讀取最新狀態約需 4 次往返 (與對話長度無關)。
+checkpoint 沒有設定 TTL，Redis 的 maxmemory-policy 不可以是 allkeys-*，否則對話狀態會被淘汰。
+"""
+from __future__ import annotations
+
+import json
+from typing import Iterable
+
+from graph.checkpoint.base import DeltaCheckpointSaver, CheckpointRecord, BlobRecord, WriteRecord
+from config import CHECKPOINT_REDIS_URL
+
+
+def _text(value) -> str | None:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+class RedisSaver(DeltaCheckpointSaver):
+    """以 Redis 儲存的 checkpointer。"""
+
+    def __init__(self, url: str = CHECKPOINT_REDIS_URL, *, prefix: str = "checkpoint", client=None, **kwargs):
+        super().__init__(**kwargs)
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, socket_timeout=5, socket_connect_timeout=2)
+        self._client = client
+        self._prefix = prefix
+
+    # --- 鍵 ---
+    def _cp_key(self, thread_id: str, ns: str, checkpoint_id: str) -> str:
+        return f"{self._prefix}:cp:{thread_id}:{ns}:{checkpoint_id}"
+
+    def _idx_key(self, thread_id: str, ns: str) -> str:
+        return f"{self._prefix}:idx:{thread_id}:{ns}"
+
+    def _ns_key(self, thread_id: str) -> str:
+        return f"{self._prefix}:ns:{thread_id}"
+
+    def _blob_key(self, thread_id: str, ns: str, channel: str, version: str) -> str:
+        return f"{self._prefix}:blob:{thread_id}:{ns}:{channel}:{version}"
+
+    def _blobs_key(self, thread_id: str) -> str:
+        return f"{self._prefix}:blobs:{thread_id}"
+
+    def _writes_key(self, thread_id: str, ns: str, checkpoint_id: str) -> str:
+        return f"{self._prefix}:writes:{thread_id}:{ns}:{checkpoint_id}"
+
+    def _writes_meta_key(self, thread_id: str, ns: str, checkpoint_id: str) -> str:
+        return f"{self._prefix}:writes_meta:{thread_id}:{ns}:{checkpoint_id}"
+
+    @property
+    def _threads_key(self) -> str:
+        return f"{self._prefix}:threads"
+
+    def ping(self) -> bool:
+        return bool(self._client.ping())
+
+    def close(self) -> None:
+        self._client.close()
+
+    # --- 寫入原語 ---
+    def _store_checkpoint(self, record: CheckpointRecord, blobs: list[BlobRecord]) -> None:
+        thread_id, ns = record.thread_id, record.checkpoint_ns
+        pipe = self._client.pipeline(transaction=True)
+        for blob in blobs:
+            key = self._blob_key(thread_id, ns, blob.channel, blob.version)
+            fields = {"kind": blob.kind, "chain": json.dumps(blob.chain)}
+            if blob.kind != "empty":
+                fields.update({"type": blob.type, "value": blob.value})
+            pipe.hset(key, mapping=fields)
+            pipe.sadd(self._blobs_key(thread_id), key)
+        pipe.hset(self._cp_key(thread_id, ns, record.checkpoint_id), mapping={
+            "parent": record.parent_checkpoint_id or "",
+            "type": record.type,
+            "checkpoint": record.checkpoint,
+            "metadata": record.metadata,
+            "created_at": record.created_at,
+        })
+        pipe.zadd(self._idx_key(thread_id, ns), {record.checkpoint_id: 0})
+        pipe.sadd(self._ns_key(thread_id), ns)
+        pipe.zadd(self._threads_key, {thread_id: record.created_at})
+        pipe.execute()
+
+    def _store_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str,
+                      writes: list[WriteRecord], replace: bool) -> None:
+        values_key = self._writes_key(thread_id, checkpoint_ns, checkpoint_id)
+        meta_key = self._writes_meta_key(thread_id, checkpoint_ns, checkpoint_id)
+        pipe = self._client.pipeline(transaction=True)
+        for w in writes:
+            field = f"{w.task_id}:{w.idx:08d}"
+            meta = json.dumps({"task_id": w.task_id, "task_path": w.task_path, "idx": w.idx,
+                               "channel": w.channel, "type": w.type})
+            if replace:
+                pipe.hset(meta_key, field, meta)
+                pipe.hset(values_key, field, w.value)
+            else:
+                pipe.hsetnx(meta_key, field, meta)
+                pipe.hsetnx(values_key, field, w.value)
+        pipe.execute()
+
+    def _prune(self, thread_id: str, checkpoints: list[tuple[str, str]],
+               blobs: list[tuple[str, str, str]]) -> None:
+        pipe = self._client.pipeline(transaction=True)
+        for ns, checkpoint_id in checkpoints:
+            pipe.delete(self._cp_key(thread_id, ns, checkpoint_id),
+                        self._writes_key(thread_id, ns, checkpoint_id),
+                        self._writes_meta_key(thread_id, ns, checkpoint_id))
+            pipe.zrem(self._idx_key(thread_id, ns), checkpoint_id)
+        for ns, channel, version in blobs:
+            key = self._blob_key(thread_id, ns, channel, version)
+            pipe.delete(key)
+            pipe.srem(self._blobs_key(thread_id), key)
+        pipe.execute()
+
+    def _delete_thread(self, thread_id: str) -> None:
+        keys = [self._ns_key(thread_id), self._blobs_key(thread_id)]
+        keys.extend(_text(k) for k in self._client.smembers(self._blobs_key(thread_id)))
+        for ns in self._client.smembers(self._ns_key(thread_id)):
+            ns = _text(ns)
+            keys.append(self._idx_key(thread_id, ns))
+            for checkpoint_id in self._client.zrange(self._idx_key(thread_id, ns), 0, -1):
+                checkpoint_id = _text(checkpoint_id)
+                keys.extend([self._cp_key(thread_id, ns, checkpoint_id),
+                              self._writes_key(thread_id, ns, checkpoint_id),
+                              self._writes_meta_key(thread_id, ns, checkpoint_id)])
+        pipe = self._client.pipeline(transaction=True)
+        for i in range(0, len(keys), 500):
+            pipe.delete(*keys[i:i + 500])
+        pipe.zrem(self._threads_key, thread_id)
+        pipe.execute()
+
+    # --- 讀取原語 ---
+    def _record(self, thread_id: str, ns: str, checkpoint_id: str, data: dict) -> CheckpointRecord | None:
+        if not data:
+            return None
+        return CheckpointRecord(
+            thread_id=thread_id,
+            checkpoint_ns=ns,
+            checkpoint_id=checkpoint_id,
+            parent_checkpoint_id=_text(data[b"parent"]) or None,
+            type=_text(data[b"type"]),
+            checkpoint=data[b"checkpoint"],
+            metadata=data[b"metadata"],
+            created_at=float(data[b"created_at"]),
+        )
+
+    def _fetch_checkpoint(self, thread_id: str, checkpoint_ns: str,
+                          checkpoint_id: str | None) -> CheckpointRecord | None:
+        if checkpoint_id is None:
+            latest = self._client.zrevrangebylex(self._idx_key(thread_id, checkpoint_ns), "+", "-", start=0, num=1)
+            if not latest:
+                return None
+            checkpoint_id = _text(latest[0])
+        return self._record(thread_id, checkpoint_ns, checkpoint_id,
+                            self._client.hgetall(self._cp_key(thread_id, checkpoint_ns, checkpoint_id)))
+
+    def _fetch_checkpoints(self, thread_id: str | None, checkpoint_ns: str | None,
+                           before_id: str | None, limit: int | None) -> Iterable[CheckpointRecord]:
+        thread_ids = [thread_id] if thread_id is not None else [t for t, _ in self.list_threads()]
+        locations = []
+        for tid in thread_ids:
+            namespaces = ([checkpoint_ns] if checkpoint_ns is not None
+                          else sorted(_text(ns) for ns in self._client.smembers(self._ns_key(tid))))
+            for ns in namespaces:
+                upper = f"({before_id}" if before_id is not None else "+"
+                ids = self._client.zrevrangebylex(self._idx_key(tid, ns), upper, "-",
+                                                  **({"start": 0, "num": limit} if limit is not None else {}))
+                locations.extend((tid, ns, _text(cid)) for cid in ids)
+        # 與 SQLite 版本相同，依 checkpoint_id 由新到舊
+        locations.sort(key=lambda loc: loc[2], reverse=True)
+        if limit is not None:
+            locations = locations[:limit]
+
+        pipe = self._client.pipeline(transaction=False)
+        for tid, ns, cid in locations:
+            pipe.hgetall(self._cp_key(tid, ns, cid))
+        records = [self._record(tid, ns, cid, data) for (tid, ns, cid), data in zip(locations, pipe.execute())]
+        return [r for r in records if r is not None]
+
+    def _fetch_blobs(self, thread_id: str, checkpoint_ns: str,
+                     keys: list[tuple[str, str]]) -> dict[tuple[str, str], BlobRecord]:
+        if not keys:
+            return {}
+        pipe = self._client.pipeline(transaction=False)
+        for channel, version in keys:
+            pipe.hgetall(self._blob_key(thread_id, checkpoint_ns, channel, version))
+        blobs = {}
+        for (channel, version), data in zip(keys, pipe.execute()):
+            if data:
+                blobs[(channel, version)] = BlobRecord(
+                    channel, version, _text(data[b"kind"]), _text(data.get(b"type")), data.get(b"value"),
+                    tuple(json.loads(data[b"chain"])),
+                )
+        return blobs
+
+    def _fetch_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> list[WriteRecord]:
+        pipe = self._client.pipeline(transaction=False)
+        pipe.hgetall(self._writes_meta_key(thread_id, checkpoint_ns, checkpoint_id))
+        pipe.hgetall(self._writes_key(thread_id, checkpoint_ns, checkpoint_id))
+        metas, values = pipe.execute()
+        writes = []
+        for field, raw in metas.items():
+            meta = json.loads(raw)
+            writes.append(WriteRecord(meta["task_id"], meta["task_path"], meta["idx"], meta["channel"],
+                                      meta["type"], values.get(field)))
+        writes.sort(key=lambda w: (w.task_id, w.idx))
+        return writes
+
+    def list_threads(self) -> list[tuple[str, float]]:
+        return [(_text(t), score) for t, score in self._client.zrange(self._threads_key, 0, -1, withscores=True)]
@@ -0,0 +1,193 @@
+# graph/checkpoint/retention.py
+"""
+對話狀態的保存期限與冷儲存。
+
+每次 /api/chat 沒帶 thread_id 就會產生一個新的對話，checkpoint 若永遠不刪，檔案只會越來越大。
+sweep() 由 Celery beat 定期執行：
+- 已完成的對話 (最新的 checkpoint 是 finish 節點寫入的) 閒置超過 CHECKPOINT_ARCHIVE_AFTER_SECONDS：
+  整段對話以 LZMA 壓縮寫到 ArchiveStore，再從 checkpointer 刪除。
+- 其他對話閒置超過 CHECKPOINT_THREAD_TTL_SECONDS：視為放棄，直接刪除。
+被封存的對話再次被使用時，restore_if_archived() 會把它放回 checkpointer，使用者看不出差別。
+"""
+import os
+import re
+import time
+import lzma
+import hashlib
+import logging
+import tempfile
+from typing import Any
+
+from langgraph.checkpoint.base import CheckpointTuple
+
+from config import (
+    CHECKPOINT_ARCHIVE_DIR,
+    CHECKPOINT_ARCHIVE_AFTER_SECONDS,
+    CHECKPOINT_THREAD_TTL_SECONDS,
+)
+
+# graph.py 中 finish_node 註冊的節點名稱
+FINISH_NODE = "finish"
+_SAFE_THREAD_ID = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+
+class ArchiveStore:
+    """以檔案保存壓縮後的對話 (每個對話一個檔案)。"""
+
+    def __init__(self, root: str = CHECKPOINT_ARCHIVE_DIR):
+        self.root = root
+
+    def path(self, thread_id: str) -> str:
+        # thread_id 來自前端，不能直接當成路徑
+        name = thread_id if _SAFE_THREAD_ID.match(thread_id) else hashlib.sha256(thread_id.encode()).hexdigest()
+        return os.path.join(self.root, name[:2], f"{name}.ckpt.xz")
+
+    def exists(self, thread_id: str) -> bool:
+        return os.path.exists(self.path(thread_id))
+
+    def write(self, thread_id: str, data: bytes) -> int:
+        """壓縮後寫入 (先寫暫存檔再改名，不會留下寫一半的檔案)；回傳壓縮後的大小。"""
+        path = self.path(thread_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = lzma.compress(data, preset=6)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(compressed)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return len(compressed)
+
+    def read(self, thread_id: str) -> bytes | None:
+        try:
+            with open(self.path(thread_id), "rb") as f:
+                return lzma.decompress(f.read())
+        except FileNotFoundError:
+            return None
+
+    def delete(self, thread_id: str) -> None:
+        try:
+            os.unlink(self.path(thread_id))
+        except FileNotFoundError:
+            pass
+
+
+# --- 匯出 / 匯入 (只使用 BaseCheckpointSaver 的公開 API，任何後端都適用) ---
+def export_thread(saver, thread_id: str) -> list[CheckpointTuple]:
+    """依時間順序 (由舊到新) 取出對話所有的 checkpoint 與 pending writes。"""
+    return list(reversed(list(saver.list({"configurable": {"thread_id": thread_id}}))))
+
+
+def import_thread(saver, checkpoints: list[CheckpointTuple]) -> None:
+    """把 export_thread() 的結果依序寫回 checkpointer。"""
+    for item in checkpoints:
+        configurable = item.config["configurable"]
+        parent = item.parent_config or {"configurable": {
+            "thread_id": configurable["thread_id"],
+            "checkpoint_ns": configurable.get("checkpoint_ns", ""),
+        }}
+        saver.put(parent, item.checkpoint, item.metadata, item.checkpoint["channel_versions"])
+        by_task: dict[str, list[tuple[str, Any]]] = {}
+        for task_id, channel, value in item.pending_writes or []:
+            by_task.setdefault(task_id, []).append((channel, value))
+        for task_id, writes in by_task.items():
+            saver.put_writes(item.config, writes, task_id)
+
+
+def _dumps(saver, checkpoints: list[CheckpointTuple]) -> bytes:
+    payload = [
+        {
+            "config": c.config,
+            "checkpoint": c.checkpoint,
+            "metadata": c.metadata,
+            "parent_config": c.parent_config,
+            "pending_writes": [list(w) for w in c.pending_writes or []],
+        }
+        for c in checkpoints
+    ]
+    type_, data = saver.serde.dumps_typed(payload)
+    return type_.encode() + b"\n" + data
+
+
+def _loads(saver, raw: bytes) -> list[CheckpointTuple]:
+    type_, data = raw.split(b"\n", 1)
+    return [
+        CheckpointTuple(c["config"], c["checkpoint"], c["metadata"], c["parent_config"],
+                        [tuple(w) for w in c["pending_writes"]])
+        for c in saver.serde.loads_typed((type_.decode(), data))
+    ]
+
+
+# --- 封存與還原 ---
+def is_finished(saver, thread_id: str) -> bool:
+    """對話最新的 checkpoint 是否由 finish 節點寫入 (整個開團流程已完成)。"""
+    metadata = saver.latest_metadata(thread_id)
+    return bool(metadata) and FINISH_NODE in (metadata.get("writes") or {})
+
+
+def archive_thread(saver, store: ArchiveStore, thread_id: str) -> int | None:
+    """
+    把對話壓縮寫入冷儲存後從 checkpointer 刪除；回傳壓縮後的大小。
+    封存期間對話又有新的 checkpoint (使用者回來了) 時放棄封存並回傳 None。
+    """
+    checkpoints = export_thread(saver, thread_id)
+    if not checkpoints:
+        return None
+    size = store.write(thread_id, _dumps(saver, checkpoints))
+    latest = saver.get_tuple({"configurable": {"thread_id": thread_id}})
+    if latest is None or latest.config["configurable"]["checkpoint_id"] != checkpoints[-1].config["configurable"]["checkpoint_id"]:
+        store.delete(thread_id)
+        return None
+    saver.delete_thread(thread_id)
+    return size
+
+
+def restore_if_archived(saver, thread_id: str, store: ArchiveStore | None = None) -> bool:
+    """對話在冷儲存中、且 checkpointer 裡沒有時把它還原；回傳是否有還原。"""
+    store = store or default_store
+    if not store.exists(thread_id):
+        return False
+    if saver.get_tuple({"configurable": {"thread_id": thread_id}}) is not None:
+        return False
+    raw = store.read(thread_id)
+    if raw is None:
+        return False
+    import_thread(saver, _loads(saver, raw))
+    store.delete(thread_id)
+    logging.info(f"[Retention] Restored archived thread {thread_id}.")
+    return True
+
+
+def sweep(saver, store: ArchiveStore | None = None, *, ttl: float = CHECKPOINT_THREAD_TTL_SECONDS,
+          archive_after: float = CHECKPOINT_ARCHIVE_AFTER_SECONDS, now: float | None = None) -> dict:
+    """封存閒置的已完成對話、刪除過期的對話；回傳各類的數量。"""
+    store = store or default_store
+    now = time.time() if now is None else now
+    result = {"scanned": 0, "archived": 0, "archived_bytes": 0, "expired": 0}
+    if not hasattr(saver, "list_threads"):
+        result["skipped"] = f"{type(saver).__name__} does not support retention."
+        return result
+
+    for thread_id, updated_at in saver.list_threads():
+        result["scanned"] += 1
+        idle = now - updated_at
+        if idle < min(ttl, archive_after):
+            continue
+        try:
+            if idle >= archive_after and is_finished(saver, thread_id):
+                size = archive_thread(saver, store, thread_id)
+                if size is not None:
+                    result["archived"] += 1
+                    result["archived_bytes"] += size
+            elif idle >= ttl:
+                saver.delete_thread(thread_id)
+                result["expired"] += 1
+        except Exception as e:
+            logging.warning(f"[Retention] Failed to process thread {thread_id}: {e}")
+    return result
+
+
+default_store = ArchiveStore()
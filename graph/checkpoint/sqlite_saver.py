@@ -0,0 +1,376 @@
+# graph/checkpoint/sqlite_saver.py
+"""
+SQLite 版本的 checkpointer：WAL 模式 + 批次寫入 (group commit)。
+
+- put / put_writes 只把要寫入的列放進佇列就返回；背景寫入執行緒最多等 flush_interval 秒、
+  或累積 max_batch 筆後，以一個 transaction 一起 commit，多個 Flask 執行緒同時對話時不必
+  各自等待 fsync。
+- 讀取某個對話前，若該對話還有未寫入的資料會先等它 commit，讀到的一定是最新狀態。
+- 批次寫入失敗時，錯誤記在批次中的每個對話上，只有 flush 這些對話 (或全部) 的呼叫端會收到；
+  這些對話的 _tails 與佇列中後續的寫入一併丟棄，下一次寫入存完整內容，不會依附沒有 commit 的版本。
+- 讀取使用每個執行緒各自的連線，WAL 模式下不會被寫入擋住。
+- 資料表與舊的 SqliteSaver (checkpoints / writes) 不同名，可以放在同一個檔案。
+"""
+from __future__ import annotations
+
+import os
+import json
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+from typing import Iterable
+
+from graph.checkpoint.base import DeltaCheckpointSaver, CheckpointRecord, BlobRecord, WriteRecord
+from config import (
+    CHECKPOINT_DB_PATH,
+    CHECKPOINT_FLUSH_INTERVAL_MS,
+    CHECKPOINT_MAX_BATCH,
+    SQLITE_BUSY_TIMEOUT_MS,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cp_checkpoints (
+    thread_id            TEXT NOT NULL,
+    checkpoint_ns        TEXT NOT NULL DEFAULT '',
+    checkpoint_id        TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type                 TEXT,
+    checkpoint           BLOB,
+    metadata             BLOB,
+    created_at           REAL NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS cp_blobs (
+    thread_id     TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel       TEXT NOT NULL,
+    version       TEXT NOT NULL,
+    kind          TEXT NOT NULL,
+    chain         TEXT,
+    type          TEXT,
+    value         BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS cp_writes (
+    thread_id     TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id       TEXT NOT NULL,
+    idx           INTEGER NOT NULL,
+    channel       TEXT NOT NULL,
+    type          TEXT,
+    value         BLOB,
+    task_path     TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS cp_threads (
+    thread_id  TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL
+);
+"""
+
+_INSERT_CHECKPOINT = (
+    "INSERT OR REPLACE INTO cp_checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+    "type, checkpoint, metadata, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_INSERT_BLOB = (
+    "INSERT OR IGNORE INTO cp_blobs (thread_id, checkpoint_ns, channel, version, kind, chain, type, value) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_TOUCH_THREAD = (
+    "INSERT INTO cp_threads (thread_id, updated_at) VALUES (?, ?) "
+    "ON CONFLICT(thread_id) DO UPDATE SET updated_at = excluded.updated_at"
+)
+_WRITE_COLUMNS = "(thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path)"
+_CHECKPOINT_COLUMNS = (
+    "thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata, created_at"
+)
+
+
+class BatchedSqliteSaver(DeltaCheckpointSaver):
+    """WAL 模式、背景批次寫入的 SQLite checkpointer。"""
+
+    def __init__(self, path: str = CHECKPOINT_DB_PATH, *, flush_interval: float = CHECKPOINT_FLUSH_INTERVAL_MS / 1000,
+                 max_batch: int = CHECKPOINT_MAX_BATCH, **kwargs):
+        super().__init__(**kwargs)
+        # 讀寫各用不同的連線，必須是檔案 (測試用的記憶體版本請用 MemorySaver)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._local = threading.local()
+        self._write_conn = self._connect()
+        self._write_conn.executescript(_SCHEMA)
+
+        self._cond = threading.Condition()
+        # (thread_id, sql, rows)
+        self._queue: list[tuple[str, str, list[tuple]]] = []
+        self._seq = 0
+        self._committed = 0
+        self._pending: dict[str, int] = {}
+        self._urgent = False
+        self._closed = False
+        # thread_id -> 該對話尚未回報給呼叫端的寫入錯誤
+        self._errors: dict[str, Exception] = {}
+        self.batches = 0
+        self.statements = 0
+        self._writer = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {int(SQLITE_BUSY_TIMEOUT_MS)}")
+        # 只對新建立的檔案生效 (必須在切換 WAL 之前)；既有的檔案在第一次 vacuum() 時轉換
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode = WAL")
+        # WAL 模式下 NORMAL 已能保證一致性，且不必每次 commit 都 fsync
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # --- 批次寫入 ---
+    def _enqueue(self, thread_id: str, statements: list[tuple[str, list[tuple]]]) -> None:
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Checkpointer is closed.")
+            # 寫入跟不上時讓呼叫端等一下，佇列不會無限成長
+            while len(self._queue) >= self.max_batch * 4:
+                self._urgent = True
+                self._cond.notify_all()
+                self._cond.wait()
+            self._queue.extend((thread_id, sql, rows) for sql, rows in statements)
+            self._seq += 1
+            self._pending[thread_id] = self._seq
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                # 等一小段時間，讓其他執行緒的寫入一起 commit
+                deadline = time.monotonic() + self.flush_interval
+                while not (self._closed or self._urgent) and len(self._queue) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._queue = self._queue, []
+                self._urgent = False
+                seq = self._seq
+                self._cond.notify_all()
+
+            error = None
+            try:
+                with self._write_conn:
+                    # 相鄰且相同的語句合併成一次 executemany
+                    for sql, rows in _coalesce((sql, rows) for _, sql, rows in batch):
+                        self._write_conn.executemany(sql, rows)
+            except Exception as e:
+                logging.exception(f"[Checkpoint] Failed to commit {len(batch)} statements: {e}")
+                error = e
+
+            with self._cond:
+                self.batches += 1
+                self.statements += len(batch)
+                self._committed = seq
+                if error is not None:
+                    failed = {thread_id for thread_id, _, _ in batch}
+                    for thread_id in failed:
+                        self._errors[thread_id] = error
+                    # 佇列中這些對話後續的寫入可能是依附失敗版本的增量，一併丟棄
+                    self._queue = [entry for entry in self._queue if entry[0] not in failed]
+                    for thread_id in failed:
+                        self._pending.pop(thread_id, None)
+                    if not self._queue:
+                        self._committed = self._seq
+                    self._forget_tails(failed)
+                for thread_id in [t for t, s in self._pending.items() if s <= seq]:
+                    del self._pending[thread_id]
+                self._cond.notify_all()
+
+    def flush(self, thread_id: str | None = None) -> None:
+        """等到 (指定對話或全部) 已排入佇列的寫入都 commit；這些寫入失敗時拋出例外。"""
+        with self._cond:
+            target = self._pending.get(thread_id) if thread_id is not None else self._seq
+            if target and self._committed < target:
+                self._urgent = True
+                self._cond.notify_all()
+                while self._committed < target and self._writer.is_alive():
+                    self._cond.wait()
+            if thread_id is not None:
+                error = self._errors.pop(thread_id, None)
+            else:
+                error = next(iter(self._errors.values()), None)
+                self._errors.clear()
+        if error is not None:
+            raise RuntimeError(f"Checkpoint write failed: {error}") from error
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        self._write_conn.close()
+
+    def vacuum(self) -> dict:
+        """
+        回收已刪除對話的空間並截斷 WAL 檔。檔案已是 incremental auto_vacuum 時只釋放空頁，
+        否則做一次完整的 VACUUM (會短暫鎖住整個檔案) 並順便轉為 incremental。
+        """
+        self.flush()
+        before = _file_size(self.path)
+        conn = self._connect()
+        try:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                mode = "incremental"
+                conn.execute("PRAGMA incremental_vacuum").fetchall()
+            else:
+                mode = "full"
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        finally:
+            conn.close()
+        return {"mode": mode, "bytes_before": before, "bytes_after": _file_size(self.path)}
+
+    # --- 寫入原語 ---
+    def _store_checkpoint(self, record: CheckpointRecord, blobs: list[BlobRecord]) -> None:
+        statements = []
+        if blobs:
+            statements.append((_INSERT_BLOB, [
+                (record.thread_id, record.checkpoint_ns, b.channel, b.version, b.kind,
+                 json.dumps(b.chain) if b.chain else None, b.type, b.value)
+                for b in blobs
+            ]))
+        statements.append((_INSERT_CHECKPOINT, [(
+            record.thread_id, record.checkpoint_ns, record.checkpoint_id, record.parent_checkpoint_id,
+            record.type, record.checkpoint, record.metadata, record.created_at,
+        )]))
+        statements.append((_TOUCH_THREAD, [(record.thread_id, record.created_at)]))
+        self._enqueue(record.thread_id, statements)
+
+    def _store_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str,
+                      writes: list[WriteRecord], replace: bool) -> None:
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        self._enqueue(thread_id, [(
+            f"{verb} INTO cp_writes {_WRITE_COLUMNS} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(thread_id, checkpoint_ns, checkpoint_id, w.task_id, w.idx, w.channel, w.type, w.value, w.task_path)
+             for w in writes],
+        )])
+
+    def _prune(self, thread_id: str, checkpoints: list[tuple[str, str]],
+               blobs: list[tuple[str, str, str]]) -> None:
+        self._enqueue(thread_id, [
+            ("DELETE FROM cp_checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+             [(thread_id, ns, cid) for ns, cid in checkpoints]),
+            ("DELETE FROM cp_writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+             [(thread_id, ns, cid) for ns, cid in checkpoints]),
+            ("DELETE FROM cp_blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+             [(thread_id, ns, channel, version) for ns, channel, version in blobs]),
+        ])
+        self.flush(thread_id)
+
+    def _delete_thread(self, thread_id: str) -> None:
+        self._enqueue(thread_id, [
+            (f"DELETE FROM {table} WHERE thread_id = ?", [(thread_id,)])
+            for table in ("cp_checkpoints", "cp_blobs", "cp_writes", "cp_threads")
+        ])
+        self.flush(thread_id)
+
+    # --- 讀取原語 ---
+    def _fetch_checkpoint(self, thread_id: str, checkpoint_ns: str,
+                          checkpoint_id: str | None) -> CheckpointRecord | None:
+        self.flush(thread_id)
+        if checkpoint_id is None:
+            row = self._reader().execute(
+                f"SELECT {_CHECKPOINT_COLUMNS} FROM cp_checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT 1",
+                (thread_id, checkpoint_ns),
+            ).fetchone()
+        else:
+            row = self._reader().execute(
+                f"SELECT {_CHECKPOINT_COLUMNS} FROM cp_checkpoints "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            ).fetchone()
+        return CheckpointRecord(*row) if row else None
+
+    def _fetch_checkpoints(self, thread_id: str | None, checkpoint_ns: str | None,
+                           before_id: str | None, limit: int | None) -> Iterable[CheckpointRecord]:
+        self.flush(thread_id)
+        clauses, params = [], []
+        if thread_id is not None:
+            clauses.append("thread_id = ?")
+            params.append(thread_id)
+        if checkpoint_ns is not None:
+            clauses.append("checkpoint_ns = ?")
+            params.append(checkpoint_ns)
+        if before_id is not None:
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        sql = f"SELECT {_CHECKPOINT_COLUMNS} FROM cp_checkpoints"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY checkpoint_id DESC"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [CheckpointRecord(*row) for row in self._reader().execute(sql, params).fetchall()]
+
+    def _fetch_blobs(self, thread_id: str, checkpoint_ns: str,
+                     keys: list[tuple[str, str]]) -> dict[tuple[str, str], BlobRecord]:
+        if not keys:
+            return {}
+        placeholders = ", ".join(["(?, ?)"] * len(keys))
+        rows = self._reader().execute(
+            "SELECT channel, version, kind, type, value, chain FROM cp_blobs "
+            f"WHERE thread_id = ? AND checkpoint_ns = ? AND (channel, version) IN (VALUES {placeholders})",
+            [thread_id, checkpoint_ns, *(part for key in keys for part in key)],
+        ).fetchall()
+        return {
+            (channel, version): BlobRecord(channel, version, kind, type_, value,
+                                           tuple(json.loads(chain)) if chain else ())
+            for channel, version, kind, type_, value, chain in rows
+        }
+
+    def _fetch_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> list[WriteRecord]:
+        rows = self._reader().execute(
+            "SELECT task_id, task_path, idx, channel, type, value FROM cp_writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return [WriteRecord(*row) for row in rows]
+
+    def list_threads(self) -> list[tuple[str, float]]:
+        self.flush()
+        return self._reader().execute("SELECT thread_id, updated_at FROM cp_threads").fetchall()
+
+    def stats(self) -> dict:
+        with self._cond:
+            queued = len(self._queue)
+        return {**super().stats(), "batches": self.batches, "statements": self.statements, "queued": queued}
+
+
+def _file_size(path: str) -> int:
+    return sum(os.path.getsize(p) for p in (path, f"{path}-wal") if os.path.exists(p))
+
+
+def _coalesce(batch: Iterable[tuple[str, list[tuple]]]) -> list[tuple[str, list[tuple]]]:
+    merged: list[tuple[str, list[tuple]]] = []
+    for sql, rows in batch:
+        if merged and merged[-1][0] == sql:
+            merged[-1][1].extend(rows)
+        else:
+            merged.append((sql, list(rows)))
+    return merged
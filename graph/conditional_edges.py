@@ -4,7 +4,7 @@ from graph.state import AgentState
 import logging
 
 
-def master_router(state: AgentState) -> Literal["provide_recommendations", "create_order_form", "call_model", "finish"]:
+def master_router(state: AgentState) -> Literal["provide_recommendations", "create_order_form", "call_model", "emit_reply", "finish"]:
     """
     根據 AgentState 中的資訊完整度來決定下一個節點。
     """
@@ -37,6 +37,11 @@ def master_router(state: AgentState) -> Literal["provide_recommendations", "crea
         logging.info("表單已建立，主要流程結束。")
         return "finish"
 
+    # 融合模式下回覆已經在 update_state 產生，不需要第二次 LLM 呼叫
+    if state.get("pending_reply"):
+        logging.info("資訊不完整，且已有預先產生的回覆。路由至 emit_reply。")
+        return "emit_reply"
+
     # 如果以上條件都不滿足，則讓 AI 出面與使用者對話
     logging.info("資訊不完整，讓 AI 詢問使用者。路由至 call_model。")
     return "call_model"
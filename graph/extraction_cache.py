@@ -0,0 +1,206 @@
+# graph/extraction_cache.py
+"""
+update_state_node 的擷取快取，讓重複或近似的使用者輸入不必每次都呼叫 LLM。
+
+依序嘗試：
+1. 規則擷取：Email 與常見的截止時間說法 (例如「今天五點收單」)，整句都能被規則涵蓋時直接回傳。
+2. 精確比對：正規化後的輸入完全相同時，沿用上次的擷取結果。
+3. 相似度比對：以字元 bigram 的 Jaccard 相似度找最接近的歷史輸入，超過門檻且
+   快取結果中的每個值都出現在新輸入裡時才沿用 (避免「我選 A 店」誤用「我選 B 店」的結果)。
+4. 以上都沒有命中才呼叫 LLM，並把結果寫回快取。
+"""
+import re
+import logging
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+
+from utils.cache import build_cache, CACHE_REGISTRY
+from utils.telemetry import record_cache_lookup
+from config import (
+    REDIS_URL,
+    EXTRACTION_CACHE_BACKEND,
+    EXTRACTION_CACHE_TTL_SECONDS,
+    EXTRACTION_CACHE_MAXSIZE,
+    EXTRACTION_SIMILARITY_THRESHOLD,
+)
+
+# 只接受 ASCII：\w 會比對到中文，「我的信箱是abc@x.com」的前綴會被當成地址的一部分
+EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+")
+_CN_NUM = "零一二兩三四五六七八九十"
+DEADLINE_RE = re.compile(
+    r"(?P<day>今天|明天|後天|今日|明日|(?:這|下)?(?:週|星期|禮拜)[一二三四五六日天])?\s*"
+    r"(?P<period>早上|上午|中午|下午|傍晚|晚上)?\s*"
+    rf"(?:\d{{1,2}}|[{_CN_NUM}]{{1,3}})\s*(?:點|時|:|：)\s*"
+    rf"(?:半|\d{{1,2}}\s*分?|[{_CN_NUM}]{{1,3}}分)?"
+    r"(?=\s*(?P<suffix>收單|截止|結單|前)?)"
+)
+# 規則擷取後，剩下的字只有這些時，視為整句都已被規則涵蓋
+_FILLER_RE = re.compile(
+    r"收單|截止|時間|結單|前|我的|信箱|電子郵件|email|e-mail|mail|是|為|在|請|就|喔|哦|囉|吧|了|的|"
+    r"[\s,，.。!！~～:：、]"
+)
+_NORMALIZE_RE = re.compile(r"[\s,，.。!！?？~～:：、\"'「」]+")
+
+
+def normalize_input(text: str) -> str:
+    """NFKC 正規化、轉小寫並移除空白與標點。"""
+    return _NORMALIZE_RE.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+def rule_extract(text: str) -> tuple[dict, bool]:
+    """
+    以規則擷取 Email 與截止時間。
+    回傳 (擷取結果, 是否整句都被規則涵蓋)。
+    """
+    extracted = {}
+    residual = text
+    if match := EMAIL_RE.search(text):
+        extracted["organizer_email"] = match.group(0)
+        residual = residual.replace(match.group(0), "")
+    for match in DEADLINE_RE.finditer(residual):
+        # 單獨的「一點」「兩點」多半不是時間 (「便宜一點」「有兩點想問」)，要有日期 / 時段或後面接著收單、截止
+        if match.group("day") or match.group("period") or match.group("suffix"):
+            extracted["deadline"] = match.group(0).strip()
+            residual = residual.replace(match.group(0), "")
+            break
+
+    covered = bool(extracted) and not _FILLER_RE.sub("", residual.lower())
+    return extracted, covered
+
+
+def _bigrams(text: str) -> set[str]:
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _grounded(result: dict, normalized: str) -> bool:
+    """快取結果中的每個值都必須出現在新輸入中，才能沿用；空的結果不算 (否則任何相似的輸入都會沿用)。"""
+    return bool(result) and all(normalize_input(str(v)) in normalized for v in result.values())
+
+
+class SimilarityIndex:
+    """以 bigram 倒排索引實作的近似輸入索引，容量滿時淘汰最舊的項目。"""
+
+    def __init__(self, maxsize: int, threshold: float):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self._entries: OrderedDict[str, tuple[set[str], dict]] = OrderedDict()
+        self._postings: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, normalized: str, result: dict) -> None:
+        grams = _bigrams(normalized)
+        with self._lock:
+            if normalized in self._entries:
+                self._entries.move_to_end(normalized)
+                self._entries[normalized] = (grams, result)
+                return
+            self._entries[normalized] = (grams, result)
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(normalized)
+            while len(self._entries) > self.maxsize:
+                old_key, (old_grams, _) = self._entries.popitem(last=False)
+                for gram in old_grams:
+                    keys = self._postings.get(gram)
+                    if keys:
+                        keys.discard(old_key)
+                        if not keys:
+                            del self._postings[gram]
+
+    def lookup(self, normalized: str) -> tuple[dict | None, float]:
+        """回傳 (最相似且通過檢查的擷取結果, 相似度)；找不到時回傳 (None, 最佳相似度)。"""
+        grams = _bigrams(normalized)
+        if not grams:
+            return None, 0.0
+        with self._lock:
+            shared = Counter()
+            for gram in grams:
+                shared.update(self._postings.get(gram, ()))
+            best, best_score = None, 0.0
+            for key, overlap in shared.most_common(20):
+                entry_grams, result = self._entries[key]
+                score = overlap / (len(grams) + len(entry_grams) - overlap)
+                if score > best_score and score >= self.threshold and _grounded(result, normalized):
+                    best, best_score = result, score
+        return best, best_score
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ExtractionCache:
+    """規則 + 精確比對 + 相似度比對的三段式擷取快取。"""
+
+    def __init__(self):
+        self.exact = build_cache(
+            "state_extraction_exact",
+            backend=EXTRACTION_CACHE_BACKEND,
+            maxsize=EXTRACTION_CACHE_MAXSIZE,
+            ttl=EXTRACTION_CACHE_TTL_SECONDS,
+            redis_url=REDIS_URL,
+        )
+        self.similar = SimilarityIndex(EXTRACTION_CACHE_MAXSIZE, EXTRACTION_SIMILARITY_THRESHOLD)
+        self.rule_hits = 0
+        self.similar_hits = 0
+        self.llm_calls = 0
+
+    def _lookup(self, user_input: str) -> tuple[dict | None, str]:
+        """回傳 (命中的結果或 None, 正規化後的輸入)。"""
+        rule_result, covered = rule_extract(user_input)
+        if covered:
+            self.rule_hits += 1
+            record_cache_lookup("state_extraction_rule", True)
+            logging.info(f"規則擷取已涵蓋整句輸入，略過 LLM: {rule_result}")
+            return rule_result, ""
+
+        normalized = normalize_input(user_input)
+        result = self.exact.get(normalized)
+        if result is not None:
+            logging.info(f"擷取快取 (精確比對) 命中: {result}")
+            return result, normalized
+
+        result, score = self.similar.lookup(normalized)
+        record_cache_lookup("state_extraction_similar", result is not None)
+        if result is not None:
+            self.similar_hits += 1
+            logging.info(f"擷取快取 (相似度 {score:.2f}) 命中: {result}")
+            return result, normalized
+        return None, normalized
+
+    def _store(self, normalized: str, llm_result: dict) -> dict:
+        self.llm_calls += 1
+        # 規則沒有涵蓋整句時以 LLM 的結果為準，不再補上規則擷取的欄位 (規則可能誤判)
+        result = {k: v for k, v in llm_result.items() if v}
+        if normalized:
+            self.exact.set(normalized, result)
+            self.similar.add(normalized, result)
+        return result
+
+    def extract(self, user_input: str, llm_extract) -> dict:
+        """取得擷取結果；快取都沒命中時呼叫 llm_extract(user_input)。"""
+        result, normalized = self._lookup(user_input)
+        if result is not None:
+            return result
+        return self._store(normalized, llm_extract(user_input))
+
+    async def aextract(self, user_input: str, allm_extract) -> dict:
+        """extract 的非同步版本，allm_extract 為 coroutine function。"""
+        result, normalized = self._lookup(user_input)
+        if result is not None:
+            return result
+        return self._store(normalized, await allm_extract(user_input))
+
+    def stats(self) -> dict:
+        return {
+            "rule_hits": self.rule_hits,
+            "exact_hits": self.exact.hits,
+            "similar_hits": self.similar_hits,
+            "llm_calls": self.llm_calls,
+            "similarity_index_size": len(self.similar),
+        }
+
+
+extraction_cache = ExtractionCache()
+CACHE_REGISTRY["state_extraction"] = extraction_cache
@@ -1,11 +1,17 @@
 # graph/graph.py
 from langgraph.graph import StateGraph, END
+from utils.telemetry import instrument_node, install_llm_callback
 from .state import AgentState
 from .nodes import (
     update_state_node,
+    aupdate_state_node,
     call_model,
+    acall_model,
+    emit_reply,
     provide_recommendations,
+    aprovide_recommendations,
     create_order_form,
+    acreate_order_form,
     schedule_summary_task, # ✨ 變更：導入新節點
     finish_node,
 )
@@ -15,12 +21,18 @@ from .conditional_edges import master_router, route_after_form_creation # ✨ 
 workflow = StateGraph(AgentState)
 
 # 1. 定義所有節點
-workflow.add_node("update_state", update_state_node)
-workflow.add_node("agent", call_model)
-workflow.add_node("recommend_restaurants", provide_recommendations)
-workflow.add_node("create_order_form", create_order_form)
-workflow.add_node("schedule_task", schedule_summary_task) # ✨ 變更：新增節點
-workflow.add_node("finish", finish_node)
+# 會呼叫 LLM 或外部 API 的節點同時提供同步與非同步版本：
+# graph.stream() 走同步函式，graph.astream() (ASGI 模式) 走非同步函式。
+# 每個節點都以 instrument_node 包裝，記錄耗時、LLM tokens、外部 API 呼叫與快取命中 (見 /metrics)。
+install_llm_callback()
+workflow.add_node("update_state", instrument_node("update_state", update_state_node, aupdate_state_node))
+workflow.add_node("agent", instrument_node("agent", call_model, acall_model))
+workflow.add_node("emit_reply", instrument_node("emit_reply", emit_reply))
+workflow.add_node("recommend_restaurants",
+                  instrument_node("recommend_restaurants", provide_recommendations, aprovide_recommendations))
+workflow.add_node("create_order_form", instrument_node("create_order_form", create_order_form, acreate_order_form))
+workflow.add_node("schedule_task", instrument_node("schedule_task", schedule_summary_task)) # ✨ 變更：新增節點
+workflow.add_node("finish", instrument_node("finish", finish_node))
 
 # 2. 設定圖的進入點
 workflow.set_entry_point("update_state")
@@ -33,6 +45,7 @@ workflow.add_conditional_edges(
         "provide_recommendations": "recommend_restaurants",
         "create_order_form": "create_order_form",
         "call_model": "agent",
+        "emit_reply": "emit_reply",
         "finish": "finish"
     }
 )
@@ -50,6 +63,7 @@ workflow.add_conditional_edges(
 
 # 5. 定義常規的邊 (節點之間的固定路徑)
 workflow.add_edge("agent", END)
+workflow.add_edge("emit_reply", END)
 workflow.add_edge("recommend_restaurants", END)
 workflow.add_edge("schedule_task", END) # ✨ 變更：新節點完成後結束
 workflow.add_edge("finish", END)
@@ -0,0 +1,106 @@
+# graph/history.py
+"""
+對話歷史管理：在固定的 token 預算內組出 prompt 用的對話歷史。
+
+- 只保留最近、落在 HISTORY_TOKEN_BUDGET 內的對話原文。
+- 超出預算的舊對話累積到 HISTORY_SUMMARY_TRIGGER_TOKENS 後，才呼叫一次 LLM 併入摘要，
+  摘要與已涵蓋的訊息數存在 state (history_summary / history_summarized_upto)，下一輪直接沿用。
+- 每輪只處理尚未被摘要的訊息，因此 prompt 大小與計算量不會隨對話長度成長。
+"""
+import json
+import logging
+
+from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.output_parsers import StrOutputParser
+
+from graph.state import AgentState
+from graph.prompt import history_summary_prompt
+from utils.tokens import estimate_tokens
+from config import HISTORY_TOKEN_BUDGET, HISTORY_SUMMARY_TRIGGER_TOKENS
+
+
+def _render_message(msg) -> str | None:
+    """將單則訊息轉成一行歷史紀錄；工具訊息與空訊息不列入。"""
+    if isinstance(msg, HumanMessage):
+        return f"人類: {msg.content}"
+    if not isinstance(msg, AIMessage) or not msg.content:
+        return None
+
+    content = msg.content
+    # 結構化的 JSON 訊息 (例如 restaurant_list) 只留下精簡描述，不把整包 JSON 塞進 prompt
+    if isinstance(content, str) and content.startswith("{"):
+        try:
+            payload = json.loads(content)
+        except ValueError:
+            payload = None
+        if isinstance(payload, dict) and payload.get("type") == "restaurant_list":
+            names = [r.get("name", "") for r in payload.get("data") or [] if isinstance(r, dict)]
+            return f"AI: [已推薦餐廳: {'、'.join(names)}]"
+        if isinstance(payload, dict) and str(payload.get("type", "")).startswith("form_created"):
+            return f"AI: [已建立訂單表單: {payload.get('data', {}).get('form_url', '')}]"
+    return f"AI: {content}"
+
+
+def _plan(state: AgentState):
+    """
+    決定這一輪要保留原文的訊息，以及需要併入摘要的訊息。
+    回傳 (保留的行, 要摘要的行, 新的 history_summarized_upto)。
+    """
+    messages = state["messages"][:-1]
+    start = state.get("history_summarized_upto") or 0
+
+    lines = []
+    total = 0
+    for i in range(start, len(messages)):
+        line = _render_message(messages[i])
+        if line:
+            tokens = estimate_tokens(line)
+            lines.append((i, line, tokens))
+            total += tokens
+
+    if total <= HISTORY_TOKEN_BUDGET + HISTORY_SUMMARY_TRIGGER_TOKENS:
+        return [line for _, line, _ in lines], [], start
+
+    # 從最舊的開始移出，直到剩下的原文落在預算內
+    cut = 0
+    while cut < len(lines) and total > HISTORY_TOKEN_BUDGET:
+        total -= lines[cut][2]
+        cut += 1
+    new_upto = lines[cut][0] if cut < len(lines) else len(messages)
+    return [line for _, line, _ in lines[cut:]], [line for _, line, _ in lines[:cut]], new_upto
+
+
+def _compose(summary: str | None, kept: list[str]) -> str:
+    parts = [f"先前對話摘要: {summary}"] if summary else []
+    parts.extend(kept)
+    return "\n".join(parts) + ("\n" if parts else "")
+
+
+def _summary_input(state: AgentState, evicted: list[str]) -> dict:
+    logging.info(f"對話歷史超出預算，將 {len(evicted)} 則舊訊息併入摘要。")
+    return {"summary": state.get("history_summary") or "（無）", "new_lines": "\n".join(evicted)}
+
+
+def build_chat_history(state: AgentState, llm) -> tuple[str, dict]:
+    """
+    組出本輪 prompt 用的對話歷史字串，需要摘要時使用傳入的 llm。
+    回傳 (歷史字串, 要寫回 state 的摘要更新；沒有更新時為空 dict)。
+    """
+    kept, evicted, new_upto = _plan(state)
+    if not evicted:
+        return _compose(state.get("history_summary"), kept), {}
+
+    chain = history_summary_prompt | llm | StrOutputParser()
+    summary = chain.invoke(_summary_input(state, evicted)).strip()
+    return _compose(summary, kept), {"history_summary": summary, "history_summarized_upto": new_upto}
+
+
+async def abuild_chat_history(state: AgentState, llm) -> tuple[str, dict]:
+    """build_chat_history 的非同步版本。"""
+    kept, evicted, new_upto = _plan(state)
+    if not evicted:
+        return _compose(state.get("history_summary"), kept), {}
+
+    chain = history_summary_prompt | llm | StrOutputParser()
+    summary = (await chain.ainvoke(_summary_input(state, evicted))).strip()
+    return _compose(summary, kept), {"history_summary": summary, "history_summarized_upto": new_upto}
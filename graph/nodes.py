@@ -1,82 +1,186 @@
 # graph/nodes.py
 
-from langchain_core.messages import ToolMessage, HumanMessage, AIMessage
+from langchain_core.messages import ToolMessage, AIMessage
+from langchain_core.runnables import RunnableConfig
 from graph.state import AgentState
+from graph.history import build_chat_history, abuild_chat_history
+from graph.extraction_cache import extraction_cache
 from graph.tools.tools_definition import tool_node, tools
-from graph.prompt import agent_system_prompt, state_update_prompt, parser
-from utils.llm_config import llm
+from graph.prompt import agent_system_prompt, state_update_prompt, parser, fused_turn_prompt, fused_parser
+from utils.llm_config import get_llm
+from utils.sse import structured_message, REPLY_STREAM_TAG, REPLY_JSON_STREAM_TAG
+from config import FUSED_TURN_MODE
 import json
-from celery_worker import tally_and_notify_task
-import dateparser
+import asyncio
+from graph.tools.summary_schedule import summary_scheduler
+from sql.menu_catalog import menu_catalog
 import logging
 
 
-def format_chat_history(chat_history: list) -> str:
-    """輔助函式，格式化對話歷史。"""
-    history_str = ""
-    for msg in chat_history:
-        if isinstance(msg, HumanMessage):
-            history_str += f"人類: {msg.content}\n"
-        elif isinstance(msg, AIMessage):
-            history_str += f"AI: {msg.content}\n"
-    return history_str
+def _tool_call_input(name: str, args: dict, tool_call_id: str) -> dict:
+    """輔助函式，建立直接呼叫 tool_node 所需的輸入。"""
+    return {"messages": [AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": tool_call_id}])]}
+
+
+def _filter_extracted(extracted_data: dict) -> dict:
+    """過濾掉值為 None 或空字串的鍵。"""
+    update_data = {k: v for k, v in extracted_data.items() if v}
+    if update_data:
+        logging.info(f"從使用者輸入中提取並更新狀態: {update_data}")
+    return update_data
+
+
+def _known_state(state: AgentState) -> str:
+    """輔助函式，列出目前 state 中已知的資訊，供融合模式的提示使用。"""
+    fields = {
+        "地點": state.get("location"),
+        "美食類型": state.get("food_type"),
+        "選擇的餐廳": state.get("selected_restaurant"),
+        "訂購主題": state.get("title"),
+        "截止時間": state.get("deadline"),
+        "發起人Email": state.get("organizer_email"),
+    }
+    lines = [f"- {k}: {v}" for k, v in fields.items() if v]
+    if state.get("recommendations"):
+        lines.append("- 已推薦餐廳列表給使用者")
+    return "\n".join(lines) or "（尚無）"
+
+
+def _fused_input(state: AgentState, chat_history: str) -> dict:
+    return {
+        "known_state": _known_state(state),
+        "chat_history": chat_history,
+        "input": state["messages"][-1].content,
+    }
+
+
+def _fused_update(response: AIMessage, history_update: dict) -> dict:
+    """將融合模式的輸出拆成狀態更新與預先產生的回覆。"""
+    result = fused_parser.invoke(response)
+    update_data = _filter_extracted(result.get("extracted") or {})
+    update_data["pending_reply"] = result.get("reply") or None
+    update_data["pending_reply_id"] = response.id
+    update_data.update(history_update)
+    return update_data
 
 
 def update_state_node(state: AgentState) -> dict:
     """在每次使用者輸入後，呼叫 LLM 解析並更新狀態。"""
     logging.info("---NODE: update_state_node---")
+    llm = get_llm()
     if not state["messages"]:
         return {}
 
+    if FUSED_TURN_MODE:
+        chat_history, history_update = build_chat_history(state, llm)
+        # 不接 parser：保留 LLM 訊息 (與串流 delta 相同的 id)，reply 欄位可以邊產生邊送給前端
+        chain = fused_turn_prompt | llm
+        response = chain.invoke(_fused_input(state, chat_history), config={"tags": [REPLY_JSON_STREAM_TAG]})
+        return _fused_update(response, history_update)
+
     user_input = state["messages"][-1].content
     chain = state_update_prompt | llm | parser
 
-    # 從使用者輸入中提取資訊
-    extracted_data = chain.invoke({"input": user_input})
-    # 過濾掉值為 None 或空字串的鍵
-    update_data = {k: v for k, v in extracted_data.items() if v}
+    # 從使用者輸入中提取資訊 (規則與快取都無法處理時才呼叫 LLM)
+    extracted_data = extraction_cache.extract(user_input, lambda text: chain.invoke({"input": text}))
+    return _filter_extracted(extracted_data)
 
-    if update_data:
-        logging.info(f"從使用者輸入中提取並更新狀態: {update_data}")
-        return update_data
 
-    return {}
+async def aupdate_state_node(state: AgentState) -> dict:
+    """update_state_node 的非同步版本，供 ASGI 模式使用。"""
+    logging.info("---NODE: update_state_node (async)---")
+    llm = get_llm()
+    if not state["messages"]:
+        return {}
+
+    if FUSED_TURN_MODE:
+        chat_history, history_update = await abuild_chat_history(state, llm)
+        chain = fused_turn_prompt | llm
+        response = await chain.ainvoke(_fused_input(state, chat_history), config={"tags": [REPLY_JSON_STREAM_TAG]})
+        return _fused_update(response, history_update)
 
+    user_input = state["messages"][-1].content
+    chain = state_update_prompt | llm | parser
 
-def call_model(state: AgentState):
-    """AI Agent 節點，專注於在資訊不足時向使用者提問。"""
-    logging.info("---NODE: call_model---")
-    chat_history = format_chat_history(state["messages"][:-1])
+    async def allm_extract(text):
+        return await chain.ainvoke({"input": text})
+
+    extracted_data = await extraction_cache.aextract(user_input, allm_extract)
+    return _filter_extracted(extracted_data)
+
+
+def _agent_prompt(state: AgentState, chat_history: str) -> str:
     user_input = state["messages"][-1].content
 
-    prompt_str = agent_system_prompt.format(
+    return agent_system_prompt.format(
         chat_history=chat_history,
         input=user_input
     )
-    response = llm.invoke(prompt_str)
-    return {"messages": [response]}
 
 
-def provide_recommendations(state: AgentState):
-    """主動從 state 中獲取資訊來執行餐廳搜尋工具。"""
-    logging.info("---NODE: provide_recommendations---")
+def call_model(state: AgentState):
+    """AI Agent 節點，專注於在資訊不足時向使用者提問。"""
+    logging.info("---NODE: call_model---")
+    llm = get_llm()
+    chat_history, history_update = build_chat_history(state, llm)
+    response = llm.invoke(_agent_prompt(state, chat_history), config={"tags": [REPLY_STREAM_TAG]})
+    return {"messages": [response], **history_update}
+
+
+async def acall_model(state: AgentState):
+    """call_model 的非同步版本，供 ASGI 模式使用。"""
+    logging.info("---NODE: call_model (async)---")
+    llm = get_llm()
+    chat_history, history_update = await abuild_chat_history(state, llm)
+    response = await llm.ainvoke(_agent_prompt(state, chat_history), config={"tags": [REPLY_STREAM_TAG]})
+    return {"messages": [response], **history_update}
+
+
+def emit_reply(state: AgentState):
+    """融合模式下，直接送出 update_state 已產生的回覆，不再呼叫 LLM。"""
+    logging.info("---NODE: emit_reply---")
+    message = AIMessage(content=state["pending_reply"], id=state.get("pending_reply_id"))
+    return {"messages": [message], "pending_reply": None, "pending_reply_id": None}
+
+
+def _search_query(state: AgentState) -> str | None:
     location = state.get("location")
     food_type = state.get("food_type")
-
     if not location or not food_type:
-        return {"messages": [AIMessage(content="我需要知道地點和美食類型才能為您推薦喔。")]}
+        return None
 
     query = f"{location}的{food_type}"
     logging.info(f"從 state 建構 query: {query}")
+    return query
+
+
+def provide_recommendations(state: AgentState):
+    """主動從 state 中獲取資訊來執行餐廳搜尋工具。"""
+    logging.info("---NODE: provide_recommendations---")
+    query = _search_query(state)
+    if not query:
+        return {"messages": [AIMessage(content="我需要知道地點和美食類型才能為您推薦喔。")]}
 
     tool_call_id = "manual_search_call"
     # 直接呼叫工具節點
-    tool_output = tool_node.invoke(
-        {"messages": [
-            AIMessage(content="", tool_calls=[{"name": "search_Maps", "args": {"query": query}, "id": tool_call_id}])]}
-    )
+    tool_output = tool_node.invoke(_tool_call_input("search_Maps", {"query": query}, tool_call_id))
+    return _recommendations_result(tool_output["messages"][-1].content, tool_call_id, query)
+
+
+async def aprovide_recommendations(state: AgentState):
+    """provide_recommendations 的非同步版本，供 ASGI 模式使用。"""
+    logging.info("---NODE: provide_recommendations (async)---")
+    query = _search_query(state)
+    if not query:
+        return {"messages": [AIMessage(content="我需要知道地點和美食類型才能為您推薦喔。")]}
+
+    tool_call_id = "manual_search_call"
+    tool_output = await tool_node.ainvoke(_tool_call_input("search_Maps", {"query": query}, tool_call_id))
+    return _recommendations_result(tool_output["messages"][-1].content, tool_call_id, query)
+
 
-    raw_tool_result = tool_output["messages"][-1].content
+def _recommendations_result(raw_tool_result: str, tool_call_id: str, query: str) -> dict:
+    """將 search_Maps 的原始輸出轉為節點的狀態更新。"""
     logging.info(f"Raw tool result (first 150 chars): {raw_tool_result[:150]}")
 
     # ✨ 變更：強化JSON解析和錯誤處理
@@ -90,36 +194,58 @@ def provide_recommendations(state: AgentState):
         return {"messages": [AIMessage(content=error_message)]}
 
     # 準備給前端的結構化資料
-    frontend_response = {"type": "restaurant_list", "data": restaurants_data}
     logging.info("已準備好給前端的結構化餐廳列表。")
 
     return {
         "messages": [
             ToolMessage(content=raw_tool_result, tool_call_id=tool_call_id),
-            AIMessage(content=json.dumps(frontend_response, ensure_ascii=False))
+            # 附上查詢字串，前端換篩選條件時可以用 /api/restaurants/rank 在本機重新排序
+            structured_message("restaurant_list", restaurants_data, query=query)
         ],
         "recommendations": restaurants_data
     }
 
 
-def create_order_form(state: AgentState):
-    """主動從 state 獲取資訊來建立Google表單。"""
-    logging.info("---NODE: create_order_form---")
+# 菜單目錄中找不到選擇的餐廳時使用的選項
+DEFAULT_MENU_ITEMS = ["紅茶", "綠茶", "奶茶", "烏龍茶"]
+
+
+def _form_args(state: AgentState) -> dict:
     title = state.get("title")
     selected_restaurant = state.get("selected_restaurant")
     deadline = state.get("deadline")
 
-    menu_items = ["紅茶", "綠茶", "奶茶", "烏龍茶"]
+    # 本機菜單目錄的快取 / 索引查詢，不呼叫外部服務
+    menu_items = menu_catalog.form_options(selected_restaurant)
+    if not menu_items:
+        logging.info(f"菜單目錄中沒有 '{selected_restaurant}'，使用預設的餐點選項。")
+        menu_items = DEFAULT_MENU_ITEMS
     description = f"訂購 '{selected_restaurant}' 的美味餐點！截止時間：{deadline}"
     logging.info(f"從 state 建構表單資訊: Title={title}, Restaurant={selected_restaurant}, Deadline={deadline}")
+    return {"title": title, "description": description, "menu_items": menu_items}
+
+
+def create_order_form(state: AgentState):
+    """主動從 state 獲取資訊來建立Google表單。"""
+    logging.info("---NODE: create_order_form---")
+    tool_call_id = "manual_form_call"
+    tool_output = tool_node.invoke(_tool_call_input("create_google_form", _form_args(state), tool_call_id))
+    return _form_result(state, tool_output["messages"][-1].content, tool_call_id)
+
 
+async def acreate_order_form(state: AgentState):
+    """create_order_form 的非同步版本，供 ASGI 模式使用。"""
+    logging.info("---NODE: create_order_form (async)---")
     tool_call_id = "manual_form_call"
-    tool_output = tool_node.invoke(
-        {"messages": [AIMessage(content="", tool_calls=[{"name": "create_google_form",
-                                                         "args": {"title": title, "description": description,
-                                                                  "menu_items": menu_items}, "id": tool_call_id}])]}
-    )
-    form_result_str = tool_output["messages"][-1].content
+    # 菜單目錄的快照過期時會查詢資料庫，不在事件迴圈中執行
+    form_args = await asyncio.get_running_loop().run_in_executor(None, _form_args, state)
+    tool_output = await tool_node.ainvoke(_tool_call_input("create_google_form", form_args, tool_call_id))
+    return _form_result(state, tool_output["messages"][-1].content, tool_call_id)
+
+
+def _form_result(state: AgentState, form_result_str: str, tool_call_id: str) -> dict:
+    """將 create_google_form 的原始輸出轉為節點的狀態更新。"""
+    title = state.get("title")
 
     try:
         form_result = json.loads(form_result_str)
@@ -148,27 +274,27 @@ def create_order_form(state: AgentState):
     logging.info("表單建立成功，準備將邀請訊息回傳給前端。")
 
     # 將最終的邀請訊息和結構化資料一起傳給前端
-    final_message_content = {
-        "type": "form_created_with_invitation",
-        "data": {
-            "form_url": form_url,
-            "sheet_url": sheet_url,
-            "message": invitation_message
-        }
+    final_message_data = {
+        "form_url": form_url,
+        "sheet_url": sheet_url,
+        "message": invitation_message
     }
 
     return {
         "messages": [
             ToolMessage(content=form_result_str, tool_call_id=tool_call_id),
-            AIMessage(content=json.dumps(final_message_content, ensure_ascii=False))
+            structured_message("form_created_with_invitation", final_message_data)
         ],
         "form_url": form_url,
         "sheet_url": sheet_url
     }
 
 
-def schedule_summary_task(state: AgentState):
-    """✨ 變更：新增節點，用於安排 Celery 背景任務。"""
+def schedule_summary_task(state: AgentState, config: RunnableConfig):
+    """
+    ✨ 變更：新增節點，用於安排 Celery 背景任務。
+    以 (thread_id, sheet_url, deadline) 冪等排程：使用者重送訊息不會重複統計，改了截止時間會取代原本的排程。
+    """
     logging.info("---NODE: schedule_summary_task---")
     deadline_str = state.get('deadline')
     sheet_url = state.get('sheet_url')
@@ -183,6 +309,10 @@ def schedule_summary_task(state: AgentState):
         logging.warning(message)
         return {"messages": [AIMessage(content=message)]}
 
+    # dateparser 與 celery_worker 匯入很慢，只有這個節點用到，執行時才匯入
+    import dateparser
+    from celery_worker import tally_and_notify_task
+
     # 使用 dateparser 來解析多樣的時間格式
     deadline_dt = dateparser.parse(deadline_str, settings={'PREFER_DATES_FROM': 'future', 'TIMEZONE': 'Asia/Taipei'})
     if not deadline_dt:
@@ -192,13 +322,23 @@ def schedule_summary_task(state: AgentState):
     # 準備通知渠道
     notification_channels = {"emails": [organizer_email]}
 
-    # 使用 apply_async 來設定 ETA (Estimated Time of Arrival)
-    tally_and_notify_task.apply_async(
-        args=[sheet_url, title, notification_channels],
-        eta=deadline_dt
+    # 以 ETA (Estimated Time of Arrival) 排定統計；同一組參數只會排一次
+    thread_id = config.get("configurable", {}).get("thread_id", "")
+    scheduled = summary_scheduler.schedule(
+        tally_and_notify_task,
+        thread_id=thread_id,
+        sheet_url=sheet_url,
+        title=title,
+        deadline=deadline_dt,
+        notification_channels=notification_channels,
     )
 
-    message = f"好的！我已經設定在 {deadline_dt.strftime('%Y-%m-%d %H:%M')} 為您統計「{title}」訂單，並會將結果寄到您的信箱。訂單連結已產生，您可以分享給同事了。"
+    if scheduled["deduplicated"]:
+        message = f"「{title}」已經排定在 {deadline_dt.strftime('%Y-%m-%d %H:%M')} 統計，不會重複寄送結果。"
+    else:
+        message = f"好的！我已經設定在 {deadline_dt.strftime('%Y-%m-%d %H:%M')} 為您統計「{title}」訂單，並會將結果寄到您的信箱。訂單連結已產生，您可以分享給同事了。"
+        if scheduled["replaced"]:
+            message += "原本排定的統計時間已取消。"
     logging.info(message)
     return {"messages": [AIMessage(content=message)]}
 
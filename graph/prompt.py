@@ -46,4 +46,55 @@ state_update_prompt = ChatPromptTemplate.from_template(
     {format_instructions}
     """,
     partial_variables={"format_instructions": parser.get_format_instructions()}
-)
\ No newline at end of file
+)
+
+# ✨ 變更：融合模式 (FUSED_TURN_MODE) 的提示，一次 LLM 呼叫同時完成狀態提取與回覆
+# 輸出格式以精簡的範例說明，避免 pydantic JSON schema 讓每輪的 prompt 膨脹。
+fused_parser = JsonOutputParser()
+fused_turn_prompt = ChatPromptTemplate.from_template(
+    """你是「智慧美食揪團小幫手」，一個樂於助人的 AI。這一次你要同時完成兩件事，並以 JSON 格式回傳：
+
+    1. `extracted`：從使用者的最新一句話中提取資訊。
+    可提取的欄位包含：'location', 'food_type', 'selected_restaurant', 'title', 'deadline', 'organizer_email'。
+    - `location` (地點): 使用者提到的明確地理位置，例如「信義區」、「南港軟體園區」。
+    - `food_type` (美食類型): 使用者想吃的東西，例如「下午茶」、「飲料」、「日式料理」。
+    - `selected_restaurant` (選擇的餐廳): 只有當使用者明確說出「我選」、「就選這家」、「決定是」等關鍵字時，才提取餐廳名稱。
+    - `title` (訂購主題): 為何而訂，例如「部門月會」、「週五下午茶」。如果使用者輸入「測試」、「隨便」，也將其視為主題。
+    - `deadline` (截止時間): 明確的時間點，例如「今天下午五點」、「明天中午12點」。
+    - `organizer_email` (發起人Email): 任何看起來像 Email 地址的字串。
+    - 句子中沒有的資訊，就**絕對不要**在 `extracted` 中包含那個鍵。
+
+    2. `reply`：結合「目前已知的資訊」與你剛提取的資訊，引導使用者完成下一步。
+    - 如果還不知道地點或美食類型，就詢問它們。
+    - 如果已經推薦了餐廳，就引導使用者選擇一家。
+    - 如果使用者選了餐廳，就引導他們提供建立訂單所需的資訊（主題、截止時間、發起人Email）。
+    - 當所有資訊都齊全時，簡短確認即可，不要再詢問。
+
+    目前已知的資訊:
+    {known_state}
+
+    目前的對話歷史:
+    {chat_history}
+
+    使用者的一句話: "{input}"
+
+    只輸出一個 JSON 物件，格式為: {{"extracted": {{"location": "南港軟體園區"}}, "reply": "給使用者的回覆"}}
+    """
+)
+
+# ✨ 變更：對話歷史的增量摘要提示
+history_summary_prompt = PromptTemplate.from_template(
+    """以下是一段揪團訂餐對話的既有摘要，以及之後新增的對話內容。
+    請把新增內容整合進摘要，輸出一份新的摘要。
+    - 保留對後續流程有用的資訊：地點、美食類型、推薦過的餐廳、使用者的選擇、主題、截止時間、Email 等。
+    - 省略寒暄與重複內容。
+    - 摘要不超過 150 字，只輸出摘要本身。
+
+    既有摘要:
+    {summary}
+
+    新增的對話:
+    {new_lines}
+
+    新的摘要:"""
+)
@@ -0,0 +1,37 @@
+# graph/render.py
+"""
+把 LangGraph 流程圖輸出成檔案 (原本 app.py 每次啟動都會呼叫 draw_mermaid_png)。
+
+    python -m graph.render                      # graph.png (透過 mermaid.ink 轉成圖片)
+    python -m graph.render --output graph.mmd   # 只輸出 Mermaid 原始碼，不需要網路
+
+流程有變動時手動執行一次，再把產生的檔案一起 commit。
+"""
+import os
+import argparse
+
+from graph.graph import workflow
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "graph.png")
+
+
+def render(output: str = DEFAULT_OUTPUT) -> str:
+    """依副檔名輸出 PNG 或 Mermaid 原始碼 (.mmd / .md)；回傳輸出的路徑。"""
+    drawable = workflow.compile().get_graph()
+    if output.endswith((".mmd", ".md")):
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(drawable.draw_mermaid())
+    else:
+        drawable.draw_mermaid_png(output_file_path=output)
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the LangGraph workflow diagram.")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help=".png, or .mmd for Mermaid source only")
+    args = parser.parse_args()
+    print(f"Graph written to {render(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
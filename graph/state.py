@@ -8,6 +8,9 @@ class AgentState(TypedDict):
     """
     # 對話歷史紀錄
     messages: Annotated[list[Any], operator.add]
+    # 較舊對話的增量摘要，以及已被摘要涵蓋的訊息數 (messages[:history_summarized_upto])
+    history_summary: str | None
+    history_summarized_upto: int | None
 
     # 使用者意圖相關資訊
     location: str | None
@@ -19,6 +22,10 @@ class AgentState(TypedDict):
     # 流程中間產物
     recommendations: list[dict] | None
     selected_restaurant: str | None
+    # 融合模式下，update_state 已經一併產生好的回覆 (由 emit_reply 節點送出)
+    pending_reply: str | None
+    # 產生 pending_reply 的 LLM 訊息 id；emit_reply 沿用它，前端才能把串流中的 delta 對上最後的訊息
+    pending_reply_id: str | None
 
     # 流程最終產物
     form_url: str | None
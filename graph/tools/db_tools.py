@@ -1,5 +1,6 @@
 # graph/tools/db_tools.py
 
+import zlib
 import logging
 import requests
 from datetime import datetime, timedelta
@@ -8,18 +9,39 @@ from typing import List
 # 引入 LangChain 工具裝飾器
 from langchain_core.tools import tool
 
-# 引入 gspread 來讀取 Google Sheet
-import gspread
+# 增量讀取 Google Sheet 回覆 (只抓新增的列)
+from graph.tools.sheet_ingest import get_sheet_reader
 
 # 引入資料庫 Session 和模型
-from sqlalchemy.orm import Session
-from sql.models.model import SessionLocal, GroupOrder, Department, User # MODIFIED
+from sql.models.model import GroupOrder
+from sql.session import session_scope
+from sql.order_queries import (
+    iter_due_orders,
+    iter_upcoming_orders,
+    fetch_orders,
+    claim_orders,
+    claim_reminders,
+    finish_tally,
+    release_stale_claims,
+)
+from sql.department_directory import department_directory
 # 引入設定
-from config import LINE_NOTIFY_TOKEN, OWNER_EMAIL
+from config import (
+    LINE_NOTIFY_TOKEN,
+    OWNER_EMAIL,
+    LINE_TARGET_ID,
+    ORDER_SWEEP_SHARDS,
+    ORDER_CLAIM_TIMEOUT_SECONDS,
+    ORDER_REMINDER_WINDOW_SECONDS,
+    ORDER_NOTIFY_MAX_ATTEMPTS,
+)
 
 # 引入新建立的 Email 和 LINE 工具
 from graph.tools.email_tools import send_email_tool
 from graph.tools.line_tools import send_line_message
+from graph.tools.line_notifier import get_line_notifier
+from graph.tools.notification_dispatcher import Delivery, dispatch
+from graph.tools.tally import tally_records, format_line_lines, format_html_table
 
 
 @tool
@@ -29,21 +51,17 @@ def get_department_emails_tool(department_name: str) -> List[str] | str:
     Use this tool to get a list of all member emails for a given department name from the database.
     """
     logging.info(f"[DB Tool] Fetching emails for department: {department_name}")
-    db: Session = SessionLocal()
-    try:
-        department = db.query(Department).filter(Department.name == department_name).first()
-        if not department:
-            logging.warning(f"Department '{department_name}' not found.")
-            return f"Error: Department '{department_name}' not found."
-        if not department.users:
-            logging.info(f"Department '{department_name}' has no members.")
-            return f"Info: Department '{department_name}' has no members."
+    # 一次 projection 查詢 (或直接命中快取)，不再逐一載入 department.users
+    emails = department_directory.emails_for(department_name)
+    if emails is None:
+        logging.warning(f"Department '{department_name}' not found.")
+        return f"Error: Department '{department_name}' not found."
+    if not emails:
+        logging.info(f"Department '{department_name}' has no members.")
+        return f"Info: Department '{department_name}' has no members."
 
-        emails = [user.email for user in department.users]
-        logging.info(f"Found {len(emails)} emails for department '{department_name}'.")
-        return emails
-    finally:
-        db.close()
+    logging.info(f"Found {len(emails)} emails for department '{department_name}'.")
+    return emails
 
 
 @tool
@@ -60,24 +78,23 @@ def notify_department_and_schedule_tasks_tool(
     and schedules a task to tally the results at the deadline.
     """
     logging.info(f"[DB Tool] Notifying {department_name} for order '{restaurant_name}'")
-    db: Session = SessionLocal()
     try:
         # 1. 解析截止時間
         deadline_dt = datetime.fromisoformat(deadline)
 
-        # 2. 將訂單資訊存入資料庫
-        new_order = GroupOrder(
-            id=f"{restaurant_name}-{deadline}",
-            restaurant_name=restaurant_name,
-            form_url=form_url,
-            response_sheet_id=response_sheet_id,
-            deadline=deadline_dt,
-            status='open',
-            department_name=department_name
-        )
-        db.add(new_order)
-        db.commit()
-        logging.info(f"Order '{new_order.id}' saved to database.")
+        # 2. 將訂單資訊存入資料庫 (寄信前就歸還連線，不在網路 I/O 期間佔用連線池)
+        order_id = f"{restaurant_name}-{deadline}"
+        with session_scope() as db:
+            db.add(GroupOrder(
+                id=order_id,
+                restaurant_name=restaurant_name,
+                form_url=form_url,
+                response_sheet_id=response_sheet_id,
+                deadline=deadline_dt,
+                status='open',
+                department_name=department_name
+            ))
+        logging.info(f"Order '{order_id}' saved to database.")
 
         # 3. 取得部門成員 Email 並發送通知信
         emails = get_department_emails_tool.invoke({"department_name": department_name})
@@ -96,7 +113,7 @@ def notify_department_and_schedule_tasks_tool(
 
             # 4. 使用新的 Messaging API 工具發送確認訊息給預設的管理員
             line_message = f"✅ 訂單建立成功\n餐廳：{restaurant_name}\n通知部門：{department_name}"
-            send_line_message.invoke({"message_text": line_message})
+            send_line_message.invoke({"line_token": LINE_TARGET_ID, "message": line_message})
 
             logging.info(f"Successfully notified {len(emails)} members of {department_name}.")
             return f"Successfully scheduled task, sent email to {len(emails)} members, and sent a LINE confirmation."
@@ -105,129 +122,189 @@ def notify_department_and_schedule_tasks_tool(
             return f"Scheduled task, but failed to send email notifications. Reason: {emails}"
 
     except Exception as e:
-        db.rollback()
         logging.error(f"Error in notify_department_and_schedule_tasks_tool: {e}", exc_info=True)
         return f"An error occurred: {e}"
-    finally:
-        db.close()
 
 
-def check_and_remind_orders():
+def check_and_remind_orders(order_ids: list[str] | None = None):
     """
-    一個由 APScheduler 定時執行的背景函式，用於檢查即將到期的訂單並發送提醒。
-    A background function executed by APScheduler to check for expiring orders and send reminders.
+    檢查即將截止的訂單並發送提醒 (由 Celery beat 的 sweep_orders 分片後，在 worker 中執行)。
+    order_ids 為 None 時處理所有即將截止、尚未提醒的訂單。
+    每張訂單以 reminded_at 原子地認領，多個 worker 或重複的 sweep 也只會提醒一次。
     """
-    db: Session = SessionLocal()
-    try:
+    # 認領與讀取訂單在一個短的 session 中完成，讀取 Google Sheet 與推播時不佔用資料庫連線
+    with session_scope() as db:
         now = datetime.now()
-        reminder_window = now + timedelta(hours=1)
-        upcoming_orders = db.query(GroupOrder).filter(
-            GroupOrder.status == 'open',
-            GroupOrder.deadline > now,
-            GroupOrder.deadline <= reminder_window
-        ).all()
-        logging.info(f"[Reminder] Found {len(upcoming_orders)} upcoming orders to remind.")
+        if order_ids is None:
+            reminder_window = now + timedelta(seconds=ORDER_REMINDER_WINDOW_SECONDS)
+            # 以 keyset 分批取出即將截止的訂單 (走 status + deadline 複合索引)
+            order_ids = [order.id for batch in iter_upcoming_orders(db, now, reminder_window, unreminded_only=True)
+                         for order in batch]
+        claimed = claim_reminders(db, order_ids, now)
+        orders = fetch_orders(db, claimed)
+    if not orders:
+        return
 
-        for order in upcoming_orders:
-            # 此處可以加入發送 LINE 或 Email 提醒的邏輯
-            logging.info(f"[Reminder] Sending reminder for order '{order.restaurant_name}' due at {order.deadline}.")
-            reminder_message = f"🔔 訂餐提醒\n餐廳「{order.restaurant_name}」的訂單將在一小時後截止，還沒填單的同仁請盡快處理喔！"
-            send_line_message.invoke({"message_text": reminder_message})
+    notifier = get_line_notifier()
+    reader = get_sheet_reader()
+    for order in orders:
+        # 此處可以加入發送 LINE 或 Email 提醒的邏輯
+        logging.info(f"[Reminder] Sending reminder for order '{order.restaurant_name}' due at {order.deadline}.")
+        reminder_message = f"🔔 訂餐提醒\n餐廳「{order.restaurant_name}」的訂單將在一小時後截止，還沒填單的同仁請盡快處理喔！"
+        # 截止前的即時統計：只會抓上次讀取後新增的列
+        if reader and order.response_sheet_id:
+            try:
+                running = tally_records(reader.read(order.response_sheet_id))
+                if running:
+                    reminder_message += f"\n目前已有 {running.total} 份訂單。"
+            except Exception as e:
+                logging.warning(f"[Reminder] Running tally failed for order {order.id}: {e}")
+        if LINE_TARGET_ID:
+            notifier.enqueue(LINE_TARGET_ID, reminder_message)
+    logging.info(f"[Reminder] Sent reminders for {len(orders)} upcoming orders.")
+
+    # 同一個對象的提醒合併推播 (每次最多 5 則)
+    notifier.flush()
+
+
+def _tally_order(order, reader, notifier) -> tuple[set[str], bool]:
+    """
+    統計單一訂單並送出先前還沒送達的通道 (order.notified_channels 記錄已送達的)。
+    回傳 (已送達的通道, 是否全部送達)；逾時而結果不明的通道也算在已送達中，不再重送，避免重複通知。
+    """
+    delivered = set(filter(None, (order.notified_channels or "").split(",")))
+    try:
+        logging.info(f"Processing order: {order.restaurant_name} (ID: {order.id})")
+        # 1. 從 Google Sheet 讀取回覆 (最終統計整張重新同步，確保包含被修改過的回覆)
+        responses = reader.read(order.response_sheet_id, full=True)
+
+        # 2. 準備 Email 和 LINE 的統計結果訊息
+        email_summary_html = f"<h3>【訂餐統計結果】</h3><h4>餐廳：{order.restaurant_name}</h4>"
+        line_summary_text = f"📊 訂單統計完成\n餐廳：{order.restaurant_name}\n----------\n"
+
+        result = tally_records(responses)
+        if not result or not result.items:
+            email_summary_html += "<p>本次訂餐無人填寫。</p>"
+            line_summary_text += "本次訂餐無人填寫。"
+            participant_emails = []
+        else:
+            participant_emails = result.participant_emails
+            email_summary_html += format_html_table(result)
+            line_summary_text += format_line_lines(result)
+
+        # 3. 準備統計結果給開團者 (Email + LINE)
+        logging.info(f"Tally summary for LINE for order {order.id}:\n{line_summary_text}")
+        logging.info(f"Tally summary for Email for order {order.id}:\n{email_summary_html}")
+        deliveries = [Delivery("organizer_email", lambda: send_email_tool.invoke({
+            "recipients": [OWNER_EMAIL],
+            "subject": f"訂餐統計完成 - {order.restaurant_name}",
+            "body": email_summary_html
+        }))]
+        if LINE_TARGET_ID:
+            deliveries.append(Delivery("line", lambda: notifier.push(LINE_TARGET_ID, [line_summary_text])))
+
+        # 4. 準備確認信給所有填寫者
+        if participant_emails:
+            unique_participant_emails = list(set(filter(None, participant_emails)))
+            confirmation_subject = f"【訂餐完成確認】您已成功預訂 {order.restaurant_name}"
+            confirmation_body = f"""
+            <p>您好，</p>
+            <p>您參與的 <b>{order.restaurant_name}</b> 訂餐已截止，您的訂單已為您處理。</p>
+            <p>感謝您的參與！</p>
+            """
+            deliveries.append(Delivery("participant_email", lambda: send_email_tool.invoke({
+                "recipients": unique_participant_emails,
+                "subject": confirmation_subject,
+                "body": confirmation_body
+            })))
+
+        # 各通道並行送出 (只送還沒送達的)，耗時取決於最慢的通道
+        report = dispatch([d for d in deliveries if d.channel not in delivered])
+        logging.info(f"Delivery report for order {order.id}: {report.to_dict()}")
+        delivered.update(report.settled)
+        return delivered, all(d.channel in delivered for d in deliveries)
 
-    finally:
-        db.close()
+    except Exception as e:
+        logging.error(f"Error processing order {order.id}: {e}", exc_info=True)
+        return delivered, False
 
 
-def tally_and_notify_orders():
+def tally_and_notify_orders(order_ids: list[str] | None = None):
     """
-    一個由 APScheduler 定時執行的背景函式。
-    它會找出所有已過期但狀態仍為 'open' 的訂單，從 Google Sheet 抓取回覆、
-    統計結果，並透過 Email 和 LINE 發送給相關人員。
+    統計已過截止時間的訂單 (由 Celery beat 的 sweep_orders 分片後，在 worker 中執行)。
+    order_ids 為 None 時處理所有已過期但狀態仍為 'open' 的訂單。
+    每張訂單在要處理時才以 open -> tallying 的狀態轉換認領 (只有認領到的 worker 會統計)，
+    從 Google Sheet 抓取回覆、統計後以 Email 和 LINE 發送，全部送達後立即結單。
+    有通道失敗時記下已送達的通道並放回 open，下次 sweep 只重送失敗的通道；
+    派送 ORDER_NOTIFY_MAX_ATTEMPTS 次仍未全部送達的訂單改為 notify_failed，不再重試。
+    一次只認領一張，claimed_at 與結單之間只有這張訂單的處理時間，不會因為同一分片中其他訂單較慢
+    而超過 ORDER_CLAIM_TIMEOUT_SECONDS，被 release_stale_claims 放回 open 後重複統計。
     """
-    db: Session = SessionLocal()
-    now = datetime.now()
-    expired_orders = db.query(GroupOrder).filter(
-        GroupOrder.status == 'open',
-        GroupOrder.deadline <= now
-    ).all()
-
-    if not expired_orders:
+    if order_ids is None:
+        with session_scope() as db:
+            order_ids = [order.id for batch in iter_due_orders(db, datetime.now()) for order in batch]
+    if not order_ids:
+        return
+    reader = get_sheet_reader()
+    if reader is None:
+        logging.error("Error initializing gspread: Google 服務未初始化。")
         return
+    notifier = get_line_notifier()
+
+    counts = {"closed": 0, "open": 0, "notify_failed": 0}
+    for order_id in order_ids:
+        with session_scope() as db:
+            claimed = claim_orders(db, [order_id], datetime.now())
+            orders = fetch_orders(db, claimed)
+        if not orders:
+            # 已被其他 worker 認領或已結單
+            continue
+        order = orders[0]
+        delivered, done = _tally_order(order, reader, notifier)
+        # 5. 記下已送達的通道並更新訂單狀態
+        with session_scope() as db:
+            status = finish_tally(db, order.id, delivered, done=done, max_attempts=ORDER_NOTIFY_MAX_ATTEMPTS)
+        if status is None:
+            logging.warning(f"[Tallying] Claim on order {order.id} expired before it was finished.")
+            continue
+        counts[status] += 1
+        if status == "notify_failed":
+            logging.error(f"[Tallying] Order {order.id} gave up after {ORDER_NOTIFY_MAX_ATTEMPTS} attempts, "
+                          f"delivered: {sorted(delivered)}")
+        if status != "open":
+            reader.forget(order.response_sheet_id)
+    logging.info(f"[Tallying] {counts['closed']} orders closed, {counts['open']} released for retry, "
+                 f"{counts['notify_failed']} failed.")
 
-    logging.info(f"[Tallying] Found {len(expired_orders)} expired orders to process.")
 
-    try:
-        gc = gspread.service_account(filename='google_credentials.json')
-    except Exception as e:
-        logging.error(f"Error initializing gspread: {e}", exc_info=True)
-        db.close() #<-- Added this line
-        return
+def shard_order_ids(order_ids, shards: int) -> dict[int, list[str]]:
+    """依訂單 id 的 CRC32 分片；同一張訂單每次都會落在同一個分片。"""
+    buckets: dict[int, list[str]] = {}
+    for order_id in order_ids:
+        buckets.setdefault(zlib.crc32(order_id.encode("utf-8")) % shards, []).append(order_id)
+    return buckets
 
-    for order in expired_orders:
-        try:
-            logging.info(f"Processing order: {order.restaurant_name} (ID: {order.id})")
-            # 1. 從 Google Sheet 讀取回覆
-            sheet = gc.open_by_key(order.response_sheet_id)
-            worksheet = sheet.sheet1
-            responses = worksheet.get_all_records()
-
-            # 2. 準備 Email 和 LINE 的統計結果訊息
-            email_summary_html = f"<h3>【訂餐統計結果】</h3><h4>餐廳：{order.restaurant_name}</h4>"
-            line_summary_text = f"📊 訂單統計完成\n餐廳：{order.restaurant_name}\n----------\n"
-
-            if not responses:
-                email_summary_html += "<p>本次訂餐無人填寫。</p>"
-                line_summary_text += "本次訂餐無人填寫。"
-                participant_emails = []
-            else:
-                participant_emails = [resp.get('您的 Email', '').strip() for resp in responses if
-                                      resp.get('您的 Email')]
-                meal_counts = {}
-                for resp in responses:
-                    meal = resp.get('您要點的餐點', '未填寫')
-                    meal_counts[meal] = meal_counts.get(meal, 0) + 1
-
-                email_summary_html += "<table border='1' cellpadding='5' cellspacing='0'><tr><th>餐點</th><th>數量</th></tr>"
-                for meal, count in sorted(meal_counts.items()):
-                    email_summary_html += f"<tr><td>{meal}</td><td>{count}</td></tr>"
-                    line_summary_text += f"▪️ {meal}: {count} 份\n"
-                email_summary_html += "</table>"
-
-            # 3. 發送統計結果給開團者 (Email + LINE)
-            logging.info(f"Tally summary for LINE for order {order.id}:\n{line_summary_text}")
-            logging.info(f"Tally summary for Email for order {order.id}:\n{email_summary_html}")
-            send_email_tool.invoke({
-                "recipients": [OWNER_EMAIL],
-                "subject": f"訂餐統計完成 - {order.restaurant_name}",
-                "body": email_summary_html
-            })
-            send_line_message.invoke({"message_text": line_summary_text})
-            logging.info(f"Sent tally summary to {OWNER_EMAIL} and LINE for order {order.id}.")
-
-            # 4. 發送確認信給所有填寫者
-            if participant_emails:
-                unique_participant_emails = list(set(filter(None, participant_emails)))
-                confirmation_subject = f"【訂餐完成確認】您已成功預訂 {order.restaurant_name}"
-                confirmation_body = f"""
-                <p>您好，</p>
-                <p>您參與的 <b>{order.restaurant_name}</b> 訂餐已截止，您的訂單已為您處理。</p>
-                <p>感謝您的參與！</p>
-                """
-                send_email_tool.invoke({
-                    "recipients": unique_participant_emails,
-                    "subject": confirmation_subject,
-                    "body": confirmation_body
-                })
-                logging.info(f"Sent confirmation to {len(unique_participant_emails)} participants for order {order.id}.")
-
-            # 5. 更新訂單狀態
-            order.status = 'closed'
-            db.commit()
-            logging.info(f"Order {order.id} status updated to 'closed'.")
-
-        except Exception as e:
-            logging.error(f"Error processing order {order.id}: {e}", exc_info=True)
-            db.rollback()
-            continue
 
-    db.close()
\ No newline at end of file
+def sweep_orders(send_tally, send_reminders, shards: int = ORDER_SWEEP_SHARDS) -> dict:
+    """
+    由 Celery beat 定期呼叫：釋放逾時的認領，從 (status, deadline) 索引找出已截止與即將截止的訂單，
+    依 id 分片後以 send_tally(shard, ids) / send_reminders(shard, ids) 交給 worker。
+    只查詢到期的訂單，open 訂單再多也不影響這一步的耗時。
+    """
+    with session_scope() as db:
+        now = datetime.now()
+        released = release_stale_claims(db, now - timedelta(seconds=ORDER_CLAIM_TIMEOUT_SECONDS))
+        if released:
+            logging.warning(f"[Sweep] Released {released} stale order claims.")
+        due = [order.id for batch in iter_due_orders(db, now) for order in batch]
+        upcoming = [
+            order.id
+            for batch in iter_upcoming_orders(db, now, now + timedelta(seconds=ORDER_REMINDER_WINDOW_SECONDS),
+                                              unreminded_only=True)
+            for order in batch
+        ]
+    for shard, ids in shard_order_ids(due, shards).items():
+        send_tally(shard, ids)
+    for shard, ids in shard_order_ids(upcoming, shards).items():
+        send_reminders(shard, ids)
+    return {"due": len(due), "upcoming": len(upcoming), "released": released}
@@ -1,12 +1,10 @@
 # graph/tools/email_tools.py
 
 import logging
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from typing import List
 from langchain_core.tools import tool
-from config import SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD
+from graph.tools.mail_transport import OutgoingEmail, get_mail_pool
+
 
 @tool
 def send_email_tool(recipients: List[str], subject: str, body: str) -> str:
@@ -14,25 +12,34 @@ def send_email_tool(recipients: List[str], subject: str, body: str) -> str:
     發送電子郵件給指定的收件人列表。
     Use this tool to send an email to a list of recipients.
     """
-    if not all([SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD]):
+    pool = get_mail_pool()
+    if pool is None:
         logging.error("SMTP server is not configured in .env file.")
         return "Error: SMTP server is not configured in .env file."
 
-    message = MIMEMultipart()
-    message["From"] = SMTP_USERNAME
-    message["To"] = ", ".join(recipients)
-    message["Subject"] = subject
-    message.attach(MIMEText(body, "html")) # 使用 HTML 格式
-
     try:
         logging.info(f"[Email Tool] Sending email to {len(recipients)} recipients with subject: '{subject}'")
-        server = smtplib.SMTP(SMTP_SERVER, int(SMTP_PORT))
-        server.starttls()
-        server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        server.sendmail(SMTP_USERNAME, recipients, message.as_string())
-        server.quit()
+        # 使用連線池中已登入的連線，不再每封信都重新 STARTTLS 與登入
+        pool.send(OutgoingEmail(recipients=recipients, subject=subject, body=body))
         logging.info(f"Successfully sent email to {', '.join(recipients)}.")
         return f"Successfully sent email to {len(recipients)} recipients."
     except Exception as e:
         logging.error(f"Error sending email: {e}", exc_info=True)
-        return f"Error sending email: {e}"
\ No newline at end of file
+        return f"Error sending email: {e}"
+
+
+def send_bulk_emails(emails: List[OutgoingEmail]) -> str:
+    """
+    大量寄信：每封信可以有各自的收件人、主旨與內容，共用連線池中的連線寄出。
+    """
+    pool = get_mail_pool()
+    if pool is None:
+        logging.error("SMTP server is not configured in .env file.")
+        return "Error: SMTP server is not configured in .env file."
+
+    logging.info(f"[Email Tool] Sending {len(emails)} emails in bulk.")
+    errors = [e for e in pool.send_bulk(emails) if e]
+    if errors:
+        logging.error(f"Failed to send {len(errors)} of {len(emails)} emails: {errors[:3]}")
+        return f"Sent {len(emails) - len(errors)} of {len(emails)} emails. Errors: {errors[:3]}"
+    return f"Successfully sent {len(emails)} emails."
@@ -0,0 +1,122 @@
+# graph/tools/google_clients.py
+"""
+Google API 用戶端池。
+
+httplib2 為基礎的 discovery client 不是 thread-safe，多個 Flask 執行緒共用同一個
+forms_service / drive_service 會互相阻塞，甚至拿到錯亂的回應。這裡改為：
+- 所有 client 共用同一個 requests.Session (AuthorizedSession)，底層是可重複使用連線的 urllib3 連線池。
+- Forms / Drive 的 discovery client 以 threading.local 每個執行緒各建一份，透過轉接器走共用的 Session。
+- gspread client 本身就建立在 requests.Session 上，整個 process 共用一份。
+所有 client (以及 gspread、googleapiclient、httplib2 的匯入) 都在第一次使用時才建立。
+"""
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.adapters import HTTPAdapter
+
+from config import GOOGLE_HTTP_POOL_SIZE, GOOGLE_HTTP_TIMEOUT_SECONDS
+
+SCOPES = [
+    "https://www.googleapis.com/auth/forms.body",
+    "https://www.googleapis.com/auth/drive",
+    "https://www.googleapis.com/auth/spreadsheets",
+]
+
+_lock = threading.Lock()
+_local = threading.local()
+_creds = None
+_session = None
+_gspread_client = None
+_init_failed = False
+
+# 供 create_google_form 等工具並行執行互不相依的 API 呼叫
+google_io_executor = ThreadPoolExecutor(max_workers=GOOGLE_HTTP_POOL_SIZE, thread_name_prefix="google-io")
+
+
+class SessionHttp:
+    """
+    讓 googleapiclient 透過 requests.Session 發送請求的 httplib2.Http 轉接器。
+    requests.Session 的連線池可以安全地在多個執行緒間共用。
+    """
+    redirect_codes = frozenset({300, 301, 302, 303, 307})
+
+    def __init__(self, session, timeout: float):
+        self.session = session
+        self.timeout = timeout
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        import httplib2
+
+        response = self.session.request(method, uri, data=body, headers=headers, timeout=self.timeout)
+        info = httplib2.Response({"status": response.status_code, **response.headers})
+        return info, response.content
+
+
+def _init_shared():
+    """建立共用的憑證、連線池與 gspread client；失敗時記錄一次並回傳 False。"""
+    global _creds, _session, _gspread_client, _init_failed
+    if _session is not None:
+        return True
+    if _init_failed:
+        return False
+    with _lock:
+        if _session is not None or _init_failed:
+            return _session is not None
+        try:
+            from google.oauth2.service_account import Credentials
+            from google.auth.transport.requests import AuthorizedSession
+            import gspread
+
+            creds_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
+            if not creds_path or not os.path.exists(creds_path):
+                raise FileNotFoundError("Google 服務帳號憑證檔案路徑未設定或檔案不存在。")
+
+            creds = Credentials.from_service_account_file(creds_path, scopes=SCOPES)
+            session = AuthorizedSession(creds)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=GOOGLE_HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+
+            _gspread_client = gspread.Client(auth=creds, session=session)
+            _creds = creds
+            _session = session
+            logging.info("Google API shared session initialized successfully.")
+            return True
+        except Exception as e:
+            logging.warning(f"Google服務初始化失敗: {e}。相關工具將無法運作。")
+            _init_failed = True
+            return False
+
+
+def _thread_service(name: str, version: str):
+    services = getattr(_local, "services", None)
+    if services is None:
+        services = _local.services = {}
+    key = (name, version)
+    if key not in services:
+        from googleapiclient.discovery import build
+        http = SessionHttp(_session, GOOGLE_HTTP_TIMEOUT_SECONDS)
+        services[key] = build(name, version, http=http, cache_discovery=False)
+    return services[key]
+
+
+def get_forms_service():
+    """回傳目前執行緒專用的 Google Forms client；服務無法初始化時回傳 None。"""
+    if not _init_shared():
+        return None
+    return _thread_service("forms", "v1")
+
+
+def get_drive_service():
+    """回傳目前執行緒專用的 Google Drive client；服務無法初始化時回傳 None。"""
+    if not _init_shared():
+        return None
+    return _thread_service("drive", "v3")
+
+
+def get_gspread_client():
+    """回傳共用的 gspread client；服務無法初始化時回傳 None。"""
+    if not _init_shared():
+        return None
+    return _gspread_client
@@ -3,49 +3,31 @@
 import os
 import json
 import logging
-import googlemaps
 from datetime import datetime
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-import gspread
-import pandas as pd
 from langchain_core.tools import tool
 from dotenv import load_dotenv
+from graph.tools.google_clients import get_forms_service, get_gspread_client, google_io_executor
+from graph.tools.sheet_ingest import get_sheet_reader
+from utils.telemetry import record_external_call
+from sql.menu_catalog import menu_catalog
+from config import RANKING_TOP_K
 
 # 載入環境變數
 load_dotenv()
 
 # --- Configuration ---
-SCOPES = [
-    "https://www.googleapis.com/auth/forms.body",
-    "https://www.googleapis.com/auth/drive",
-    "https://www.googleapis.com/auth/spreadsheets",
-]
-try:
-    creds_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
-    if not creds_path or not os.path.exists(creds_path):
-        raise FileNotFoundError("Google 服務帳號憑證檔案路徑未設定或檔案不存在。")
-
-    creds = Credentials.from_service_account_file(creds_path, scopes=SCOPES)
-    forms_service = build("forms", "v1", credentials=creds)
-    drive_service = build("drive", "v3", credentials=creds)
-    gspread_client = gspread.service_account(filename=creds_path)
-    logging.info("Google Forms, Drive, and Sheets services initialized successfully.")
-
-except Exception as e:
-    logging.warning(f"Google服務初始化失敗: {e}。相關工具將無法運C作。")
-    creds = None
-    forms_service = None
-    drive_service = None
-    gspread_client = None
-
+# Google Forms / Drive / Sheets 的 client 由 google_clients 延遲建立，並依執行緒分配。
+# googlemaps、gspread、pandas 匯入都很慢，到真的呼叫工具時才匯入，不拖慢 app 啟動。
 gmaps = None
+# 辦公室位置 (南港軟體園區)，沒有指定位置時的搜尋中心
+DEFAULT_SEARCH_LOCATION = "25.0553, 121.6134"
 
 def get_gmaps_client():
     """Lazily initialize the Google Maps client."""
     global gmaps
     if gmaps is None:
         try:
+            import googlemaps
             gmaps_api_key = os.getenv("GOOGLE_API_KEY")
             if not gmaps_api_key:
                 raise ValueError("未設定 GOOGLE_API_KEY 環境變數。")
@@ -60,50 +42,33 @@ def get_gmaps_client():
 # --- Tool Definitions ---
 
 @tool
-def search_Maps(query: str, location: str = "25.0553, 121.6134") -> str:
+def search_Maps(query: str, location: str = DEFAULT_SEARCH_LOCATION, min_rating: float = 0.0,
+                price_levels: list[int] | None = None, max_distance_km: float | None = None) -> str:
     """
-    在 Google Maps 上根據查詢和經緯度搜尋地點，並回傳最多 8 個結果的列表。
+    在 Google Maps 上根據查詢和經緯度搜尋地點，依評價、距離與過去的開團次數排序，回傳最多 8 個結果的列表。
+    可以另外指定最低評價、價位 (0~4) 與最遠距離 (公里) 來篩選。
     """
+    import googlemaps
+    # 排序引擎需要 NumPy，第一次搜尋時才匯入
+    from graph.tools.place_ranking import get_pool, rank, parse_location, RankFilters
+
     client = get_gmaps_client()
     if not client:
         return json.dumps({"error": "Google Maps API 未被正確初始化。請檢查 API 金鑰設定。"}, ensure_ascii=False)
 
     logging.info(f"Searching Google Maps API with query: '{query}' near {location}")
     try:
-        places_result = client.places(
-            query=query,
-            language='zh-TW',
-            location=location,
-            radius=5000  # 搜尋半徑 5 公里
-        )
-
-        results_to_return = []
-        # ✨ 變更：將結果數量從 5 增加到 8
-        for place in places_result.get('results', [])[:8]:
-            place_types = place.get('types', [])
-            non_generic_types = [t for t in place_types if
-                                 t not in ['point_of_interest', 'establishment', 'store', 'food', 'restaurant']]
-
-            if non_generic_types:
-                cuisine_type = non_generic_types[0].replace('_', ' ').title()
-            elif any(keyword in query for keyword in ['飲料', '茶', '咖啡', '手搖']):
-                cuisine_type = '飲料輕食'
-            else:
-                cuisine_type = '美食餐廳'
-
-            results_to_return.append({
-                "name": place.get('name', 'N/A'),
-                "rating": place.get('rating', 0),
-                "address": place.get('vicinity', place.get('formatted_address', 'N/A')),
-                "place_id": place.get('place_id'),
-                "cuisine": cuisine_type
-            })
+        # 相同查詢與鄰近位置的候選池 (以及 Maps 結果) 會從快取取得；搜尋半徑 5 公里
+        pool = get_pool(client, query, location)
+        filters = RankFilters(min_rating=min_rating, price_levels=tuple(price_levels or ()),
+                              max_distance_km=max_distance_km)
+        results_to_return = rank(pool, parse_location(location), filters)
 
         if not results_to_return:
             logging.info(f"No results found for query: '{query}'")
             return json.dumps({"message": "很抱歉，在附近找不到符合條件的店家。"}, ensure_ascii=False)
 
-        logging.info(f"Found {len(results_to_return)} results for query: '{query}'")
+        logging.info(f"Found {len(results_to_return)} results for query: '{query}' (pool of {len(pool)})")
         result_json = json.dumps(results_to_return, ensure_ascii=False)
         logging.info(f"search_Maps result: {result_json}")
         return result_json
@@ -116,29 +81,80 @@ def search_Maps(query: str, location: str = "25.0553, 121.6134") -> str:
         return json.dumps({"error": "搜尋時發生未知錯誤。"}, ensure_ascii=False)
 
 
+def rank_restaurants(params) -> tuple[dict, int]:
+    """
+    /api/restaurants/rank 的共用實作 (Flask 與 ASGI)：以 query string 的篩選條件重新排序同一個查詢的候選池。
+    params: query (必填)、location、min_rating、price、cuisine、max_distance_km、k。
+    回傳 (JSON 內容, HTTP 狀態碼)。
+    """
+    import googlemaps
+    from graph.tools.place_ranking import rerank, filters_from_params
+
+    query = params.get("query")
+    if not query:
+        return {"error": "Missing query."}, 400
+    try:
+        filters = filters_from_params(params)
+        k = int(params.get("k") or RANKING_TOP_K)
+        if k < 1:
+            raise ValueError("k must be at least 1")
+    except ValueError as e:
+        return {"error": f"Invalid filter: {e}"}, 400
+
+    client = get_gmaps_client()
+    if not client:
+        return {"error": "Google Maps API 未被正確初始化。請檢查 API 金鑰設定。"}, 503
+    # 候選池不在快取中時會呼叫 Maps API，錯誤與 search_Maps 一樣轉成 JSON 回應
+    try:
+        return rerank(client, query, params.get("location") or DEFAULT_SEARCH_LOCATION, filters, k=k), 200
+    except googlemaps.exceptions.Timeout as e:
+        logging.error(f"Google Maps API timed out: {e}", exc_info=True)
+        return {"error": "Google Maps API 逾時，請稍後再試。"}, 503
+    except googlemaps.exceptions.ApiError as e:
+        logging.error(f"Google Maps API error: {e}", exc_info=True)
+        return {"error": f"API 錯誤: {e.status}"}, 502
+    except Exception as e:
+        logging.error(f"Unknown error during restaurant ranking: {e}", exc_info=True)
+        return {"error": "搜尋時發生未知錯誤。"}, 502
+
+
+def _create_response_sheet(title: str) -> str:
+    logging.info(f"Creating new Google Sheet with title: '{title} - 訂單回應'")
+    record_external_call("google_sheets", "create")
+    sheet = get_gspread_client().create(f"{title} - 訂單回應")
+    sheet_url = f"https://docs.google.com/spreadsheets/d/{sheet.id}"
+    logging.info(f"Successfully created response sheet: {sheet_url}")
+    return sheet_url
+
+
+def _create_form(title: str) -> dict:
+    new_form = {"info": {"title": title, "documentTitle": title}}
+    record_external_call("google_forms", "create")
+    created_form = get_forms_service().forms().create(body=new_form).execute()
+    logging.info(f"Successfully created Google Form: {created_form['responderUri']}")
+    return created_form
+
+
 @tool
 def create_google_form(title: str, description: str, menu_items: list) -> str:
     """
     建立一個新的 Google 表單用於訂購，並將其連結到一個新的 Google Sheet。
     """
-    if not all([forms_service, drive_service, gspread_client]):
+    if not all([get_forms_service(), get_gspread_client()]):
         return json.dumps({"error": "Google API 服務未被正確初始化。請檢查憑證檔案。"}, ensure_ascii=False)
 
     try:
-        logging.info(f"Creating new Google Sheet with title: '{title} - 訂單回應'")
-        sheet = gspread_client.create(f"{title} - 訂單回應")
-        sheet_url = f"https://docs.google.com/spreadsheets/d/{sheet.id}"
-        logging.info(f"Successfully created response sheet: {sheet_url}")
-
-        new_form = {"info": {"title": title, "documentTitle": title}}
-        created_form = forms_service.forms().create(body=new_form).execute()
+        # 建立試算表與建立表單互不相依，並行執行以減少等待時間
+        sheet_future = google_io_executor.submit(_create_response_sheet, title)
+        form_future = google_io_executor.submit(_create_form, title)
+        created_form = form_future.result()
         form_id = created_form["formId"]
         form_url = created_form["responderUri"]
-        logging.info(f"Successfully created Google Form: {form_url}")
 
         # 設定表單回覆連結到試算表
         # 注意：這一步驟在 v1 API 中沒有直接的方法，但建立的 sheet_url 可用於後續讀取
 
+        # 表單說明與所有題目在同一個 batchUpdate 中完成
         requests = [
             {"updateFormInfo": {"info": {"description": description}, "updateMask": "description"}},
             {"createItem": {
@@ -155,7 +171,9 @@ def create_google_form(title: str, description: str, menu_items: list) -> str:
                 "item": {"title": "備註", "questionItem": {"question": {"textQuestion": {"paragraph": True}}}},
                 "location": {"index": 2}}},
         ]
-        forms_service.forms().batchUpdate(formId=form_id, body={"requests": requests}).execute()
+        record_external_call("google_forms", "batchUpdate")
+        get_forms_service().forms().batchUpdate(formId=form_id, body={"requests": requests}).execute()
+        sheet_url = sheet_future.result()
 
         result_json = json.dumps({"form_url": form_url, "sheet_url": sheet_url}, ensure_ascii=False)
         logging.info(f"create_google_form result: {result_json}")
@@ -166,41 +184,41 @@ def create_google_form(title: str, description: str, menu_items: list) -> str:
         return json.dumps({"error": f"建立Google資源時發生錯誤: {str(e)}"}, ensure_ascii=False)
 
 
-# ... (get_menu_from_url 和 read_google_sheet 保持不變)
 @tool
 def get_menu_from_url(url: str) -> str:
     """
-    (佔位符) 從網站抓取菜單。真實情境會使用 BeautifulSoup 或 Scrapy。
+    從本機的菜單目錄 (sql/menu_catalog.py) 查詢店家的菜單。url 可以是店家網址，也可以是店名。
     """
-    logging.info(f"(Placeholder) Scraping menu from {url}...")
-    menu = ""
-    if "pizzahut" in url:
-        menu = "經典口味: 夏威夷披薩, 海鮮披薩, 超級總匯披薩. 副食: BBQ烤雞, 薯星星."
-    elif "coco" in url or "comebuy" in url or "wutea" in url or "50lan" in url:
-        menu = "珍珠奶茶, 百香雙響炮, 四季春青茶, 檸檬紅茶, 經典奶蓋"
+    entry = menu_catalog.lookup(url)
+    if entry is not None and entry.items:
+        menu = f"{entry.name}: " + ", ".join(item.label() for item in entry.items)
     else:
-        menu = "抱歉，我暫時無法從這個網站自動抓取菜單，請您手動提供菜單內容。"
+        menu = "抱歉，菜單目錄中沒有這家店的菜單，請您手動提供菜單內容。"
     logging.info(f"get_menu_from_url result: {menu}")
     return menu
 
 
 @tool
-def read_google_sheet(sheet_url: str) -> pd.DataFrame:
+def read_google_sheet(sheet_url: str, full: bool = False):
     """
     從指定的 Google Sheet URL 讀取所有資料並回傳為 Pandas DataFrame。
+    只會向 Google 抓取上次讀取之後新增的列，其餘的列來自本機的增量儲存；
+    full 為 True 時整張重新同步 (截止後的最終統計使用，確保包含被修改過的回覆)。
     """
-    if not gspread_client:
+    import pandas as pd
+    from gspread.exceptions import SpreadsheetNotFound
+
+    reader = get_sheet_reader()
+    if not reader:
         logging.error("gspread_client is not initialized.")
         return pd.DataFrame()
     try:
         logging.info(f"Reading Google Sheet from URL: {sheet_url}")
-        sheet = gspread_client.open_by_url(sheet_url)
-        worksheet = sheet.get_worksheet(0)  # 讀取第一個工作表
-        data = worksheet.get_all_records()
+        data = reader.read_url(sheet_url, full=full)  # 讀取第一個工作表
         df = pd.DataFrame(data)
         logging.info(f"Successfully read {len(df)} rows from the sheet.")
         return df
-    except gspread.exceptions.SpreadsheetNotFound:
+    except SpreadsheetNotFound:
         logging.error(f"Spreadsheet not found at {sheet_url}. Check URL and permissions.")
         return pd.DataFrame()
     except Exception as e:
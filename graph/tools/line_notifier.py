@@ -0,0 +1,145 @@
+# graph/tools/line_notifier.py
+"""
+LINE 通知器：共用單一 ApiClient，並盡量減少 API 呼叫次數。
+
+- enqueue() + flush()：送往同一個對象的多則訊息合併成一次 push (每次最多 5 則)。
+- multicast()：同一則訊息發給多位使用者時，每 500 人一次 multicast。
+- broadcast()：發給所有好友。
+- 每個端點各有一個 token bucket 限流；遇到 429 時依 Retry-After 等待後重試一次。
+linebot SDK 匯入要一秒以上，等到第一次建立 LineNotifier 時才匯入，不拖慢 app / worker 啟動。
+"""
+from __future__ import annotations
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from utils.rate_limit import TokenBucket
+from utils.telemetry import record_external_call
+from config import LINE_PUSH_RATE_PER_SECOND, LINE_MULTICAST_RATE_PER_SECOND, LINE_BROADCAST_RATE_PER_HOUR
+
+MAX_MESSAGES_PER_REQUEST = 5
+MAX_MULTICAST_RECIPIENTS = 500
+
+if TYPE_CHECKING:
+    from linebot.v3.messaging import Configuration
+
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class LineNotifier:
+    """重複使用同一個 ApiClient 的 LINE 推播器。"""
+
+    def __init__(self, configuration: Configuration):
+        from linebot.v3.messaging import ApiClient, MessagingApi
+
+        self._api_client = ApiClient(configuration)
+        self._api = MessagingApi(self._api_client)
+        self._pending: OrderedDict[str, list[str]] = OrderedDict()
+        self._pending_lock = threading.Lock()
+        self._push_bucket = TokenBucket(LINE_PUSH_RATE_PER_SECOND)
+        self._multicast_bucket = TokenBucket(LINE_MULTICAST_RATE_PER_SECOND)
+        self._broadcast_bucket = TokenBucket(LINE_BROADCAST_RATE_PER_HOUR / 3600, capacity=1)
+        self.requests_sent = 0
+
+    def _call(self, bucket: TokenBucket, func, request):
+        from linebot.v3.messaging.exceptions import ApiException
+
+        bucket.acquire()
+        record_external_call("line", func.__name__)
+        try:
+            result = func(request)
+        except ApiException as e:
+            if e.status != 429:
+                raise
+            retry_after = float((e.headers or {}).get("Retry-After", 1))
+            logging.warning(f"LINE API rate limited, retrying after {retry_after}s.")
+            time.sleep(retry_after)
+            bucket.acquire()
+            record_external_call("line", func.__name__)
+            result = func(request)
+        self.requests_sent += 1
+        return result
+
+    def push(self, to: str, texts: list[str]) -> int:
+        """推播多則訊息給單一對象，每 5 則合併為一次請求；回傳請求次數。"""
+        from linebot.v3.messaging import PushMessageRequest, TextMessage
+
+        requests = 0
+        for chunk in _chunks(texts, MAX_MESSAGES_PER_REQUEST):
+            request = PushMessageRequest(to=to, messages=[TextMessage(text=t) for t in chunk])
+            self._call(self._push_bucket, self._api.push_message, request)
+            requests += 1
+        return requests
+
+    def multicast(self, user_ids: list[str], texts: list[str]) -> int:
+        """將相同訊息發送給多位使用者 (每次最多 500 人、5 則訊息)；回傳請求次數。"""
+        from linebot.v3.messaging import MulticastRequest, TextMessage
+
+        requests = 0
+        user_ids = list(dict.fromkeys(user_ids))
+        for ids in _chunks(user_ids, MAX_MULTICAST_RECIPIENTS):
+            for chunk in _chunks(texts, MAX_MESSAGES_PER_REQUEST):
+                request = MulticastRequest(to=ids, messages=[TextMessage(text=t) for t in chunk])
+                self._call(self._multicast_bucket, self._api.multicast, request)
+                requests += 1
+        return requests
+
+    def broadcast(self, texts: list[str]) -> int:
+        """將訊息發送給官方帳號的所有好友；回傳請求次數。"""
+        from linebot.v3.messaging import BroadcastRequest, TextMessage
+
+        requests = 0
+        for chunk in _chunks(texts, MAX_MESSAGES_PER_REQUEST):
+            request = BroadcastRequest(messages=[TextMessage(text=t) for t in chunk])
+            self._call(self._broadcast_bucket, self._api.broadcast, request)
+            requests += 1
+        return requests
+
+    def enqueue(self, to: str, text: str) -> None:
+        """先暫存訊息，待 flush() 時與同對象的其他訊息合併推播。"""
+        with self._pending_lock:
+            self._pending.setdefault(to, []).append(text)
+
+    def flush(self) -> dict[str, str | None]:
+        """送出所有暫存的訊息；回傳每個對象的錯誤訊息 (成功為 None)。"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, OrderedDict()
+        results = {}
+        for to, texts in pending.items():
+            try:
+                self.push(to, texts)
+                results[to] = None
+            except Exception as e:
+                logging.error(f"Failed to push LINE messages to {to}: {e}")
+                results[to] = str(e)
+        return results
+
+    def close(self) -> None:
+        self._api_client.close()
+
+
+_notifier: LineNotifier | None = None
+_notifier_lock = threading.Lock()
+
+
+def get_line_notifier() -> LineNotifier:
+    """回傳共用的 LineNotifier (第一次呼叫時建立)。"""
+    global _notifier
+    if _notifier is None:
+        with _notifier_lock:
+            if _notifier is None:
+                from linebot.v3.messaging import Configuration
+
+                configuration = Configuration(
+                    host=os.environ.get("LINE_API_HOST", "https://api.line.me"),
+                    access_token=os.environ.get("LINE_CHANNEL_ACCESS_TOKEN", "YOUR_TOKEN"),
+                )
+                _notifier = LineNotifier(configuration)
+    return _notifier
@@ -1,19 +1,5 @@
-import os
 from langchain_core.tools import tool
-from linebot.v3 import WebhookHandler
-from linebot.v3.exceptions import InvalidSignatureError
-from linebot.v3.messaging import (
-    Configuration,
-    ApiClient,
-    MessagingApi,
-    ReplyMessageRequest,
-    TextMessage,
-    PushMessageRequest,
-)
-
-# --- LINE API Configuration ---
-# Load the channel access token from environment variables
-configuration = Configuration(access_token=os.environ.get("LINE_CHANNEL_ACCESS_TOKEN", "YOUR_TOKEN"))
+from graph.tools.line_notifier import get_line_notifier
 
 
 @tool
@@ -30,14 +16,8 @@ def send_line_message(line_token: str, message: str) -> str:
         return "LINE token not provided. Skipping notification."
 
     try:
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
-            line_bot_api.push_message_with_http_info(
-                PushMessageRequest(
-                    to=line_token,
-                    messages=[TextMessage(text=message)]
-                )
-            )
+        # 共用同一個 ApiClient，不再每次呼叫都重新建立連線
+        get_line_notifier().push(line_token, [message])
         return "Successfully sent LINE message."
     except Exception as e:
         return f"Failed to send LINE message. Error: {e}"
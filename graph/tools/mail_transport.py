@@ -0,0 +1,214 @@
+# graph/tools/mail_transport.py
+"""
+持久化的 SMTP 連線池與大量寄信 API。
+
+每封信都重新連線、STARTTLS、登入的成本遠高於寄信本身，這裡改為保留已登入的連線重複使用：
+- 閒置過久的連線使用前先送 NOOP，失效就重新連線。
+- 單一連線寄出的信件數超過上限時自動換一條新連線。
+- send_bulk() 把多封信分配到池中的多條連線上，每條連線在同一個 session 內連續寄出。
+"""
+import time
+import queue
+import logging
+import smtplib
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+from config import (
+    SMTP_SERVER,
+    SMTP_PORT,
+    SMTP_USERNAME,
+    SMTP_PASSWORD,
+    SMTP_USE_TLS,
+    SMTP_POOL_SIZE,
+    SMTP_MAX_IDLE_SECONDS,
+    SMTP_MAX_MESSAGES_PER_CONNECTION,
+)
+from utils.telemetry import record_external_call
+
+
+@dataclass
+class OutgoingEmail:
+    """一封待寄出的信件。"""
+    recipients: list[str]
+    subject: str
+    body: str
+    subtype: str = "html"
+
+
+@dataclass
+class _PooledConnection:
+    smtp: smtplib.SMTP
+    last_used: float
+    sent: int = 0
+
+
+def build_message(sender: str, email: OutgoingEmail) -> MIMEMultipart:
+    message = MIMEMultipart()
+    message["From"] = sender
+    message["To"] = ", ".join(email.recipients)
+    message["Subject"] = email.subject
+    message.attach(MIMEText(email.body, email.subtype))
+    return message
+
+
+class SMTPConnectionPool:
+    """保留已驗證 SMTP 連線的連線池。"""
+
+    def __init__(self, host: str, port: int, username: str | None = None, password: str | None = None,
+                 use_tls: bool = True, max_size: int = 4, max_idle_seconds: float = 30,
+                 max_messages_per_connection: int = 200, sender: str | None = None, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.max_messages_per_connection = max_messages_per_connection
+        self.sender = sender or username
+        self.timeout = timeout
+        self._idle: queue.LifoQueue[_PooledConnection] = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self.connects = 0
+
+    def _connect(self) -> _PooledConnection:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        self.connects += 1
+        return _PooledConnection(smtp=smtp, last_used=time.monotonic())
+
+    @staticmethod
+    def _close(conn: _PooledConnection) -> None:
+        try:
+            conn.smtp.quit()
+        except Exception:
+            try:
+                conn.smtp.close()
+            except Exception:
+                pass
+
+    def _is_usable(self, conn: _PooledConnection) -> bool:
+        if conn.sent >= self.max_messages_per_connection:
+            return False
+        if time.monotonic() - conn.last_used < self.max_idle_seconds:
+            return True
+        try:
+            return conn.smtp.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def _acquire(self) -> _PooledConnection:
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if self._is_usable(conn):
+                    return conn
+                self._close(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, conn: _PooledConnection | None) -> None:
+        if conn is not None:
+            conn.last_used = time.monotonic()
+            self._idle.put(conn)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """取得一條已登入的連線，用完自動歸還；過程中出錯的連線會被丟棄。"""
+        conn = self._acquire()
+        try:
+            yield conn
+        except Exception:
+            self._close(conn)
+            self._release(None)
+            raise
+        else:
+            self._release(conn)
+
+    def _send_on(self, conn: _PooledConnection, email: OutgoingEmail) -> None:
+        message = build_message(self.sender, email)
+        record_external_call("smtp", "sendmail")
+        conn.smtp.sendmail(self.sender, email.recipients, message.as_string())
+        conn.sent += 1
+
+    def send(self, email: OutgoingEmail) -> None:
+        """寄出一封信；連線在寄送時被伺服器斷開會重新連線再試一次。"""
+        try:
+            with self.connection() as conn:
+                self._send_on(conn, email)
+        except smtplib.SMTPServerDisconnected:
+            logging.info("SMTP connection went stale, reconnecting.")
+            with self.connection() as conn:
+                self._send_on(conn, email)
+
+    def _send_batch(self, emails: list[tuple[int, OutgoingEmail]]) -> list[tuple[int, str | None]]:
+        results = []
+        for index, email in emails:
+            try:
+                self.send(email)
+                results.append((index, None))
+            except Exception as e:
+                logging.error(f"Error sending email to {email.recipients}: {e}")
+                results.append((index, str(e)))
+        return results
+
+    def send_bulk(self, emails: list[OutgoingEmail]) -> list[str | None]:
+        """
+        寄出多封 (可各自不同主旨與內容的) 信件，依原順序回傳每封的錯誤訊息 (成功為 None)。
+        信件平均分配到最多 max_size 條連線上並行寄送。
+        """
+        if not emails:
+            return []
+        workers = min(self.max_size, len(emails))
+        batches = [list(enumerate(emails))[i::workers] for i in range(workers)]
+        results: list[str | None] = [None] * len(emails)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="smtp-bulk") as executor:
+            for batch_result in executor.map(self._send_batch, batches):
+                for index, error in batch_result:
+                    results[index] = error
+        return results
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+_pool: SMTPConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_mail_pool() -> SMTPConnectionPool | None:
+    """回傳依 config 建立的共用 SMTP 連線池；SMTP 未設定時回傳 None。"""
+    global _pool
+    if not all([SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD]):
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SMTPConnectionPool(
+                    SMTP_SERVER, int(SMTP_PORT), SMTP_USERNAME, SMTP_PASSWORD,
+                    use_tls=SMTP_USE_TLS,
+                    max_size=SMTP_POOL_SIZE,
+                    max_idle_seconds=SMTP_MAX_IDLE_SECONDS,
+                    max_messages_per_connection=SMTP_MAX_MESSAGES_PER_CONNECTION,
+                )
+    return _pool
@@ -0,0 +1,99 @@
+# graph/tools/maps_cache.py
+"""
+Google Maps places 搜尋結果的快取。
+
+快取鍵 = 正規化後的查詢字串 + 位置的 geohash 格子 + 搜尋半徑，
+相同辦公室附近、相同關鍵字的搜尋會直接命中快取，不再呼叫 Maps API。
+"""
+import re
+import logging
+import unicodedata
+
+from utils.cache import build_cache
+from utils.telemetry import record_external_call
+from config import (
+    REDIS_URL,
+    MAPS_CACHE_BACKEND,
+    MAPS_CACHE_TTL_SECONDS,
+    MAPS_CACHE_MAXSIZE,
+    MAPS_CACHE_GEOHASH_PRECISION,
+)
+
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+# 只保留排序與顯示會用到的欄位，減少快取佔用的空間
+_PLACE_FIELDS = ("name", "rating", "user_ratings_total", "price_level", "vicinity", "formatted_address",
+                 "place_id", "types", "geometry")
+
+places_cache = build_cache(
+    "maps_places",
+    backend=MAPS_CACHE_BACKEND,
+    maxsize=MAPS_CACHE_MAXSIZE,
+    ttl=MAPS_CACHE_TTL_SECONDS,
+    redis_url=REDIS_URL,
+)
+
+
+def geohash_encode(lat: float, lng: float, precision: int = MAPS_CACHE_GEOHASH_PRECISION) -> str:
+    """將經緯度編碼為 geohash 字串。"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def normalize_query(query: str) -> str:
+    """NFKC 正規化、轉小寫並移除空白，讓全形/半形與空白差異不影響快取命中。"""
+    query = unicodedata.normalize("NFKC", query).lower()
+    return re.sub(r"\s+", "", query)
+
+
+def _location_bucket(location: str) -> str:
+    try:
+        lat, lng = (float(part) for part in location.split(","))
+    except ValueError:
+        # 不是經緯度的位置字串 (例如地址) 直接以正規化後的字串當作格子
+        return normalize_query(location)
+    return geohash_encode(lat, lng)
+
+
+def places_cache_key(query: str, location: str, radius: int) -> str:
+    return f"{normalize_query(query)}|{_location_bucket(location)}|{radius}"
+
+
+def _slim_place(place: dict) -> dict:
+    return {k: place[k] for k in _PLACE_FIELDS if k in place}
+
+
+def cached_places_search(client, query: str, location: str, radius: int) -> list[dict]:
+    """
+    回傳 places 搜尋的原始結果列表 (已精簡欄位)；命中快取時不呼叫 Maps API。
+    """
+    key = places_cache_key(query, location, radius)
+    results = places_cache.get(key)
+    if results is not None:
+        logging.info(f"Maps cache hit for key: {key}")
+        return results
+
+    record_external_call("google_maps", "places")
+    places_result = client.places(
+        query=query,
+        language='zh-TW',
+        location=location,
+        radius=radius
+    )
+    results = [_slim_place(place) for place in places_result.get('results', [])]
+    places_cache.set(key, results)
+    return results
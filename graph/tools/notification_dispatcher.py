@@ -0,0 +1,121 @@
+# graph/tools/notification_dispatcher.py
+"""
+通知派送器：同時送出多個通道 (LINE、Email…) 的通知。
+
+每個通道各自有逾時、重試與指數退避，最後回傳結構化的派送報告。
+逾時的呼叫不會被中斷，可能仍在送出 (例如 SMTP 已經在傳送信件)，因此預設不重試逾時的通道，
+避免重複寄送；只有可以安全重送的通道 (retry_on_timeout=True) 才會在逾時後重試。
+整體耗時取決於最慢的通道，而不是所有通道耗時的總和。
+"""
+import time
+import random
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable
+
+from config import NOTIFY_TIMEOUT_SECONDS, NOTIFY_RETRIES, NOTIFY_BACKOFF_SECONDS
+
+# 使用獨立的執行緒池：逾時仍在執行的呼叫不會拖住 asyncio.run() 結束時的 executor 關閉
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="notify")
+
+# 既有的工具以回傳字串表示失敗，而不是拋出例外
+_FAILURE_PREFIXES = ("Error", "Failed", "An error occurred")
+
+
+def _default_is_failure(result: Any) -> bool:
+    return isinstance(result, str) and result.startswith(_FAILURE_PREFIXES)
+
+
+@dataclass
+class Delivery:
+    """一個要送出的通道。send 為同步函式，會在執行緒中執行。"""
+    channel: str
+    send: Callable[[], Any]
+    timeout: float = NOTIFY_TIMEOUT_SECONDS
+    retries: int = NOTIFY_RETRIES
+    backoff: float = NOTIFY_BACKOFF_SECONDS
+    # 送出是否冪等 (重送不會造成重複通知)；否則逾時後不再重試
+    retry_on_timeout: bool = False
+    is_failure: Callable[[Any], bool] = _default_is_failure
+
+
+@dataclass
+class DeliveryResult:
+    channel: str
+    ok: bool
+    attempts: int
+    elapsed: float
+    error: str | None = None
+    result: Any = None
+    # 逾時且不重試：呼叫可能仍在送出，結果不明，之後也不應重送
+    timed_out: bool = False
+
+
+@dataclass
+class DeliveryReport:
+    results: list[DeliveryResult] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return all(r.ok for r in self.results)
+
+    @property
+    def failed(self) -> list[str]:
+        return [r.channel for r in self.results if not r.ok]
+
+    @property
+    def settled(self) -> list[str]:
+        """不應再重送的通道：已送達，或逾時後結果不明的。"""
+        return [r.channel for r in self.results if r.ok or r.timed_out]
+
+    def to_dict(self) -> dict:
+        return {
+            "ok": self.ok,
+            "elapsed": round(self.elapsed, 3),
+            "results": [{**asdict(r), "elapsed": round(r.elapsed, 3), "result": str(r.result)} for r in self.results],
+        }
+
+
+async def _deliver(delivery: Delivery) -> DeliveryResult:
+    start = time.perf_counter()
+    error = None
+    for attempt in range(1, delivery.retries + 2):
+        try:
+            # 逾時後不會中斷執行緒中的呼叫，但派送器不再等待它
+            future = asyncio.get_running_loop().run_in_executor(_executor, delivery.send)
+            result = await asyncio.wait_for(future, timeout=delivery.timeout)
+            if not delivery.is_failure(result):
+                return DeliveryResult(delivery.channel, True, attempt, time.perf_counter() - start, result=result)
+            error = str(result)
+        except asyncio.TimeoutError:
+            error = f"timed out after {delivery.timeout}s"
+            if not delivery.retry_on_timeout:
+                # 第一次的呼叫可能仍在送出，再送一次可能重複通知
+                logging.warning(f"[Notify] {delivery.channel} attempt {attempt} timed out, not retrying.")
+                return DeliveryResult(delivery.channel, False, attempt, time.perf_counter() - start, error=error,
+                                      timed_out=True)
+        except Exception as e:
+            error = str(e)
+
+        logging.warning(f"[Notify] {delivery.channel} attempt {attempt} failed: {error}")
+        if attempt <= delivery.retries:
+            await asyncio.sleep(delivery.backoff * (2 ** (attempt - 1)) * random.uniform(0.8, 1.2))
+
+    return DeliveryResult(delivery.channel, False, delivery.retries + 1, time.perf_counter() - start, error=error)
+
+
+async def adispatch(deliveries: list[Delivery]) -> DeliveryReport:
+    """並行送出所有通道的通知並回傳派送報告。"""
+    start = time.perf_counter()
+    results = await asyncio.gather(*[_deliver(d) for d in deliveries])
+    report = DeliveryReport(results=list(results), elapsed=time.perf_counter() - start)
+    logging.info(f"[Notify] Delivered {len(deliveries)} channels in {report.elapsed:.2f}s, failed: {report.failed}")
+    return report
+
+
+def dispatch(deliveries: list[Delivery]) -> DeliveryReport:
+    """adispatch 的同步版本，供 Celery task 與排程函式使用。"""
+    return asyncio.run(adispatch(deliveries))
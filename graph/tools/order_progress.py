@@ -0,0 +1,277 @@
+# graph/tools/order_progress.py
+"""
+訂單的即時進度 (目前各品項的份數)，供 /api/orders/<id>/progress 與其 SSE 串流使用。
+
+- 每張訂單只有一份累計結果 (RunningTally)，新回覆進來時直接累加，不重新統計整張表。
+- 一個共用的背景輪詢執行緒每 PROGRESS_POLL_INTERVAL_SECONDS 以 IncrementalSheetReader
+  抓一次新增的列；同時觀看的開團者再多，每張訂單每個週期也只讀一次 Sheet。
+- 收到 Forms watch 通知 (notify) 時立即更新該訂單，不必等下一個輪詢週期。
+- 沒有人訂閱、且超過 PROGRESS_IDLE_SECONDS 沒有被查詢的訂單停止追蹤。
+"""
+import time
+import logging
+import threading
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Callable
+
+from graph.tools.sheet_ingest import get_sheet_reader
+from graph.tools.tally import ItemTally, tally_records
+from config import PROGRESS_POLL_INTERVAL_SECONDS, PROGRESS_IDLE_SECONDS
+
+
+class RunningTally:
+    """可就地累加的訂單統計。"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.items: dict[tuple[str, str], ItemTally] = {}
+        self.total = 0
+        self.responses = 0
+        self.error: str | None = None
+
+    def apply(self, records: list[dict]) -> bool:
+        """把新的回覆累加進統計；回傳統計是否有變動。"""
+        if not records:
+            return False
+        result = tally_records(records)
+        if result is None:
+            self.error = "找不到餐點欄位"
+            return False
+        for item in result.items:
+            current = self.items.get((item.item, item.modifiers))
+            if current is None:
+                self.items[(item.item, item.modifiers)] = ItemTally(item.item, item.modifiers, item.count,
+                                                                    list(item.patrons))
+            else:
+                current.count += item.count
+                current.patrons.extend(item.patrons)
+        self.total += result.total
+        self.responses += len(records)
+        self.error = None
+        return True
+
+    def to_dict(self) -> dict:
+        items = sorted(self.items.values(), key=lambda i: (-i.count, i.label))
+        return {
+            "total": self.total,
+            "responses": self.responses,
+            "items": [
+                {"item": i.item, "modifiers": i.modifiers, "label": i.label, "count": i.count, "patrons": i.patrons}
+                for i in items
+            ],
+            "error": self.error,
+        }
+
+
+def load_order_info(order_id: str) -> dict | None:
+    """從資料庫讀取追蹤進度需要的訂單欄位。"""
+    from sql.models.model import GroupOrder
+    from sql.session import session_scope
+
+    with session_scope() as db:
+        order = db.get(GroupOrder, order_id)
+        if order is None:
+            return None
+        return {
+            "order_id": order.id,
+            "restaurant_name": order.restaurant_name,
+            "response_sheet_id": order.response_sheet_id,
+            "deadline": order.deadline,
+            "status": order.status,
+        }
+
+
+@dataclass
+class _Watch:
+    order: dict
+    tally: RunningTally = field(default_factory=RunningTally)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    subscribers: list[Callable[[dict], None]] = field(default_factory=list)
+    last_row: int = 0
+    generation: int | None = None
+    version: int = 0
+    synced: bool = False
+    final: bool = False
+    updated_at: float | None = None
+    last_access: float = field(default_factory=time.monotonic)
+
+
+class ProgressHub:
+    """管理所有被追蹤訂單的累計結果與訂閱者，並以單一背景執行緒輪詢新回覆。"""
+
+    def __init__(self, reader_factory=get_sheet_reader, load_order=load_order_info,
+                 poll_interval: float = PROGRESS_POLL_INTERVAL_SECONDS,
+                 idle_seconds: float = PROGRESS_IDLE_SECONDS):
+        self._reader_factory = reader_factory
+        self._load_order = load_order
+        self.poll_interval = poll_interval
+        self.idle_seconds = idle_seconds
+        self._watches: dict[str, _Watch] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending: set[str] = set()
+        self._thread = None
+        self._stopped = False
+        self.sheet_reads = 0
+
+    # --- 查詢 ---
+    def _watch(self, order_id: str) -> _Watch | None:
+        with self._lock:
+            watch = self._watches.get(order_id)
+        if watch is None:
+            order = self._load_order(order_id)
+            if order is None or not order.get("response_sheet_id"):
+                return None
+            with self._lock:
+                watch = self._watches.setdefault(order_id, _Watch(order=order))
+            self._ensure_poller()
+        watch.last_access = time.monotonic()
+        if not watch.synced:
+            self.refresh(order_id)
+        return watch
+
+    def _snapshot(self, watch: _Watch) -> dict:
+        deadline = watch.order.get("deadline")
+        return {
+            "type": "progress",
+            "order_id": watch.order["order_id"],
+            "restaurant_name": watch.order.get("restaurant_name"),
+            "deadline": deadline.isoformat() if isinstance(deadline, datetime) else deadline,
+            "final": watch.final,
+            "version": watch.version,
+            "updated_at": watch.updated_at,
+            **watch.tally.to_dict(),
+        }
+
+    def snapshot(self, order_id: str) -> dict | None:
+        """回傳訂單目前的進度；訂單不存在或沒有回覆表時回傳 None。"""
+        watch = self._watch(order_id)
+        if watch is None:
+            return None
+        with watch.lock:
+            return self._snapshot(watch)
+
+    def subscribe(self, order_id: str, callback: Callable[[dict], None]) -> Callable[[], None] | None:
+        """
+        訂閱訂單進度，訂閱時會先收到一次目前的進度，之後每次變動都會在輪詢執行緒中呼叫 callback。
+        回傳取消訂閱的函式；訂單不存在時回傳 None。
+        """
+        watch = self._watch(order_id)
+        if watch is None:
+            return None
+        with watch.lock:
+            watch.subscribers.append(callback)
+            callback(self._snapshot(watch))
+
+        def unsubscribe():
+            with watch.lock:
+                if callback in watch.subscribers:
+                    watch.subscribers.remove(callback)
+            watch.last_access = time.monotonic()
+        return unsubscribe
+
+    def notify(self, order_id: str) -> bool:
+        """Forms watch 通知 (或手動觸發)：請輪詢執行緒立即更新這張訂單。只對追蹤中的訂單有效。"""
+        with self._lock:
+            if order_id not in self._watches:
+                return False
+            self._pending.add(order_id)
+        self._wake.set()
+        return True
+
+    # --- 更新 ---
+    def refresh(self, order_id: str) -> bool:
+        """抓取新增的回覆並累加；回傳進度是否有變動。"""
+        with self._lock:
+            watch = self._watches.get(order_id)
+        if watch is None:
+            return False
+        reader = self._reader_factory()
+        if reader is None:
+            return False
+
+        with watch.lock:
+            try:
+                self.sheet_reads += 1
+                records, cursor = reader.read_since(watch.order["response_sheet_id"], watch.last_row, watch.generation)
+            except Exception as e:
+                logging.warning(f"[Progress] Failed to read responses for order {order_id}: {e}")
+                return False
+            if cursor["generation"] != watch.generation:
+                # 表格被整張重新同步過 (有人修改了既有的回覆)：從頭累計
+                watch.tally.reset()
+                watch.generation = cursor["generation"]
+            changed = watch.tally.apply(records) or not watch.synced
+            watch.last_row = cursor["last_row"]
+            watch.synced = True
+
+            deadline = watch.order.get("deadline")
+            if isinstance(deadline, datetime) and deadline <= datetime.now() and not watch.final:
+                # 截止後再讀最後一次就不再輪詢
+                watch.final = changed = True
+            if not changed:
+                return False
+            watch.version += 1
+            watch.updated_at = time.time()
+            snapshot = self._snapshot(watch)
+            subscribers = list(watch.subscribers)
+
+        for callback in subscribers:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logging.warning(f"[Progress] Subscriber callback failed for order {order_id}: {e}")
+        return True
+
+    # --- 背景輪詢 ---
+    def _ensure_poller(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name="order-progress", daemon=True)
+                self._thread.start()
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for order_id, watch in list(self._watches.items()):
+                if not watch.subscribers and now - watch.last_access > self.idle_seconds:
+                    del self._watches[order_id]
+                    logging.info(f"[Progress] Stopped tracking idle order {order_id}.")
+
+    def _run(self) -> None:
+        next_poll = time.monotonic() + self.poll_interval
+        while not self._stopped:
+            self._wake.wait(timeout=max(0.0, next_poll - time.monotonic()))
+            self._wake.clear()
+            with self._lock:
+                pending, self._pending = self._pending, set()
+            for order_id in pending:
+                self.refresh(order_id)
+
+            if time.monotonic() >= next_poll:
+                self._evict_idle()
+                with self._lock:
+                    due = [oid for oid, w in self._watches.items() if not w.final and oid not in pending]
+                for order_id in due:
+                    self.refresh(order_id)
+                next_poll = time.monotonic() + self.poll_interval
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wake.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            watches = list(self._watches.values())
+        return {
+            "tracked_orders": len(watches),
+            "subscribers": sum(len(w.subscribers) for w in watches),
+            "sheet_reads": self.sheet_reads,
+        }
+
+
+progress_hub = ProgressHub()
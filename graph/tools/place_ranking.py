@@ -0,0 +1,261 @@
+# graph/tools/place_ranking.py
+"""
+餐廳推薦的排序引擎。
+
+原本 search_Maps 直接回傳 Maps 的前 8 筆，並對每家店掃一次 types、檢查一次查詢關鍵字。這裡改為：
+- 每個查詢 (與 Maps 快取相同的鍵：查詢字串 + geohash 格子 + 半徑) 建立一個候選池：
+  經緯度、評價、評論數、價位、料理類型與 GroupOrder 的歷史訂單數，在建立時就轉成 NumPy 陣列，
+  評價與人氣分數也在這時算好；到搜尋中心的 haversine 距離第一次用到時向量化計算一次並保留。
+- 排序時只剩一次向量化運算：加權分數、篩選遮罩，再以 argpartition 取出前 k 名。
+- 候選池快取在行程內 (RANKING_POOL_TTL_SECONDS)，同一個查詢換了篩選條件 (最低評價、價位、料理、距離)
+  只在本機重新排序，不會再呼叫 Maps API；候選池過期後從 Maps 快取重建，順便更新歷史訂單數。
+
+評分 = w_評價 x 貝氏平均評價 / 5 + w_距離 x exp(-距離 / 尺度) + w_人氣 x log(1 + 訂單數) / log(1 + 池中最大訂單數)。
+"""
+import math
+import logging
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from graph.tools.maps_cache import cached_places_search, places_cache_key
+from utils.cache import build_cache
+from config import (
+    RANKING_POOL_TTL_SECONDS,
+    RANKING_POOL_MAXSIZE,
+    RANKING_TOP_K,
+    RANKING_WEIGHTS,
+    RANKING_RATING_PRIOR_VOTES,
+    RANKING_DISTANCE_SCALE_KM,
+)
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_RADIUS_M = 5000
+MAX_PRICE_LEVEL = 4
+# 沒有參考意義的 Maps 類型，判斷料理類型時略過
+GENERIC_PLACE_TYPES = frozenset(("point_of_interest", "establishment", "store", "food", "restaurant"))
+DRINK_KEYWORDS = ("飲料", "茶", "咖啡", "手搖")
+
+# 候選池只存在行程內：裡面是 NumPy 陣列，而且重建只需要一次 Maps 快取命中加一個索引查詢
+pool_cache = build_cache("ranking_pool", backend="memory", maxsize=RANKING_POOL_MAXSIZE, ttl=RANKING_POOL_TTL_SECONDS)
+
+
+@dataclass
+class CandidatePool:
+    """一個查詢的所有候選餐廳，以及排序要用的特徵 (每個陣列的第 i 個元素對應 places[i])。"""
+    query: str
+    places: list[dict]
+    lat: np.ndarray
+    lng: np.ndarray
+    rating: np.ndarray  # 沒有評價為 0
+    votes: np.ndarray  # 評論數
+    price: np.ndarray  # Maps price_level 0~4，未知為 -1
+    orders: np.ndarray  # 過去以這家店開團的次數
+    cuisine: np.ndarray  # 料理類型在 cuisine_labels 中的編號
+    cuisine_labels: list[str]
+    # 與篩選條件、搜尋中心無關的分數在建立時就算好
+    rating_score: np.ndarray  # 貝氏平均評價 / 5
+    popularity_score: np.ndarray  # log(1 + 訂單數) / log(1 + 池中最大訂單數)
+    # 搜尋中心 -> (距離公里數, 距離分數)；同一個池的搜尋中心幾乎都相同，算過一次就重複使用
+    _distances: dict = field(default_factory=dict, repr=False)
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    def distances(self, origin: tuple[float, float] | None) -> tuple[np.ndarray, np.ndarray]:
+        """回傳到搜尋中心的距離 (沒有座標為 inf) 與距離分數；沒有搜尋中心時距離分數一律為 0.5。"""
+        cached = self._distances.get(origin)
+        if cached is None:
+            if origin is None:
+                cached = (np.full(len(self), np.inf), np.full(len(self), 0.5))
+            else:
+                distance = haversine_km(origin[0], origin[1], self.lat, self.lng)
+                distance = np.where(np.isnan(distance), np.inf, distance)
+                cached = (distance, np.exp(-distance / RANKING_DISTANCE_SCALE_KM))
+            self._distances[origin] = cached
+        return cached
+
+
+@dataclass
+class RankFilters:
+    """本機重新排序時的篩選條件；空的條件不篩選。價位未知的店不會被價位條件排除。"""
+    min_rating: float = 0.0
+    price_levels: tuple[int, ...] = ()
+    cuisines: tuple[str, ...] = ()
+    max_distance_km: float | None = None
+
+
+def classify_cuisine(place_types: list[str], drink_query: bool) -> str:
+    """以第一個非通用的 Maps 類型當作料理類型；沒有時依查詢是否為飲料類給預設值。"""
+    for place_type in place_types:
+        if place_type not in GENERIC_PLACE_TYPES:
+            return place_type.replace("_", " ").title()
+    return "飲料輕食" if drink_query else "美食餐廳"
+
+
+def parse_location(location: str | None) -> tuple[float, float] | None:
+    """將 "lat, lng" 字串轉成經緯度；不是經緯度 (例如地址) 時回傳 None。"""
+    if not location:
+        return None
+    try:
+        lat, lng = (float(part) for part in location.split(","))
+    except ValueError:
+        return None
+    return lat, lng
+
+
+def haversine_km(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """一個點到多個點的大圓距離 (公里)。"""
+    lat1, lng1 = math.radians(lat), math.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def order_counts(names: list[str]) -> dict[str, int]:
+    """以 restaurant_name 索引查詢每家店的歷史開團次數；資料庫無法使用時回傳空的結果。"""
+    if not names:
+        return {}
+    try:
+        from sqlalchemy import select, func
+        from sql.models.model import GroupOrder
+        from sql.session import session_scope
+
+        statement = (
+            select(GroupOrder.restaurant_name, func.count())
+            .where(GroupOrder.restaurant_name.in_(set(names)))
+            .group_by(GroupOrder.restaurant_name)
+        )
+        with session_scope() as db:
+            return {name: count for name, count in db.execute(statement)}
+    except Exception as e:
+        logging.warning(f"無法讀取歷史訂單數，排序時不考慮人氣: {e}")
+        return {}
+
+
+def build_pool(query: str, places: list[dict], counts: dict[str, int] | None = None) -> CandidatePool:
+    """把 Maps 的結果轉成候選池；每家店的料理類型只在這裡判斷一次。"""
+    counts = counts or {}
+    drink_query = any(keyword in query for keyword in DRINK_KEYWORDS)
+    coords = [(place.get("geometry") or {}).get("location") or {} for place in places]
+    cuisines = [classify_cuisine(place.get("types", []), drink_query) for place in places]
+    labels = sorted(set(cuisines))
+    rating = np.array([place.get("rating") or 0.0 for place in places], dtype=float)
+    votes = np.array([place.get("user_ratings_total") or 0 for place in places], dtype=float)
+    orders = np.array([counts.get(place.get("name"), 0) for place in places], dtype=float)
+
+    # 貝氏平均評價：評論數少的店往池中的平均評價靠攏
+    rated = rating > 0
+    prior = rating[rated].mean() if rated.any() else 3.5
+    m = RANKING_RATING_PRIOR_VOTES
+    rating_score = np.where(rated, (votes * rating + m * prior) / (votes + m), prior) / 5.0
+    max_orders = orders.max() if len(orders) else 0
+    popularity_score = np.log1p(orders) / math.log1p(max_orders) if max_orders > 0 else np.zeros(len(places))
+
+    return CandidatePool(
+        query=query,
+        places=places,
+        lat=np.array([c.get("lat", np.nan) for c in coords], dtype=float),
+        lng=np.array([c.get("lng", np.nan) for c in coords], dtype=float),
+        rating=rating,
+        votes=votes,
+        price=np.array([place.get("price_level", -1) for place in places], dtype=np.int8),
+        orders=orders,
+        cuisine=np.array([labels.index(c) for c in cuisines], dtype=np.int16),
+        cuisine_labels=labels,
+        rating_score=rating_score,
+        popularity_score=popularity_score,
+    )
+
+
+def get_pool(client, query: str, location: str, radius: int = DEFAULT_RADIUS_M) -> CandidatePool:
+    """取得查詢的候選池；不在快取中時從 Maps 快取 (必要時呼叫 Maps API) 與資料庫重建。"""
+    key = places_cache_key(query, location, radius)
+    pool = pool_cache.get(key)
+    if pool is None:
+        places = cached_places_search(client, query, location, radius=radius)
+        pool = build_pool(query, places, order_counts([place.get("name") for place in places if place.get("name")]))
+        pool_cache.set(key, pool)
+    return pool
+
+
+def rank(pool: CandidatePool, origin: tuple[float, float] | None = None, filters: RankFilters | None = None,
+         k: int = RANKING_TOP_K, weights: tuple[float, float, float] = RANKING_WEIGHTS) -> list[dict]:
+    """以預先算好的分數加權、套用篩選遮罩 (一次向量化運算)，回傳分數最高的 k 家店 (由高到低)。"""
+    if not len(pool):
+        return []
+    filters = filters or RankFilters()
+    w_rating, w_distance, w_popularity = weights
+    distance, distance_score = pool.distances(origin)
+    score = w_rating * pool.rating_score + w_distance * distance_score + w_popularity * pool.popularity_score
+
+    mask = np.ones(len(pool), dtype=bool)
+    if filters.min_rating > 0:
+        mask &= pool.rating >= filters.min_rating
+    # 價位與料理以查表篩選 (池很小時 np.isin 的固定成本比整個排序還高)
+    if filters.price_levels:
+        allowed = np.zeros(MAX_PRICE_LEVEL + 1, dtype=bool)
+        allowed[[p for p in filters.price_levels if 0 <= p <= MAX_PRICE_LEVEL]] = True
+        mask &= (pool.price < 0) | allowed[np.clip(pool.price, 0, MAX_PRICE_LEVEL)]
+    if filters.cuisines:
+        allowed = np.array([label in filters.cuisines for label in pool.cuisine_labels], dtype=bool)
+        mask &= allowed[pool.cuisine]
+    if filters.max_distance_km is not None and origin is not None:
+        mask &= distance <= filters.max_distance_km
+
+    candidates = np.flatnonzero(mask)
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-score[candidates], k - 1)[:k]]
+    top = candidates[np.argsort(-score[candidates], kind="stable")]
+
+    results = []
+    for i in top:
+        place = pool.places[i]
+        results.append({
+            "name": place.get("name", "N/A"),
+            "rating": place.get("rating", 0),
+            "address": place.get("vicinity", place.get("formatted_address", "N/A")),
+            "place_id": place.get("place_id"),
+            "cuisine": pool.cuisine_labels[pool.cuisine[i]],
+            "distance_km": round(float(distance[i]), 2) if np.isfinite(distance[i]) else None,
+            "price_level": int(pool.price[i]) if pool.price[i] >= 0 else None,
+            "order_count": int(pool.orders[i]),
+            "score": round(float(score[i]), 4),
+        })
+    return results
+
+
+def _price_level(value: str) -> int:
+    """價位可以是 Maps 的 0~4，也可以是前端的 "$" ~ "$$$$"。"""
+    value = value.strip()
+    return len(value) if value and set(value) == {"$"} else int(value)
+
+
+def filters_from_params(params) -> RankFilters:
+    """
+    由 query string (dict-like) 建立篩選條件：
+    min_rating=4&price=1,2 (或 $,$$)&cuisine=Cafe,Bakery&max_distance_km=2
+    """
+    price = params.get("price") or ""
+    cuisine = params.get("cuisine") or ""
+    max_distance = params.get("max_distance_km")
+    return RankFilters(
+        min_rating=float(params.get("min_rating") or 0),
+        price_levels=tuple(_price_level(p) for p in price.split(",") if p.strip()),
+        cuisines=tuple(c.strip() for c in cuisine.split(",") if c.strip()),
+        max_distance_km=float(max_distance) if max_distance else None,
+    )
+
+
+def rerank(client, query: str, location: str, filters: RankFilters, k: int = RANKING_TOP_K) -> dict:
+    """
+    供 /api/restaurants/rank 使用：以新的篩選條件重新排序同一個查詢的候選池。
+    候選池在快取中時完全不碰 Maps API。
+    """
+    pool = get_pool(client, query, location)
+    return {
+        "query": query,
+        "location": location,
+        "pool_size": len(pool),
+        "results": rank(pool, parse_location(location), filters, k=k),
+    }
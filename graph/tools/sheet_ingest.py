@@ -0,0 +1,239 @@
+# graph/tools/sheet_ingest.py
+"""
+Google Sheet 回覆的增量讀取。
+
+worksheet.get_all_records() 每次都會下載整張表；截止前反覆統計 (即時統計、提醒) 時，
+大部分的列其實都已經讀過了。這裡改為：
+- 每張表記住上次讀到的列數與 Drive 的 modifiedTime (revision)。
+- revision 沒變時完全不抓資料；有變時只以 values_get 抓「上次最後一列之後」的範圍。
+- 已解析的列存在本機 SQLite (以 sheet id 為鍵)，讀取時直接從本機組出完整的回覆。
+- 表頭改變、或 revision 變了卻沒有新列 (代表有人修改/刪除既有的列) 時，整張表重新同步一次。
+- 同一段期間內既有新列、又有人修改舊的列時，增量讀取看不出修改；因此截止後的最終統計
+  以 read(..., full=True) 整張重新同步一次，即時統計則維持只抓新列。
+"""
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+from graph.tools.google_clients import get_gspread_client
+from utils.telemetry import record_external_call
+from config import SHEET_STORE_PATH
+
+# 回覆表單的欄位數很少，抓到 ZZ 欄已足夠
+_LAST_COLUMN = "ZZ"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sheet_cursor (
+    sheet_id   TEXT PRIMARY KEY,
+    worksheet  TEXT NOT NULL,
+    header     TEXT NOT NULL,
+    last_row   INTEGER NOT NULL,
+    revision   TEXT,
+    generation INTEGER NOT NULL DEFAULT 0,
+    synced_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sheet_rows (
+    sheet_id   TEXT NOT NULL,
+    row_index  INTEGER NOT NULL,
+    data       TEXT NOT NULL,
+    PRIMARY KEY (sheet_id, row_index)
+) WITHOUT ROWID;
+"""
+
+
+class SheetRowStore:
+    """以 SQLite 保存每張表已讀取的列與讀取進度。"""
+
+    def __init__(self, path: str = SHEET_STORE_PATH):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sheet_cursor)")}
+        if "generation" not in columns:
+            self._conn.execute("ALTER TABLE sheet_cursor ADD COLUMN generation INTEGER NOT NULL DEFAULT 0")
+        self._lock = threading.Lock()
+
+    def cursor(self, sheet_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT worksheet, header, last_row, revision, generation FROM sheet_cursor WHERE sheet_id = ?",
+                (sheet_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"worksheet": row[0], "header": json.loads(row[1]), "last_row": row[2], "revision": row[3],
+                "generation": row[4]}
+
+    def save(self, sheet_id: str, worksheet: str, header: list[str], rows: list[list[str]],
+             first_row: int, revision: str | None, replace: bool = False) -> None:
+        """
+        寫入從 first_row (試算表的列號，從 1 開始) 開始的新列並更新讀取進度。
+        replace=True 時先清掉這張表原有的列，並遞增 generation，讓增量消費者知道要從頭重算。
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT generation FROM sheet_cursor WHERE sheet_id = ?", (sheet_id,)).fetchone()
+            generation = row[0] if row else 0
+            if replace:
+                generation += 1
+                self._conn.execute("DELETE FROM sheet_rows WHERE sheet_id = ?", (sheet_id,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sheet_rows (sheet_id, row_index, data) VALUES (?, ?, ?)",
+                [(sheet_id, first_row + i, json.dumps(row, ensure_ascii=False)) for i, row in enumerate(rows)],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sheet_cursor "
+                "(sheet_id, worksheet, header, last_row, revision, generation, synced_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (sheet_id, worksheet, json.dumps(header, ensure_ascii=False), first_row + len(rows) - 1,
+                 revision, generation, time.time()),
+            )
+
+    def rows(self, sheet_id: str, after_row: int = 0) -> list[list[str]]:
+        """回傳列號大於 after_row 的列 (依列號排序)。"""
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT data FROM sheet_rows WHERE sheet_id = ? AND row_index > ? ORDER BY row_index",
+                (sheet_id, after_row),
+            )
+            return [json.loads(data) for (data,) in cur]
+
+    def forget(self, sheet_id: str) -> None:
+        """
+        訂單結束後移除這張表的本機資料。
+        讀取進度重設 (下次讀取會整張重新同步)，但保留並遞增 generation：其他行程中仍持有舊 generation 的
+        read_since 消費者因此會重算，generation 不會從頭開始而與舊值相同。
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sheet_rows WHERE sheet_id = ?", (sheet_id,))
+            self._conn.execute(
+                "UPDATE sheet_cursor SET header = '[]', last_row = 1, revision = NULL, "
+                "generation = generation + 1, synced_at = ? WHERE sheet_id = ?",
+                (time.time(), sheet_id),
+            )
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def _to_records(header: list[str], rows: list[list[str]]) -> list[dict]:
+    """與 get_all_records() 相同的格式：以表頭為鍵，短少的欄位補空字串。"""
+    width = len(header)
+    return [dict(zip(header, row[:width] + [""] * (width - len(row)))) for row in rows if any(row)]
+
+
+class IncrementalSheetReader:
+    """只抓新增列的 Google Sheet 讀取器；client 為 gspread client 或相容的假物件。"""
+
+    def __init__(self, client, store: SheetRowStore):
+        self.client = client
+        self.store = store
+        self._spreadsheets = {}
+        self.values_requests = 0
+        self.rows_fetched = 0
+
+    def _fetch(self, spreadsheet, worksheet: str, first_row: int) -> list[list[str]]:
+        from gspread.utils import absolute_range_name
+
+        self.values_requests += 1
+        record_external_call("google_sheets", "values_get")
+        response = spreadsheet.values_get(absolute_range_name(worksheet, f"A{first_row}:{_LAST_COLUMN}"))
+        values = response.get("values", [])
+        self.rows_fetched += len(values)
+        return values
+
+    def _full_sync(self, sheet_id: str, spreadsheet, revision: str | None) -> None:
+        worksheet = spreadsheet.sheet1.title
+        values = self._fetch(spreadsheet, worksheet, 1)
+        header = [str(h).strip() for h in values[0]] if values else []
+        self.store.save(sheet_id, worksheet, header, values[1:], 2, revision, replace=True)
+        logging.info(f"Sheet {sheet_id}: full sync, {max(len(values) - 1, 0)} rows.")
+
+    def sync(self, sheet_id: str, full: bool = False) -> None:
+        """把這張表的新列同步到本機；full=True 時整張表重新同步。"""
+        from gspread.utils import absolute_range_name
+
+        # Spreadsheet 物件建立時會抓一次 metadata，同一張表重複使用
+        spreadsheet = self._spreadsheets.get(sheet_id)
+        if spreadsheet is None:
+            record_external_call("google_sheets", "open_by_key")
+            spreadsheet = self._spreadsheets[sheet_id] = self.client.open_by_key(sheet_id)
+        record_external_call("google_drive", "modified_time")
+        revision = spreadsheet.get_lastUpdateTime()
+        cursor = self.store.cursor(sheet_id)
+
+        if full or cursor is None or not cursor["header"]:
+            self._full_sync(sheet_id, spreadsheet, revision)
+            return
+        if revision is not None and revision == cursor["revision"]:
+            return
+
+        # 連同表頭一起抓，確認欄位沒有被調整過
+        self.values_requests += 1
+        record_external_call("google_sheets", "values_batch_get")
+        header_range = absolute_range_name(cursor["worksheet"], "1:1")
+        new_range = absolute_range_name(cursor["worksheet"], f"A{cursor['last_row'] + 1}:{_LAST_COLUMN}")
+        header_values, new_values = (
+            r.get("values", []) for r in spreadsheet.values_batch_get([header_range, new_range])["valueRanges"]
+        )
+        header = [str(h).strip() for h in header_values[0]] if header_values else []
+        if header != cursor["header"] or not new_values:
+            # 表頭改變，或內容有變卻沒有新列 (既有的列被修改/刪除)：重新同步整張表
+            self._full_sync(sheet_id, spreadsheet, revision)
+            return
+
+        self.rows_fetched += len(new_values)
+        self.store.save(sheet_id, cursor["worksheet"], header, new_values, cursor["last_row"] + 1, revision)
+        logging.info(f"Sheet {sheet_id}: fetched {len(new_values)} new rows.")
+
+    def read(self, sheet_id: str, full: bool = False) -> list[dict]:
+        """同步後回傳整張表的回覆 (與 get_all_records() 相同格式)。"""
+        self.sync(sheet_id, full=full)
+        cursor = self.store.cursor(sheet_id)
+        return _to_records(cursor["header"], self.store.rows(sheet_id))
+
+    def read_since(self, sheet_id: str, after_row: int, generation: int) -> tuple[list[dict], dict]:
+        """
+        同步後回傳 after_row 之後的回覆與目前的讀取進度 (cursor)。
+        給自行維護累計結果的消費者使用：generation 與 cursor["generation"] 不同時代表表格被整張
+        重新同步過，回傳的是全部的回覆，累計結果應重設後再套用。
+        """
+        self.sync(sheet_id)
+        cursor = self.store.cursor(sheet_id)
+        if cursor["generation"] != generation:
+            after_row = 0
+        return _to_records(cursor["header"], self.store.rows(sheet_id, after_row)), cursor
+
+    def read_url(self, sheet_url: str, full: bool = False) -> list[dict]:
+        from gspread.utils import extract_id_from_url
+
+        return self.read(extract_id_from_url(sheet_url), full=full)
+
+    def forget(self, sheet_id: str) -> None:
+        self._spreadsheets.pop(sheet_id, None)
+        self.store.forget(sheet_id)
+
+    def forget_url(self, sheet_url: str) -> None:
+        from gspread.utils import extract_id_from_url
+
+        self.forget(extract_id_from_url(sheet_url))
+
+    def stats(self) -> dict:
+        return {"values_requests": self.values_requests, "rows_fetched": self.rows_fetched}
+
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def get_sheet_reader() -> IncrementalSheetReader | None:
+    """回傳共用的增量讀取器；Google 服務無法初始化時回傳 None。"""
+    global _reader
+    if _reader is None:
+        client = get_gspread_client()
+        if client is None:
+            return None
+        with _reader_lock:
+            if _reader is None:
+                _reader = IncrementalSheetReader(client, SheetRowStore())
+    return _reader
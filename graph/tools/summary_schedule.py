@@ -0,0 +1,220 @@
+# graph/tools/summary_schedule.py
+"""
+截止時統計 (tally_and_notify_task) 的冪等排程與狀態查詢。
+
+使用者重送最後一句話時 schedule_summary_task 會再跑一次；若每次都 apply_async，
+同一張表會在截止時被統計、寄信好幾次。排程紀錄存在 Redis (SUMMARY_SCHEDULE_REDIS_URL)：
+- 冪等鍵 schedule_id = sha256(thread_id, sheet_url, deadline)：同一組參數已經排過 (pending / running / done)
+  時直接回傳原本的紀錄，不會再送出新的 task。
+- 每個 (thread_id, sheet_url) 只有一個有效的排程 (slot)：截止時間改了就排新的 ETA task，
+  舊的標記為 replaced 並 revoke。
+- task 開始時以 pending -> running 的轉換認領 (必須是 slot 目前指向的 task)，
+  被取代的 task、或 Redis visibility timeout 重送的同一個 task 都會直接略過。
+
+鍵的配置：
+- summary:schedule:{schedule_id}   hash：thread_id、sheet_url、title、deadline、task_id、status …
+- summary:slot:{sha256(thread_id, sheet_url)}   目前有效的 schedule_id
+- summary:thread:{thread_id}       set：這個對話的所有 schedule_id
+紀錄在截止時間後保留 SUMMARY_SCHEDULE_RETENTION_SECONDS。
+Redis 無法連線時退回直接 apply_async (寧可重複統計，也不要漏掉)。
+"""
+import json
+import time
+import uuid
+import hashlib
+import logging
+from datetime import datetime
+
+from config import SUMMARY_SCHEDULE_REDIS_URL, SUMMARY_SCHEDULE_RETENTION_SECONDS
+
+PENDING, RUNNING, DONE, FAILED, REPLACED = "pending", "running", "done", "failed", "replaced"
+# 這些狀態的排程視為已存在，相同參數不會再排一次
+_ACTIVE = (PENDING, RUNNING, DONE)
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+def _text(value) -> str | None:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def schedule_key(thread_id: str, sheet_url: str, deadline: datetime) -> str:
+    """(thread_id, sheet_url, deadline) 的冪等鍵；deadline 取到分鐘。"""
+    return _digest(thread_id, sheet_url, deadline.isoformat(timespec="minutes"))
+
+
+class SummaryScheduler:
+    """以 Redis 記錄統計 task 的排程，確保每組參數只排一次、每張表只有一個有效的 ETA task。"""
+
+    def __init__(self, url: str = SUMMARY_SCHEDULE_REDIS_URL, *, client=None,
+                 retention: float = SUMMARY_SCHEDULE_RETENTION_SECONDS):
+        self._url = url
+        self._client = client
+        self._retention = retention
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self._url, socket_timeout=2, socket_connect_timeout=2)
+        return self._client
+
+    # --- 鍵 ---
+    @staticmethod
+    def _schedule_key(schedule_id: str) -> str:
+        return f"summary:schedule:{schedule_id}"
+
+    @staticmethod
+    def _slot_key(thread_id: str, sheet_url: str) -> str:
+        return f"summary:slot:{_digest(thread_id, sheet_url)}"
+
+    @staticmethod
+    def _thread_key(thread_id: str) -> str:
+        return f"summary:thread:{thread_id}"
+
+    def _expire_at(self, deadline: datetime) -> int:
+        return int(max(deadline.timestamp(), time.time()) + self._retention)
+
+    # --- 排程 ---
+    def schedule(self, task, *, thread_id: str, sheet_url: str, title: str, deadline: datetime,
+                 notification_channels: dict) -> dict:
+        """
+        排定截止時的統計並回傳排程紀錄 (含 deduplicated / replaced 欄位)。
+        相同的 (thread_id, sheet_url, deadline) 已有排程時不會送出新的 task。
+        """
+        schedule_id = schedule_key(thread_id, sheet_url, deadline)
+        slot_key = self._slot_key(thread_id, sheet_url)
+        record_key = self._schedule_key(schedule_id)
+        task_id = str(uuid.uuid4())
+        record = {
+            "schedule_id": schedule_id,
+            "thread_id": thread_id,
+            "sheet_url": sheet_url,
+            "title": title,
+            "deadline": deadline.isoformat(),
+            "task_id": task_id,
+            "status": PENDING,
+            "updated_at": time.time(),
+        }
+        outcome = {}
+
+        def reserve(pipe):
+            existing = pipe.hgetall(record_key)
+            if existing and _text(existing.get(b"status")) in _ACTIVE:
+                outcome.update(existing=existing)
+                return
+            previous_id = _text(pipe.get(slot_key))
+            previous = pipe.hgetall(self._schedule_key(previous_id)) if previous_id and previous_id != schedule_id else {}
+            expire_at = self._expire_at(deadline)
+            pipe.multi()
+            pipe.delete(record_key)
+            pipe.hset(record_key, mapping=record)
+            pipe.expireat(record_key, expire_at)
+            pipe.set(slot_key, schedule_id)
+            pipe.expireat(slot_key, expire_at)
+            pipe.sadd(self._thread_key(thread_id), schedule_id)
+            pipe.expireat(self._thread_key(thread_id), expire_at)
+            if previous and _text(previous.get(b"status")) == PENDING:
+                pipe.hset(self._schedule_key(previous_id), mapping={"status": REPLACED, "updated_at": time.time()})
+                outcome.update(replaced=_text(previous.get(b"task_id")))
+
+        try:
+            self.client.transaction(reserve, record_key, slot_key)
+        except Exception as e:
+            logging.warning(f"[SummarySchedule] Redis unavailable, scheduling without deduplication: {e}")
+            task.apply_async(args=[sheet_url, title, notification_channels], eta=deadline)
+            return {**record, "status": None, "deduplicated": False, "replaced": None}
+
+        if "existing" in outcome:
+            logging.info(f"[SummarySchedule] Summary for '{title}' at {deadline} is already scheduled.")
+            return {**self._decode(outcome["existing"]), "deduplicated": True, "replaced": None}
+
+        try:
+            task.apply_async(args=[sheet_url, title, notification_channels],
+                             kwargs={"schedule_id": schedule_id}, eta=deadline, task_id=task_id)
+        except Exception as e:
+            self._set_status(schedule_id, FAILED, error=str(e))
+            raise
+        if outcome.get("replaced"):
+            # 被取代的 task 到期時也會因為不是 slot 指向的 task 而略過，revoke 只是讓它不必佔著 worker 的記憶體
+            try:
+                task.app.control.revoke(outcome["replaced"])
+            except Exception as e:
+                logging.warning(f"[SummarySchedule] Failed to revoke replaced task {outcome['replaced']}: {e}")
+        return {**record, "deduplicated": False, "replaced": outcome.get("replaced")}
+
+    # --- task 端 ---
+    def start(self, schedule_id: str, task_id: str) -> str | None:
+        """
+        task 開始執行時呼叫：排程仍有效且由這個 task 負責時轉為 running 並回傳 None，
+        否則回傳略過的原因 (已被取代、已在執行或已完成)。Redis 無法連線時照常執行。
+        """
+        record_key = self._schedule_key(schedule_id)
+        reason = []
+
+        def claim(pipe):
+            reason.clear()
+            record = pipe.hgetall(record_key)
+            if not record:
+                reason.append("unknown schedule")
+                return
+            status = _text(record.get(b"status"))
+            if _text(record.get(b"task_id")) != task_id:
+                reason.append(f"superseded by task {_text(record.get(b'task_id'))}")
+            elif status == REPLACED:
+                reason.append("replaced by a later schedule")
+            elif status != PENDING:
+                reason.append(f"already {status}")
+            else:
+                pipe.multi()
+                pipe.hset(record_key, mapping={"status": RUNNING, "updated_at": time.time()})
+
+        try:
+            self.client.transaction(claim, record_key)
+        except Exception as e:
+            logging.warning(f"[SummarySchedule] Redis unavailable, running {schedule_id} unchecked: {e}")
+            return None
+        return reason[0] if reason else None
+
+    def finish(self, schedule_id: str, ok: bool, result=None) -> None:
+        """task 結束時記錄結果 (done / failed)。"""
+        self._set_status(schedule_id, DONE if ok else FAILED, result=result)
+
+    def _set_status(self, schedule_id: str, status: str, **fields) -> None:
+        mapping = {"status": status, "updated_at": time.time()}
+        mapping.update({k: json.dumps(v, ensure_ascii=False) for k, v in fields.items() if v is not None})
+        try:
+            # 紀錄可能已過期被刪除；只更新仍存在的紀錄
+            if self.client.exists(self._schedule_key(schedule_id)):
+                self.client.hset(self._schedule_key(schedule_id), mapping=mapping)
+        except Exception as e:
+            logging.warning(f"[SummarySchedule] Failed to record status {status} for {schedule_id}: {e}")
+
+    # --- 查詢 ---
+    @staticmethod
+    def _decode(raw: dict) -> dict:
+        record = {_text(k): _text(v) for k, v in raw.items()}
+        if "updated_at" in record:
+            record["updated_at"] = float(record["updated_at"])
+        for name in ("result", "error"):
+            if name in record:
+                record[name] = json.loads(record[name])
+        return record
+
+    def get(self, schedule_id: str) -> dict | None:
+        raw = self.client.hgetall(self._schedule_key(schedule_id))
+        return self._decode(raw) if raw else None
+
+    def for_thread(self, thread_id: str) -> list[dict]:
+        """對話的所有排程，依截止時間排序。"""
+        ids = sorted(_text(i) for i in self.client.smembers(self._thread_key(thread_id)))
+        pipe = self.client.pipeline(transaction=False)
+        for schedule_id in ids:
+            pipe.hgetall(self._schedule_key(schedule_id))
+        records = [self._decode(raw) for raw in pipe.execute() if raw]
+        return sorted(records, key=lambda r: r.get("deadline", ""))
+
+
+summary_scheduler = SummaryScheduler()
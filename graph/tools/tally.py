@@ -0,0 +1,151 @@
+# graph/tools/tally.py
+"""
+訂單統計引擎，供 celery_worker.tally_and_notify_task 與 db_tools.tally_and_notify_orders 共用。
+
+以一次 groupby 計算每個品項 (含尺寸/甜度等選項) 的份數、點餐人、備註與總數，
+並容忍不同表單的欄位名稱 (例如「您要點的餐點」與「餐點選擇」)。
+pandas 在第一次統計時才匯入，只用到 format_* 或資料類別的模組不必付出匯入成本。
+"""
+from __future__ import annotations
+
+import re
+import html
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# 各欄位可能出現的名稱 (依優先順序)
+COLUMN_ALIASES = {
+    "item": ("餐點選擇", "您要點的餐點", "餐點", "品項"),
+    "name": ("您的姓名", "姓名", "名字"),
+    "note": ("備註", "附註"),
+    "email": ("您的 Email", "您的Email", "Email", "電子郵件"),
+    "quantity": ("數量", "份數"),
+}
+MODIFIER_COLUMNS = ("尺寸", "大小", "甜度", "冰塊", "溫度", "加料", "選項")
+UNFILLED_ITEM = "未填寫"
+# 「珍珠奶茶 (大杯, 半糖)」這類把選項寫在品項後面括號中的格式
+_INLINE_MODIFIER_RE = r"^(?P<base>.*?)\s*[（(](?P<mods>[^）)]*)[）)]\s*$"
+
+
+@dataclass
+class ItemTally:
+    item: str
+    modifiers: str
+    count: int
+    patrons: list[str] = field(default_factory=list)
+    notes: list[str] = field(default_factory=list)
+
+    @property
+    def label(self) -> str:
+        return f"{self.item} ({self.modifiers})" if self.modifiers else self.item
+
+
+@dataclass
+class TallyResult:
+    total: int
+    items: list[ItemTally]
+    participant_emails: list[str]
+
+
+def resolve_columns(columns) -> dict[str, str]:
+    """依別名找出實際的欄位名稱；找不到的欄位不會出現在結果中。"""
+    stripped = {str(c).strip(): c for c in columns}
+    resolved = {}
+    for key, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in stripped:
+                resolved[key] = stripped[alias]
+                break
+    return resolved
+
+
+def _text(series: pd.Series) -> pd.Series:
+    return series.fillna("").astype(str).str.strip()
+
+
+def tally_records(records) -> TallyResult | None:
+    """
+    統計訂單回覆。records 可以是 DataFrame 或 get_all_records() 回傳的 list[dict]。
+    找不到品項欄位時回傳 None。
+    """
+    import pandas as pd
+
+    df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
+    if df.empty:
+        return TallyResult(total=0, items=[], participant_emails=[])
+
+    columns = resolve_columns(df.columns)
+    if "item" not in columns:
+        return None
+
+    item = _text(df[columns["item"]]).replace("", UNFILLED_ITEM)
+    parsed = item.str.extract(_INLINE_MODIFIER_RE)
+    has_inline = parsed["base"].notna()
+    base = item.where(~has_inline, parsed["base"].str.strip())
+    inline_mods = parsed["mods"].fillna("").str.replace(r"\s*[,，、/]\s*", "/", regex=True).str.strip()
+
+    modifier_cols = [c for c in df.columns if str(c).strip() in MODIFIER_COLUMNS]
+    modifiers = inline_mods
+    for col in modifier_cols:
+        value = _text(df[col])
+        modifiers = modifiers.where(value == "", modifiers.where(modifiers == "", modifiers + "/") + value)
+
+    frame = pd.DataFrame({
+        "item": base,
+        "modifiers": modifiers,
+        "name": _text(df[columns["name"]]) if "name" in columns else "",
+        "note": _text(df[columns["note"]]) if "note" in columns else "",
+        "qty": (pd.to_numeric(df[columns["quantity"]], errors="coerce").fillna(1).astype(int)
+                if "quantity" in columns else 1),
+    })
+    frame["note"] = frame["note"].where(frame["note"] == "", frame["name"].where(frame["name"] == "", frame["name"] + ": ") + frame["note"])
+
+    grouped = frame.groupby(["item", "modifiers"], sort=False).agg(
+        count=("qty", "sum"),
+        patrons=("name", list),
+        notes=("note", list),
+    ).sort_values("count", ascending=False, kind="stable")
+
+    items = [
+        ItemTally(item=item_name, modifiers=mods, count=int(row.count),
+                  patrons=[p for p in row.patrons if p], notes=[n for n in row.notes if n])
+        for (item_name, mods), row in zip(grouped.index, grouped.itertuples(index=False))
+    ]
+
+    emails = []
+    if "email" in columns:
+        emails = sorted(set(e for e in _text(df[columns["email"]]) if e))
+
+    return TallyResult(total=int(frame["qty"].sum()), items=items, participant_emails=emails)
+
+
+def format_summary_text(title: str, result: TallyResult) -> str:
+    """Celery 通知使用的純文字摘要。"""
+    if not result.items:
+        return f"【{title} 訂單統計】\n\n本次揪團沒有人訂餐喔！"
+    lines = [f"【{title} 訂單統計 - 總計 {result.total} 份】"]
+    for item in result.items:
+        lines.append(f"- {item.label} x {item.count} ({', '.join(item.patrons)})")
+    notes = [note for item in result.items for note in item.notes]
+    if notes:
+        lines.append("備註：")
+        lines.extend(f"  * {note}" for note in notes)
+    return "\n".join(lines)
+
+
+def format_line_lines(result: TallyResult) -> str:
+    """LINE 統計訊息中的品項列表。"""
+    return "".join(f"▪️ {item.label}: {item.count} 份\n" for item in sorted(result.items, key=lambda i: i.label))
+
+
+def format_html_table(result: TallyResult) -> str:
+    """Email 統計結果中的品項表格。"""
+    rows = "".join(
+        f"<tr><td>{html.escape(item.label)}</td><td>{item.count}</td></tr>"
+        for item in sorted(result.items, key=lambda i: i.label)
+    )
+    return ("<table border='1' cellpadding='5' cellspacing='0'><tr><th>餐點</th><th>數量</th></tr>"
+            f"{rows}</table><p>總計 {result.total} 份</p>")
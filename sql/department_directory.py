@@ -0,0 +1,149 @@
+# sql/department_directory.py
+"""
+部門 Email 名錄。
+
+原本每次通知都要查 Department、再透過 department.users 逐一載入 User (N+1)。這裡改為：
+- 以一個 projection 查詢 (Department.name, User.email) 取得一或多個部門的所有 Email，
+  走 users (department_id, email) 複合索引，不建立 ORM 物件。
+- 結果快取在行程內，並以版本號失效：User / Department 有任何寫入 (ORM flush 或批次 UPDATE/DELETE)
+  並 commit 後版本號加一，舊版本的快取項目視為未命中。
+- 版本號只在同一個 process 內有效 (例如 Celery worker 看不到 Flask 的寫入)，因此快取另有
+  DEPARTMENT_DIRECTORY_TTL_SECONDS 的存活時間作為上限。
+"""
+import weakref
+import threading
+
+from cachetools import TTLCache
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from sql.models.model import SessionLocal, Department, User
+from utils.cache import CACHE_REGISTRY
+from config import DEPARTMENT_DIRECTORY_TTL_SECONDS, DEPARTMENT_DIRECTORY_MAXSIZE
+
+_WATCHED_MODELS = (User, Department)
+_DIRTY_KEY = "department_directory_dirty"
+# 所有名錄實例，commit 時一起失效
+_directories = weakref.WeakSet()
+
+
+class DepartmentDirectory:
+    """部門名稱 -> 成員 Email 的快取名錄。"""
+
+    def __init__(self, session_factory=SessionLocal, ttl: float = DEPARTMENT_DIRECTORY_TTL_SECONDS,
+                 maxsize: int = DEPARTMENT_DIRECTORY_MAXSIZE):
+        self._session_factory = session_factory
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0
+        _directories.add(self)
+
+    def invalidate(self) -> None:
+        """讓目前所有的快取項目失效。"""
+        with self._lock:
+            self.version += 1
+
+    def _query(self, names: list[str]) -> dict[str, list[str]]:
+        self.queries += 1
+        statement = (
+            select(Department.name, User.email)
+            .outerjoin(User, User.department_id == Department.id)
+            .where(Department.name.in_(names))
+        )
+        db = self._session_factory()
+        try:
+            found: dict[str, list[str]] = {}
+            for name, email in db.execute(statement):
+                emails = found.setdefault(name, [])
+                if email:
+                    emails.append(email)
+            return found
+        finally:
+            db.close()
+
+    def emails_for_many(self, department_names) -> dict[str, list[str]]:
+        """
+        一次取得多個部門的成員 Email；沒有快取到的部門以同一個查詢補齊。
+        不存在的部門不會出現在結果中，存在但沒有成員的部門對應空 list。
+        """
+        names = list(dict.fromkeys(department_names))
+        result: dict[str, list[str]] = {}
+        missing = []
+        with self._lock:
+            version = self.version
+            for name in names:
+                entry = self._cache.get(name)
+                if entry is not None and entry[0] == version:
+                    self.hits += 1
+                    if entry[1] is not None:
+                        result[name] = list(entry[1])
+                else:
+                    self.misses += 1
+                    missing.append(name)
+        if not missing:
+            return result
+
+        # 以查詢前的版本號存入：查詢期間若有寫入，下次查詢會視為過期
+        found = self._query(missing)
+        with self._lock:
+            for name in missing:
+                emails = found.get(name)
+                self._cache[name] = (version, tuple(emails) if emails is not None else None)
+        result.update(found)
+        return result
+
+    def emails_for(self, department_name: str) -> list[str] | None:
+        """取得單一部門的成員 Email；部門不存在時回傳 None。"""
+        return self.emails_for_many([department_name]).get(department_name)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": "MemoryCacheBackend",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "queries": self.queries,
+            "version": self.version,
+        }
+
+
+department_directory = DepartmentDirectory()
+CACHE_REGISTRY["department_directory"] = department_directory
+
+
+# --- 失效：User / Department 的寫入在 commit 後讓名錄版本號加一 ---
+def _mark_dirty(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info[_DIRTY_KEY] = True
+
+
+for _model in _WATCHED_MODELS:
+    for _event_name in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event_name, _mark_dirty)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_bulk_dirty(orm_execute_state):
+    # insert(User) / update(User) / delete(Department) 這類批次語句不會觸發 mapper 事件
+    state = orm_execute_state
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return
+    if state.bind_mapper is not None and state.bind_mapper.class_ in _WATCHED_MODELS:
+        state.session.info[_DIRTY_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop(_DIRTY_KEY, False):
+        for directory in list(_directories):
+            directory.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_on_rollback(session):
+    session.info.pop(_DIRTY_KEY, None)
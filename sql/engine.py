@@ -0,0 +1,149 @@
+# sql/engine.py
+"""
+資料庫 engine 的建立與連線池監控。
+
+- 連線池大小、overflow、等待逾時、recycle 與 pre-ping 由 config (DB_POOL_*) 設定。
+- SQLite 啟用 WAL 與 busy_timeout，讓 Flask、Celery 等多個執行緒/行程同時讀寫時
+  不會馬上遇到 "database is locked"。
+- MeteredQueuePool 記錄每次取得連線的等待時間、使用中的連線數與飽和度，
+  用來決定多少個並行 worker 需要多大的連線池 (見 pool_stats())。
+"""
+import time
+import threading
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from config import (
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT_SECONDS,
+    DB_POOL_RECYCLE_SECONDS,
+    DB_POOL_PRE_PING,
+    SQLITE_WAL,
+    SQLITE_BUSY_TIMEOUT_MS,
+)
+
+
+class PoolMetrics:
+    """連線池的取用統計。"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.checkouts = 0
+        self.timeouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def checked_out(self) -> None:
+        with self._lock:
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def checked_in(self) -> None:
+        with self._lock:
+            self.in_use -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "saturation": round(self.in_use / self.capacity, 4) if self.capacity else 0.0,
+                "peak_saturation": round(self.peak_in_use / self.capacity, 4) if self.capacity else 0.0,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "checkout_wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "checkout_wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+
+
+class MeteredQueuePool(QueuePool):
+    """記錄取得連線等待時間的 QueuePool。"""
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_timeout()
+            raise
+        self.metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def _is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def build_engine(database_url: str, sqlite_wal: bool = SQLITE_WAL, **overrides):
+    """依 config 建立 engine；overrides 可覆寫連線池參數 (例如 benchmark 測試不同的 pool_size)。"""
+    url = make_url(database_url)
+    is_sqlite = url.get_backend_name() == "sqlite"
+    options = {
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+    }
+    if is_sqlite:
+        options["connect_args"] = {"check_same_thread": False}
+    if not _is_memory_sqlite(url):
+        # 記憶體中的 SQLite 每條連線各是一個資料庫，維持 SQLAlchemy 預設的連線池
+        options.update({
+            "poolclass": MeteredQueuePool,
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+        })
+    options.update(overrides)
+
+    engine = create_engine(url, **options)
+    if isinstance(engine.pool, MeteredQueuePool):
+        engine.pool.metrics = PoolMetrics(options["pool_size"] + max(options["max_overflow"], 0))
+        event.listen(engine, "checkout", lambda *args: engine.pool.metrics.checked_out())
+        event.listen(engine, "checkin", lambda *args: engine.pool.metrics.checked_in())
+
+    if is_sqlite:
+        @event.listens_for(engine, "connect")
+        def _sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"PRAGMA busy_timeout = {int(SQLITE_BUSY_TIMEOUT_MS)}")
+            if sqlite_wal and not _is_memory_sqlite(url):
+                cursor.execute("PRAGMA journal_mode = WAL")
+                # WAL 模式下 NORMAL 已能保證一致性，且不必每次 commit 都 fsync
+                cursor.execute("PRAGMA synchronous = NORMAL")
+            cursor.close()
+
+    return engine
+
+
+def pool_stats(engine) -> dict:
+    """回傳連線池的設定與取用統計。"""
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__, "status": pool.status()}
+    metrics = getattr(pool, "metrics", None)
+    if metrics is not None:
+        stats.update(metrics.stats())
+    return stats
@@ -0,0 +1,527 @@
+# sql/menu_catalog.py
+"""
+本機的餐廳 / 菜單目錄。
+
+建立表單時的餐點選項與 get_menu_from_url 工具都從這裡查詢，不必爬網站或呼叫 LLM：
+- 資料：restaurants / menu_items 兩張表，以 `python -m sql.menu_catalog import <檔案>` 從 CSV 或 JSON 批次匯入。
+- 索引：店名與別名正規化後存在 restaurants.search_text。SQLite 以 FTS5 的 trigram tokenizer 建立全文索引
+  (中文不需要斷詞)，PostgreSQL 以 pg_trgm 的 GIN 索引 (migration 0007)；兩者都沒有時改在行程內逐一比對。
+- 快取：MenuCatalog 在啟動時 (app.py / asgi_app.py) 把整份目錄載入行程內的快照，完整店名與網址直接查表，
+  其餘輸入 (例如 "50嵐 南港園區店") 以全文索引找候選店家，解析結果另外快取。
+  快照超過 MENU_CATALOG_TTL_SECONDS 後的下一次查詢重新載入；同一個行程內匯入後立即失效。
+
+匯入格式：
+- CSV：每列一項餐點，欄位 restaurant, item, price, category, description, aliases, website, address
+  (只有 restaurant 與 item 是必要的；店家的欄位取該店第一個非空值)。
+- JSON：[{"name": ..., "aliases": [...], "website": ..., "address": ..., "items": [{"name": ..., "price": ...}]}]，
+  items 也可以只是餐點名稱的 list。
+同名的店家會被更新，菜單整份換成檔案中的內容。範例見 sql/menus.sample.json。
+
+用法：
+    python -m sql.menu_catalog import sql/menus.sample.json menus.csv
+    python -m sql.menu_catalog lookup "50嵐 南港園區店"
+"""
+import re
+import csv
+import json
+import time
+import logging
+import argparse
+import threading
+import unicodedata
+from datetime import datetime
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+from cachetools import TTLCache
+from sqlalchemy import delete, insert, select, text, update
+from sqlalchemy.exc import DBAPIError
+
+from sql.models.model import SessionLocal, Restaurant, MenuItem
+from sql.session import session_scope
+from utils.cache import CACHE_REGISTRY
+from config import (
+    MENU_CATALOG_TTL_SECONDS,
+    MENU_CATALOG_RESOLVE_MAXSIZE,
+    MENU_CATALOG_MIN_MATCH,
+    MENU_CATALOG_MAX_FORM_ITEMS,
+)
+
+# 全文索引找候選店家時最多取幾家
+SEARCH_CANDIDATES = 5
+# 一個 IN (...) 查詢最多帶幾個值
+_CHUNK_SIZE = 500
+
+_SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS restaurants_fts USING fts5("
+    "search_text, content='restaurants', content_rowid='id', tokenize='trigram')",
+    # external content 的 FTS 表由 trigger 與 restaurants 同步 (包含 ORM 的批次 INSERT / UPDATE)
+    "CREATE TRIGGER IF NOT EXISTS restaurants_fts_ai AFTER INSERT ON restaurants BEGIN "
+    "INSERT INTO restaurants_fts (rowid, search_text) VALUES (new.id, new.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS restaurants_fts_ad AFTER DELETE ON restaurants BEGIN "
+    "INSERT INTO restaurants_fts (restaurants_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS restaurants_fts_au AFTER UPDATE OF search_text ON restaurants BEGIN "
+    "INSERT INTO restaurants_fts (restaurants_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); "
+    "INSERT INTO restaurants_fts (rowid, search_text) VALUES (new.id, new.search_text); END",
+    # 建立索引前就已經存在的店家
+    "INSERT INTO restaurants_fts (restaurants_fts) VALUES ('rebuild')",
+]
+_POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_restaurants_search_text_trgm ON restaurants USING gin (search_text gin_trgm_ops)",
+]
+_SEARCH_SQL = {
+    # 輸入的每個 trigram 以 OR 查詢，bm25 排序：共有越多 trigram 的店家越前面
+    "fts5": "SELECT rowid FROM restaurants_fts WHERE restaurants_fts MATCH :query "
+            "ORDER BY bm25(restaurants_fts) LIMIT :limit",
+    "pg_trgm": "SELECT id FROM restaurants WHERE search_text % :query "
+               "ORDER BY similarity(search_text, :query) DESC LIMIT :limit",
+}
+
+
+def normalize_name(value: str) -> str:
+    """NFKC 正規化、轉小寫並移除空白，讓全形/半形與空白差異不影響比對。"""
+    value = unicodedata.normalize("NFKC", value or "").lower()
+    return re.sub(r"\s+", "", value)
+
+
+def trigrams(value: str) -> set[str]:
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+def website_host(url: str) -> str | None:
+    """網址的主機名稱 (去掉 www.)；不像網址的字串回傳 None。"""
+    url = (url or "").strip()
+    if not url or any(ch.isspace() for ch in url):
+        return None
+    host = urlsplit(url if "://" in url else f"http://{url}").hostname or ""
+    host = host.removeprefix("www.")
+    return host if "." in host else None
+
+
+# --- 全文索引 ---
+def create_search_index(conn) -> str | None:
+    """建立店名的全文索引並回傳使用的方式；資料庫不支援時只記錄警告 (查詢改在行程內比對)。"""
+    statements = {"sqlite": _SQLITE_SEARCH_DDL, "postgresql": _POSTGRES_SEARCH_DDL}.get(conn.dialect.name)
+    if statements is None:
+        logging.warning(f"Menu catalog: no full-text index for {conn.dialect.name}, lookups scan the snapshot")
+        return None
+    try:
+        with conn.begin_nested():
+            for statement in statements:
+                conn.execute(text(statement))
+    except DBAPIError as e:
+        # 例如 SQLite 編譯時沒有 FTS5 / trigram (3.34 以前)，或沒有權限 CREATE EXTENSION
+        logging.warning(f"Menu catalog: full-text index unavailable, lookups scan the snapshot: {e}")
+        return None
+    return detect_search_backend(conn)
+
+
+def detect_search_backend(conn) -> str | None:
+    """目前資料庫上可用的全文索引："fts5"、"pg_trgm" 或 None。"""
+    if conn.dialect.name == "sqlite":
+        found = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'restaurants_fts'"))
+        return "fts5" if found.first() else None
+    if conn.dialect.name == "postgresql":
+        found = conn.execute(text("SELECT 1 FROM pg_indexes WHERE indexname = 'ix_restaurants_search_text_trgm'"))
+        return "pg_trgm" if found.first() else None
+    return None
+
+
+def search_restaurant_ids(conn, backend: str, key: str, limit: int = SEARCH_CANDIDATES) -> list[int]:
+    """以全文索引找出與正規化後的輸入最相近的店家 id。"""
+    if backend == "fts5":
+        grams = sorted(trigrams(key))
+        if not grams:
+            return []
+        query = " OR ".join('"{}"'.format(gram.replace('"', '""')) for gram in grams)
+    else:
+        # 預設門檻 0.3 對「店名 + 分店名」這類較長的輸入太嚴格，候選店家之後會再以 MENU_CATALOG_MIN_MATCH 確認
+        conn.execute(text("SELECT set_config('pg_trgm.similarity_threshold', '0.1', true)"))
+        query = key
+    return [row[0] for row in conn.execute(text(_SEARCH_SQL[backend]), {"query": query, "limit": limit})]
+
+
+# --- 行程內的快照 ---
+@dataclass(frozen=True)
+class MenuEntry:
+    name: str
+    price: int | None = None
+    category: str | None = None
+
+    def label(self) -> str:
+        """表單選項與工具輸出使用的文字，例如 "珍珠奶茶 $50"。"""
+        return self.name if self.price is None else f"{self.name} ${self.price}"
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    id: int
+    name: str
+    # 正規化後的店名與別名
+    keys: tuple[str, ...]
+    host: str | None
+    items: tuple[MenuEntry, ...]
+
+
+@dataclass
+class _Snapshot:
+    restaurants: dict[int, CatalogEntry]
+    by_key: dict[str, int]
+    by_host: dict[str, int]
+    # 少於三個字的店名 / 別名沒有 trigram，全文索引找不到，改為檢查是否出現在輸入中
+    short_keys: list[tuple[str, int]]
+    search_backend: str | None
+    items: int
+    loaded_at: float
+    generation: int
+
+
+def _match_score(entry: CatalogEntry, key: str) -> tuple[float, int]:
+    """(店名或別名的 trigram 出現在輸入中的比例, 對應的店名長度)；店名完整出現在輸入中為 1。"""
+    best = (0.0, 0)
+    grams = trigrams(key)
+    for candidate in entry.keys:
+        if candidate in key:
+            score = 1.0
+        else:
+            candidate_grams = trigrams(candidate)
+            score = len(candidate_grams & grams) / len(candidate_grams) if candidate_grams else 0.0
+        best = max(best, (score, len(candidate)))
+    return best
+
+
+class MenuCatalog:
+    """店名 / 網址 -> 菜單的查詢，整份目錄快取在行程內。"""
+
+    def __init__(self, session_factory=SessionLocal, ttl: float = MENU_CATALOG_TTL_SECONDS,
+                 resolve_maxsize: int = MENU_CATALOG_RESOLVE_MAXSIZE, min_match: float = MENU_CATALOG_MIN_MATCH):
+        self._session_factory = session_factory
+        self.ttl = ttl
+        self.min_match = min_match
+        self._snapshot: _Snapshot | None = None
+        self._generation = 0
+        # 正規化後的輸入 -> (快照的 generation, 店家 id 或 None)
+        self._resolved: TTLCache = TTLCache(maxsize=resolve_maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0
+        self.reloads = 0
+
+    # --- 載入 ---
+    def _load(self) -> _Snapshot:
+        db = self._session_factory()
+        try:
+            rows = db.execute(select(Restaurant.id, Restaurant.name, Restaurant.aliases, Restaurant.website)).all()
+            # 依 (restaurant_id, position) 的索引順序取出所有餐點
+            menus: dict[int, list[MenuEntry]] = {}
+            statement = (
+                select(MenuItem.restaurant_id, MenuItem.name, MenuItem.price, MenuItem.category)
+                .order_by(MenuItem.restaurant_id, MenuItem.position)
+            )
+            for restaurant_id, name, price, category in db.execute(statement):
+                menus.setdefault(restaurant_id, []).append(MenuEntry(name, price, category))
+            search_backend = detect_search_backend(db.connection())
+        finally:
+            db.close()
+
+        restaurants, by_key, by_host, short_keys = {}, {}, {}, []
+        for restaurant_id, name, aliases, website in rows:
+            keys = tuple(dict.fromkeys(k for k in map(normalize_name, [name, *split_aliases(aliases)]) if k))
+            host = website_host(website) if website else None
+            restaurants[restaurant_id] = CatalogEntry(restaurant_id, name, keys, host,
+                                                      tuple(menus.get(restaurant_id, ())))
+            for key in keys:
+                by_key.setdefault(key, restaurant_id)
+                if len(key) < 3:
+                    short_keys.append((key, restaurant_id))
+            if host:
+                by_host.setdefault(host, restaurant_id)
+        return _Snapshot(restaurants, by_key, by_host, short_keys, search_backend,
+                         sum(len(items) for items in menus.values()), time.monotonic(), self._next_generation())
+
+    def _next_generation(self) -> int:
+        with self._lock:
+            self._generation += 1
+            return self._generation
+
+    def _reload(self, previous: _Snapshot | None) -> None:
+        """重新載入快照；失敗時保留舊的快照 (沒有時使用空的目錄)，一個 TTL 之後再嘗試。"""
+        try:
+            self._snapshot = self._load()
+            self.reloads += 1
+        except Exception as e:
+            logging.warning(f"Menu catalog reload failed: {e}")
+            if previous is None:
+                previous = _Snapshot({}, {}, {}, [], None, 0, 0.0, self._next_generation())
+            previous.loaded_at = time.monotonic()
+            self._snapshot = previous
+
+    def warm(self) -> int:
+        """載入整份目錄 (啟動時呼叫)，回傳店家數；資料庫無法使用時只記錄警告，之後的查詢會再嘗試。"""
+        with self._reload_lock:
+            self._reload(self._snapshot)
+        snapshot = self._snapshot
+        logging.info(f"Menu catalog warmed: {len(snapshot.restaurants)} restaurants, {snapshot.items} items, "
+                     f"search index: {snapshot.search_backend or 'none'}")
+        return len(snapshot.restaurants)
+
+    def _current(self) -> _Snapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.loaded_at <= self.ttl:
+            return snapshot
+        with self._reload_lock:
+            # 其他執行緒可能已經重新載入
+            snapshot = self._snapshot
+            if snapshot is not None and time.monotonic() - snapshot.loaded_at <= self.ttl:
+                return snapshot
+            self._reload(snapshot)
+            return self._snapshot
+
+    def invalidate(self) -> None:
+        """丟棄快照，下一次查詢重新載入 (匯入後呼叫)。"""
+        with self._reload_lock:
+            self._snapshot = None
+
+    # --- 查詢 ---
+    def _candidates(self, snapshot: _Snapshot, key: str) -> list[int]:
+        if snapshot.search_backend and len(key) >= 3:
+            self.queries += 1
+            db = self._session_factory()
+            try:
+                found = search_restaurant_ids(db.connection(), snapshot.search_backend, key)
+                return found + [restaurant_id for short, restaurant_id in snapshot.short_keys if short in key]
+            except Exception as e:
+                logging.warning(f"Menu catalog search failed, scanning the snapshot: {e}")
+            finally:
+                db.close()
+        # 沒有全文索引 (或輸入太短)：在快照中逐一比對
+        return list(snapshot.restaurants)
+
+    def _search(self, snapshot: _Snapshot, key: str) -> int | None:
+        candidates = self._candidates(snapshot, key)
+
+        best, best_score = None, (self.min_match, 0)
+        for restaurant_id in dict.fromkeys(candidates):
+            entry = snapshot.restaurants.get(restaurant_id)
+            if entry is None:
+                continue
+            score = _match_score(entry, key)
+            if score >= best_score:
+                best, best_score = entry.id, score
+        return best
+
+    def resolve(self, restaurant: str) -> CatalogEntry | None:
+        """將使用者提到的店名 (可以帶分店名，例如 "50嵐 南港園區店") 對應到目錄中的店家。"""
+        key = normalize_name(restaurant)
+        if not key:
+            return None
+        snapshot = self._current()
+        restaurant_id = snapshot.by_key.get(key)
+        if restaurant_id is None:
+            with self._lock:
+                cached = self._resolved.get(key)
+            if cached is not None and cached[0] == snapshot.generation:
+                self.hits += 1
+                restaurant_id = cached[1]
+            else:
+                self.misses += 1
+                restaurant_id = self._search(snapshot, key)
+                with self._lock:
+                    self._resolved[key] = (snapshot.generation, restaurant_id)
+        else:
+            self.hits += 1
+        return snapshot.restaurants.get(restaurant_id) if restaurant_id is not None else None
+
+    def lookup(self, url_or_name: str) -> CatalogEntry | None:
+        """以店家網址 (比對主機名稱) 或店名查詢。"""
+        host = website_host(url_or_name)
+        if host:
+            snapshot = self._current()
+            # 也接受子網域，例如 order.50lan.com.tw
+            for candidate in (host, *(host.split(".", i)[-1] for i in range(1, host.count(".")))):
+                if candidate in snapshot.by_host:
+                    self.hits += 1
+                    return snapshot.restaurants[snapshot.by_host[candidate]]
+        return self.resolve(url_or_name)
+
+    def form_options(self, restaurant: str, limit: int = MENU_CATALOG_MAX_FORM_ITEMS) -> list[str]:
+        """建立表單用的餐點選項 (不重複，依菜單順序)；目錄中沒有這家店時回傳空 list。"""
+        entry = self.resolve(restaurant) if restaurant else None
+        if entry is None:
+            return []
+        return list(dict.fromkeys(item.label() for item in entry.items))[:limit]
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        total = self.hits + self.misses
+        return {
+            "backend": "MemoryCacheBackend",
+            "restaurants": len(snapshot.restaurants) if snapshot else 0,
+            "items": snapshot.items if snapshot else 0,
+            "search_index": snapshot.search_backend if snapshot else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "queries": self.queries,
+            "reloads": self.reloads,
+        }
+
+
+menu_catalog = MenuCatalog()
+CACHE_REGISTRY["menu_catalog"] = menu_catalog
+
+
+# --- 匯入 ---
+def split_aliases(value) -> list[str]:
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = re.split(r"[,，、;；|]", value)
+    return [alias.strip() for alias in value if alias and alias.strip()]
+
+
+def parse_price(value) -> int | None:
+    """接受 50、"50"、"$50"、"NT$ 1,200" 這類寫法。"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    digits = re.sub(r"[^\d.]", "", str(value))
+    try:
+        return int(float(digits)) if digits else None
+    except ValueError:
+        return None
+
+
+def _merge(records) -> list[dict]:
+    """依店名合併：同一家店的餐點依出現順序串接，其他欄位取第一個非空值。"""
+    merged: dict[str, dict] = {}
+    for record in records:
+        name = (record.get("name") or "").strip()
+        if not name:
+            continue
+        restaurant = merged.setdefault(name, {"name": name, "aliases": [], "website": None, "address": None,
+                                              "items": []})
+        for alias in split_aliases(record.get("aliases")):
+            if alias not in restaurant["aliases"]:
+                restaurant["aliases"].append(alias)
+        for field_name in ("website", "address"):
+            restaurant[field_name] = restaurant[field_name] or (record.get(field_name) or "").strip() or None
+        for item in record.get("items") or []:
+            if isinstance(item, str):
+                item = {"name": item}
+            item_name = (item.get("name") or "").strip()
+            if item_name:
+                restaurant["items"].append({
+                    "name": item_name,
+                    "price": parse_price(item.get("price")),
+                    "category": (item.get("category") or "").strip() or None,
+                    "description": (item.get("description") or "").strip() or None,
+                })
+    return list(merged.values())
+
+
+def read_csv(path: str) -> list[dict]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        rows = list(csv.DictReader(f))
+    return _merge({**row, "name": row.get("restaurant"), "items": [{**row, "name": row.get("item")}]}
+                  for row in rows)
+
+
+def read_json(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("restaurants", [])
+    return _merge(data)
+
+
+def read_catalog_file(path: str) -> list[dict]:
+    if path.lower().endswith(".csv"):
+        return read_csv(path)
+    if path.lower().endswith(".json"):
+        return read_json(path)
+    raise ValueError(f"不支援的菜單檔案格式 (只接受 .csv / .json): {path}")
+
+
+def _chunks(values: list, size: int = _CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def import_catalog(restaurants: list[dict], session_factory=SessionLocal) -> dict:
+    """
+    批次寫入店家與菜單 (同一個交易)：新的店家一次 INSERT、既有的店家以主鍵批次 UPDATE，
+    既有菜單整份刪除後所有餐點以一次 executemany INSERT 寫入。全文索引由 trigger 同步。
+    """
+    now = datetime.now()
+    rows = [{
+        "name": r["name"],
+        "aliases": ",".join(r["aliases"]) or None,
+        "website": r["website"],
+        "address": r["address"],
+        "search_text": " ".join(dict.fromkeys(k for k in map(normalize_name, [r["name"], *r["aliases"]]) if k)),
+        "updated_at": now,
+    } for r in restaurants]
+    names = [row["name"] for row in rows]
+
+    with session_scope(session_factory) as db:
+        ids: dict[str, int] = {}
+        for chunk in _chunks(names):
+            ids.update(db.execute(select(Restaurant.name, Restaurant.id).where(Restaurant.name.in_(chunk))).all())
+        existing = dict(ids)
+
+        created = [row for row in rows if row["name"] not in existing]
+        updated = [{"id": existing[row["name"]], **row} for row in rows if row["name"] in existing]
+        if created:
+            db.execute(insert(Restaurant), created)
+            for chunk in _chunks([row["name"] for row in created]):
+                ids.update(db.execute(select(Restaurant.name, Restaurant.id).where(Restaurant.name.in_(chunk))).all())
+        if updated:
+            db.execute(update(Restaurant), updated)
+            for chunk in _chunks(list(existing.values())):
+                db.execute(delete(MenuItem).where(MenuItem.restaurant_id.in_(chunk)))
+
+        items = [
+            {"restaurant_id": ids[r["name"]], "position": position, **item}
+            for r in restaurants
+            for position, item in enumerate(r["items"])
+        ]
+        if items:
+            db.execute(insert(MenuItem), items)
+
+    menu_catalog.invalidate()
+    return {"restaurants": len(rows), "created": len(created), "updated": len(updated), "items": len(items)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local restaurant / menu catalog.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="bulk-load menus from CSV / JSON files")
+    import_parser.add_argument("paths", nargs="+")
+    lookup_parser = subparsers.add_parser("lookup", help="resolve a restaurant name or website to its menu")
+    lookup_parser.add_argument("query")
+    args = parser.parse_args()
+
+    from sql.models.model import init_db
+    init_db()
+
+    if args.command == "import":
+        restaurants = _merge(r for path in args.paths for r in read_catalog_file(path))
+        start = time.perf_counter()
+        result = import_catalog(restaurants)
+        print(f"Imported {result['restaurants']} restaurants ({result['created']} new, {result['updated']} updated), "
+              f"{result['items']} menu items in {(time.perf_counter() - start) * 1000:.0f} ms")
+    else:
+        entry = menu_catalog.lookup(args.query)
+        if entry is None:
+            print("Not found")
+        else:
+            print(f"{entry.name}: {', '.join(item.label() for item in entry.items)}")
+
+
+if __name__ == '__main__':
+    main()
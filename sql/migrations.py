@@ -0,0 +1,103 @@
+# sql/migrations.py
+"""
+簡易的資料庫 migration。
+
+Base.metadata.create_all() 只會建立不存在的資料表，不會替既有的資料表補上新的索引或欄位，
+因此這類變更以 migration 記錄在 schema_migrations 表中，每個只會執行一次。
+SQL 須同時相容 SQLite 與 PostgreSQL；新增欄位用 _add_column (SQLite 沒有 ADD COLUMN IF NOT EXISTS，
+而新建的資料庫 create_all 時已經有這個欄位)。
+
+執行方式：
+    python -m sql.migrations
+"""
+import logging
+
+from sqlalchemy import inspect, text
+
+
+def _add_column(table: str, column: str, ddl: str):
+    def migrate(conn):
+        if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return migrate
+
+
+def _menu_catalog_search(conn):
+    # 全文索引依資料庫而不同 (SQLite FTS5 trigram / PostgreSQL pg_trgm)，見 sql/menu_catalog.py
+    from sql.menu_catalog import create_search_index
+    create_search_index(conn)
+
+
+MIGRATIONS = [
+    (
+        "0001_group_orders_status_deadline",
+        # 提醒 / 統計排程的「status = 'open' AND deadline 區間」查詢
+        "CREATE INDEX IF NOT EXISTS ix_group_orders_status_deadline ON group_orders (status, deadline)",
+    ),
+    (
+        "0002_users_department_email",
+        # 部門名錄的 projection 查詢 (sql/department_directory.py)
+        "CREATE INDEX IF NOT EXISTS ix_users_department_email ON users (department_id, email)",
+    ),
+    (
+        "0003_group_orders_claimed_at",
+        # 排程 worker 以 status 轉換認領訂單的時間 (sql/order_queries.py claim_orders)
+        _add_column("group_orders", "claimed_at", "TIMESTAMP"),
+    ),
+    (
+        "0004_group_orders_reminded_at",
+        _add_column("group_orders", "reminded_at", "TIMESTAMP"),
+    ),
+    (
+        "0005_group_orders_restaurant_name",
+        # 推薦排序的歷史開團次數 (graph/tools/place_ranking.py order_counts)
+        "CREATE INDEX IF NOT EXISTS ix_group_orders_restaurant_name ON group_orders (restaurant_name)",
+    ),
+    (
+        "0006_menu_items_restaurant_position",
+        # 建立表單時依店家取出菜單 (sql/menu_catalog.py)
+        "CREATE INDEX IF NOT EXISTS ix_menu_items_restaurant_position ON menu_items (restaurant_id, position)",
+    ),
+    (
+        "0007_menu_catalog_search",
+        _menu_catalog_search,
+    ),
+    (
+        "0008_group_orders_notified_channels",
+        # 截止統計的通知重試 (graph/tools/db_tools.py tally_and_notify_orders)
+        _add_column("group_orders", "notified_channels", "VARCHAR"),
+    ),
+    (
+        "0009_group_orders_notify_attempts",
+        _add_column("group_orders", "notify_attempts", "INTEGER NOT NULL DEFAULT 0"),
+    ),
+]
+
+
+def run_migrations(engine) -> list[str]:
+    """執行尚未套用的 migration，回傳這次套用的 migration id。"""
+    applied = []
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations (id VARCHAR(255) PRIMARY KEY, applied_at TIMESTAMP)"
+        ))
+        done = {row[0] for row in conn.execute(text("SELECT id FROM schema_migrations"))}
+        for migration_id, statement in MIGRATIONS:
+            if migration_id in done:
+                continue
+            if callable(statement):
+                statement(conn)
+            else:
+                conn.execute(text(statement))
+            conn.execute(
+                text("INSERT INTO schema_migrations (id, applied_at) VALUES (:id, CURRENT_TIMESTAMP)"),
+                {"id": migration_id},
+            )
+            applied.append(migration_id)
+            logging.info(f"Applied migration {migration_id}")
+    return applied
+
+
+if __name__ == '__main__':
+    from sql.models.model import engine
+    print(f"Applied migrations: {run_migrations(engine) or 'none'}")
@@ -1,11 +1,12 @@
 # models.py
 
-from sqlalchemy import create_engine, Column, String, ForeignKey, DateTime
+from sqlalchemy import Column, String, ForeignKey, DateTime, Index, Integer, Text
 from sqlalchemy.orm import sessionmaker, relationship, declarative_base
 
 # 建議從 config 引入 DATABASE_URL，讓設定集中管理
 # 確保您的 config.py 中有 DATABASE_URL = os.getenv("DATABASE_URL")
 from config import DATABASE_URL
+from sql.engine import build_engine
 
 # 建立所有模型都會繼承的 Base class
 Base = declarative_base()
@@ -37,6 +38,11 @@ class User(Base):
     department_id = Column(String, ForeignKey('departments.id'))
     department = relationship("Department", back_populates="users")
 
+    # 部門名錄以 (department_id, email) 查詢，這個索引同時涵蓋要取出的欄位
+    __table_args__ = (
+        Index("ix_users_department_email", "department_id", "email"),
+    )
+
 
 class GroupOrder(Base):
     """
@@ -54,17 +60,69 @@ class GroupOrder(Base):
     status = Column(String, default='open', nullable=False)
     department_name = Column(String, nullable=True)
 
+    # 排程 worker 認領訂單 (open -> tallying) 的時間，逾時未完成的認領會被釋放
+    claimed_at = Column(DateTime, nullable=True)
+    # 已送出截止前提醒的時間，同一張訂單只提醒一次
+    reminded_at = Column(DateTime, nullable=True)
+    # 截止統計已送達的通知通道 (以逗號分隔) 與派送次數：重試時只重送其餘的通道，
+    # 超過 ORDER_NOTIFY_MAX_ATTEMPTS 次仍未全部送達的訂單改為 notify_failed，不再重試
+    notified_channels = Column(String, nullable=True)
+    notify_attempts = Column(Integer, nullable=False, default=0)
+
+    # 提醒與統計排程都以「狀態 + 截止時間」篩選訂單 (見 sql/order_queries.py)；
+    # 推薦排序以店名統計歷史開團次數 (見 graph/tools/place_ranking.py)
+    __table_args__ = (
+        Index("ix_group_orders_status_deadline", "status", "deadline"),
+        Index("ix_group_orders_restaurant_name", "restaurant_name"),
+    )
+
+
+
+class Restaurant(Base):
+    """
+    本機菜單目錄中的店家 (以 python -m sql.menu_catalog import 匯入，見 sql/menu_catalog.py)
+    """
+    __tablename__ = 'restaurants'
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+    # 其他常見的稱呼 (以逗號分隔)，例如 "五十嵐,50lan"
+    aliases = Column(String, nullable=True)
+    website = Column(String, nullable=True)
+    address = Column(String, nullable=True)
+    # 正規化後的店名與別名，以空白分隔；全文索引 (SQLite FTS5 trigram / PostgreSQL pg_trgm) 建在這個欄位上
+    search_text = Column(Text, nullable=False, default="")
+    updated_at = Column(DateTime, nullable=True)
+
+    menu_items = relationship("MenuItem", back_populates="restaurant", order_by="MenuItem.position")
+
+
+class MenuItem(Base):
+    """
+    店家的一項餐點
+    """
+    __tablename__ = 'menu_items'
+    id = Column(Integer, primary_key=True)
+    restaurant_id = Column(Integer, ForeignKey('restaurants.id'), nullable=False)
+    name = Column(String, nullable=False)
+    category = Column(String, nullable=True)
+    # 新台幣，整數
+    price = Column(Integer, nullable=True)
+    description = Column(Text, nullable=True)
+    # 在菜單上的順序 (匯入檔案中的順序)
+    position = Column(Integer, nullable=False, default=0)
+
+    restaurant = relationship("Restaurant", back_populates="menu_items")
+
+    # 建立表單時依店家依序取出整份菜單
+    __table_args__ = (
+        Index("ix_menu_items_restaurant_position", "restaurant_id", "position"),
+    )
 
 # --- 資料庫初始化 ---
 
 # 根據 DATABASE_URL 建立資料庫引擎
-# `connect_args` 是 SQLite 特有的設定，允許多執行緒共享同一個連接
-if DATABASE_URL and DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL, connect_args={"check_same_thread": False}
-    )
-else:
-    engine = create_engine(DATABASE_URL)
+# 連線池大小、pre-ping 與 SQLite 的 WAL / busy_timeout 設定見 sql/engine.py
+engine = build_engine(DATABASE_URL)
 
 # 建立 SessionLocal class，之後我們會用它來建立資料庫 session
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -77,6 +135,9 @@ def init_db():
     print("Initializing database...")
     # Base.metadata.create_all 會檢查所有繼承自 Base 的 class，並在資料庫中建立對應的資料表
     Base.metadata.create_all(bind=engine)
+    # 既有的資料庫不會因為 create_all 補上新的索引，由 migration 處理
+    from sql.migrations import run_migrations
+    run_migrations(engine)
     print("Database initialized.")
 
 
@@ -0,0 +1,196 @@
+# sql/order_queries.py
+"""
+GroupOrder 的批次查詢層，供提醒與統計排程使用。
+
+- 只查詢排程需要的欄位，不建立完整的 ORM 物件。
+- 以 (deadline, id) 做 keyset 分頁，每次取 batch_size 筆，不會一次把所有訂單載入記憶體，
+  也不會像 OFFSET 分頁一樣越後面越慢；查詢走 (status, deadline) 複合索引。
+- 結單以 UPDATE ... WHERE id IN (...) 批次更新，一個批次只 commit 一次。
+- 多個 worker 同時處理時，以狀態轉換認領訂單 (open -> tallying，UPDATE ... RETURNING)：
+  只有真的把狀態改掉的 worker 會拿到這張訂單，同一張訂單不會被統計兩次。
+"""
+from datetime import datetime
+from typing import Iterator, Sequence
+
+from sqlalchemy import select, update, func, and_, or_
+from sqlalchemy.orm import Session
+
+from sql.models.model import GroupOrder
+
+DEFAULT_BATCH_SIZE = 500
+
+# 排程需要的欄位
+_ORDER_COLUMNS = (
+    GroupOrder.id,
+    GroupOrder.restaurant_name,
+    GroupOrder.response_sheet_id,
+    GroupOrder.form_url,
+    GroupOrder.department_name,
+    GroupOrder.deadline,
+    GroupOrder.notified_channels,
+    GroupOrder.notify_attempts,
+)
+
+
+def iter_order_batches(db: Session, *, status: str = "open", deadline_after: datetime | None = None,
+                       deadline_until: datetime | None = None, criteria: Sequence = (),
+                       batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[list]:
+    """
+    依 (deadline, id) 順序分批取出指定狀態、截止時間落在 (deadline_after, deadline_until] 的訂單。
+    criteria 為額外的篩選條件。每一列可以用屬性存取 (row.id, row.deadline …)。
+    """
+    base = select(*_ORDER_COLUMNS).where(GroupOrder.status == status, *criteria)
+    if deadline_after is not None:
+        base = base.where(GroupOrder.deadline > deadline_after)
+    if deadline_until is not None:
+        base = base.where(GroupOrder.deadline <= deadline_until)
+    base = base.order_by(GroupOrder.deadline, GroupOrder.id).limit(batch_size)
+
+    last = None
+    while True:
+        query = base
+        if last is not None:
+            query = query.where(or_(
+                GroupOrder.deadline > last.deadline,
+                and_(GroupOrder.deadline == last.deadline, GroupOrder.id > last.id),
+            ))
+        rows = db.execute(query).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last = rows[-1]
+
+
+def iter_due_orders(db: Session, now: datetime, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[list]:
+    """已過截止時間、仍為 open 的訂單。"""
+    return iter_order_batches(db, deadline_until=now, batch_size=batch_size)
+
+
+def iter_upcoming_orders(db: Session, now: datetime, until: datetime, unreminded_only: bool = False,
+                         batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[list]:
+    """將在 (now, until] 之間截止、仍為 open 的訂單；unreminded_only 時排除已提醒過的。"""
+    criteria = (GroupOrder.reminded_at.is_(None),) if unreminded_only else ()
+    return iter_order_batches(db, deadline_after=now, deadline_until=until, criteria=criteria,
+                              batch_size=batch_size)
+
+
+def fetch_orders(db: Session, order_ids: Sequence[str]) -> list:
+    """以 id 取出排程需要的欄位 (與 iter_order_batches 的列相同)。"""
+    rows = []
+    for i in range(0, len(order_ids), DEFAULT_BATCH_SIZE):
+        chunk = order_ids[i:i + DEFAULT_BATCH_SIZE]
+        rows.extend(db.execute(select(*_ORDER_COLUMNS).where(GroupOrder.id.in_(chunk))).all())
+    return rows
+
+
+def set_order_status(db: Session, order_ids: Sequence[str], status: str, *, from_status: str | None = "open",
+                     chunk_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    以 UPDATE ... WHERE id IN (...) 批次更新訂單狀態，最後 commit 一次。
+    from_status 不為 None 時只更新目前為該狀態的訂單。回傳更新的筆數。
+    """
+    updated = 0
+    for i in range(0, len(order_ids), chunk_size):
+        statement = update(GroupOrder).where(GroupOrder.id.in_(order_ids[i:i + chunk_size]))
+        if from_status is not None:
+            statement = statement.where(GroupOrder.status == from_status)
+        result = db.execute(statement.values(status=status).execution_options(synchronize_session=False))
+        updated += result.rowcount
+    db.commit()
+    return updated
+
+
+def close_orders(db: Session, order_ids: Sequence[str], from_status: str | None = "tallying",
+                 chunk_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """把已認領 (tallying) 的訂單批次改為 closed。"""
+    return set_order_status(db, order_ids, "closed", from_status=from_status, chunk_size=chunk_size)
+
+
+def _claim(db: Session, order_ids: Sequence[str], conditions: tuple, values: dict, chunk_size: int) -> list[str]:
+    claimed = []
+    for i in range(0, len(order_ids), chunk_size):
+        statement = (
+            update(GroupOrder)
+            .where(GroupOrder.id.in_(order_ids[i:i + chunk_size]), *conditions)
+            .values(**values)
+            .returning(GroupOrder.id)
+            .execution_options(synchronize_session=False)
+        )
+        claimed.extend(db.execute(statement).scalars().all())
+    db.commit()
+    return claimed
+
+
+def claim_orders(db: Session, order_ids: Sequence[str], now: datetime, *, from_status: str = "open",
+                 to_status: str = "tallying", chunk_size: int = DEFAULT_BATCH_SIZE) -> list[str]:
+    """
+    以 UPDATE ... WHERE status = from_status RETURNING id 原子地認領訂單並記下 claimed_at，
+    回傳這次真的認領到的 id；已被其他 worker 認領或已結單的訂單不會出現在結果中。
+    """
+    return _claim(db, order_ids, (GroupOrder.status == from_status,),
+                  {"status": to_status, "claimed_at": now}, chunk_size)
+
+
+def release_orders(db: Session, order_ids: Sequence[str], chunk_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """統計失敗的訂單放回 open，讓下一次 sweep 重試。"""
+    released = 0
+    for i in range(0, len(order_ids), chunk_size):
+        result = db.execute(
+            update(GroupOrder)
+            .where(GroupOrder.id.in_(order_ids[i:i + chunk_size]), GroupOrder.status == "tallying")
+            .values(status="open", claimed_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        released += result.rowcount
+    db.commit()
+    return released
+
+
+def finish_tally(db: Session, order_id: str, delivered: Sequence[str], *, done: bool, max_attempts: int) -> str | None:
+    """
+    記下已認領 (tallying) 訂單這次派送後已送達的通道並累計派送次數，再轉換狀態：
+    全部送達 (done) -> closed；否則未達 max_attempts 次放回 open，下次 sweep 只重送其餘通道；
+    達到上限 -> notify_failed，不再重試。回傳新的狀態；訂單已不是 tallying (認領逾時被釋放) 時回傳 None。
+    """
+    attempts = db.execute(
+        update(GroupOrder)
+        .where(GroupOrder.id == order_id, GroupOrder.status == "tallying")
+        .values(notified_channels=",".join(sorted(delivered)) or None,
+                notify_attempts=func.coalesce(GroupOrder.notify_attempts, 0) + 1)
+        .returning(GroupOrder.notify_attempts)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+    if attempts is None:
+        db.commit()
+        return None
+    status = "closed" if done else "notify_failed" if attempts >= max_attempts else "open"
+    values = {"status": status, "claimed_at": None} if status == "open" else {"status": status}
+    db.execute(
+        update(GroupOrder)
+        .where(GroupOrder.id == order_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return status
+
+
+def release_stale_claims(db: Session, claimed_before: datetime) -> int:
+    """認領後超過時限仍未結單 (worker 中途當掉) 的訂單放回 open。"""
+    result = db.execute(
+        update(GroupOrder)
+        .where(GroupOrder.status == "tallying", GroupOrder.claimed_at < claimed_before)
+        .values(status="open", claimed_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def claim_reminders(db: Session, order_ids: Sequence[str], now: datetime,
+                    chunk_size: int = DEFAULT_BATCH_SIZE) -> list[str]:
+    """原子地標記尚未提醒的 open 訂單 (reminded_at)，回傳這次認領到、應該送出提醒的 id。"""
+    return _claim(db, order_ids, (GroupOrder.status == "open", GroupOrder.reminded_at.is_(None)),
+                  {"reminded_at": now}, chunk_size)
@@ -0,0 +1,34 @@
+# sql/session.py
+"""
+資料庫 session 的生命週期管理。
+
+- session_scope()：排程、工具等一次性工作使用，離開時自動 commit (例外時 rollback) 並歸還連線，
+  不必在每個函式裡自己寫 try/finally，也不會因為提早 return 而漏掉 close。
+  session 只包住資料庫操作本身；讀取 Google Sheet、寄信等網路 I/O 請在 session 之外進行，
+  不要在等待外部服務時佔用連線池中的連線與讀取交易。
+"""
+from contextlib import contextmanager
+
+from sqlalchemy.orm import Session
+
+from sql.models.model import SessionLocal, engine
+from sql.engine import pool_stats
+
+
+@contextmanager
+def session_scope(session_factory=SessionLocal):
+    """提供一個獨立的 session，離開時 commit (例外時 rollback) 並關閉。"""
+    db: Session = session_factory()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def db_pool_stats() -> dict:
+    """主要資料庫連線池的設定與取用統計。"""
+    return pool_stats(engine)
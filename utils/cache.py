@@ -0,0 +1,150 @@
+# utils/cache.py
+"""
+通用的結果快取，提供行程內 (TTL + LRU) 與 Redis 兩種後端，並記錄命中/未命中次數。
+
+所有建立的快取都會登錄到 CACHE_REGISTRY，可透過 cache_stats() 一次取得所有統計。
+"""
+import json
+import logging
+import threading
+from typing import Any
+
+from cachetools import TTLCache
+
+from utils.telemetry import record_cache_lookup
+
+_MISSING = object()
+# 名稱 -> 任何提供 stats() 的快取物件
+CACHE_REGISTRY: dict[str, Any] = {}
+
+
+class MemoryCacheBackend:
+    """行程內的 TTL + LRU 快取 (cachetools.TTLCache，滿了會淘汰最久未使用的項目)。"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            return self._cache.get(key, _MISSING)
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._cache[key] = value
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+class RedisCacheBackend:
+    """
+    以 Redis 儲存的快取，值以 JSON 序列化並以 SETEX 設定 TTL。
+    LRU 淘汰交給 Redis 的 maxmemory-policy (建議 allkeys-lru)。
+    Redis 無法連線時視為未命中，不影響主要流程。
+    """
+
+    def __init__(self, url: str, namespace: str, ttl: float):
+        import redis
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._namespace = namespace
+        self._ttl = int(ttl)
+
+    def _key(self, key: str) -> str:
+        return f"cache:{self._namespace}:{key}"
+
+    def get(self, key: str) -> Any:
+        try:
+            raw = self._client.get(self._key(key))
+        except Exception as e:
+            logging.warning(f"Redis cache get failed ({self._namespace}): {e}")
+            return _MISSING
+        return _MISSING if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any) -> None:
+        try:
+            self._client.setex(self._key(key), self._ttl, json.dumps(value, ensure_ascii=False))
+        except Exception as e:
+            logging.warning(f"Redis cache set failed ({self._namespace}): {e}")
+
+    def delete(self, key: str) -> None:
+        try:
+            self._client.delete(self._key(key))
+        except Exception as e:
+            logging.warning(f"Redis cache delete failed ({self._namespace}): {e}")
+
+    def clear(self) -> None:
+        try:
+            for key in self._client.scan_iter(match=self._key("*")):
+                self._client.delete(key)
+        except Exception as e:
+            logging.warning(f"Redis cache clear failed ({self._namespace}): {e}")
+
+
+class ResultCache:
+    """在後端之上記錄命中/未命中次數的快取。"""
+
+    def __init__(self, name: str, backend):
+        self.name = name
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default=None) -> Any:
+        value = self.backend.get(key)
+        record_cache_lookup(self.name, value is not _MISSING)
+        with self._lock:
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self.backend.set(key, value)
+
+    def delete(self, key: str) -> None:
+        self.backend.delete(key)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def build_cache(name: str, backend: str = "memory", maxsize: int = 1024, ttl: float = 3600,
+                redis_url: str | None = None) -> ResultCache:
+    """依設定建立快取並登錄到 CACHE_REGISTRY；Redis 後端建立失敗時退回行程內快取。"""
+    cache_backend = None
+    if backend == "redis" and redis_url:
+        try:
+            cache_backend = RedisCacheBackend(redis_url, namespace=name, ttl=ttl)
+        except Exception as e:
+            logging.warning(f"無法建立 Redis 快取 '{name}'，改用行程內快取: {e}")
+    if cache_backend is None:
+        cache_backend = MemoryCacheBackend(maxsize=maxsize, ttl=ttl)
+
+    cache = ResultCache(name, cache_backend)
+    CACHE_REGISTRY[name] = cache
+    return cache
+
+
+def cache_stats() -> dict:
+    """回傳所有已登錄快取的命中統計。"""
+    return {name: cache.stats() for name, cache in CACHE_REGISTRY.items()}
@@ -1,5 +1,6 @@
-from flask.cli import load_dotenv
-from langchain_openai import ChatOpenAI, AzureChatOpenAI
+from functools import lru_cache
+
+from dotenv import load_dotenv
 import os
 
 # 為了安全起見，強烈建議將您的 API 金鑰設定為環境變數
@@ -14,8 +15,19 @@ if "AZURE_OPENAI_API_KEY" not in os.environ:
 
 api_key = os.environ.get("AZURE_OPENAI_API_KEY")
 
-# 初始化您選擇的大型語言模型
-llm = AzureChatOpenAI(
-    api_version="2024-07-01-preview",
-    model_name="gpt-4o-mini"  # 使用的模型名稱，可以根據你的部署進行替換
-)
+
+@lru_cache(maxsize=None)
+def get_llm():
+    """
+    回傳共用的大型語言模型 client。
+    langchain_openai (連同 openai SDK) 匯入要一秒以上，第一次使用時才匯入並建立。
+    """
+    from langchain_openai import AzureChatOpenAI
+    from config import LLM_STREAM_USAGE
+
+    # 初始化您選擇的大型語言模型
+    return AzureChatOpenAI(
+        api_version="2024-07-01-preview",
+        model_name="gpt-4o-mini",  # 使用的模型名稱，可以根據你的部署進行替換
+        stream_usage=LLM_STREAM_USAGE,
+    )
@@ -0,0 +1,42 @@
+# utils/rate_limit.py
+import time
+import threading
+
+
+class TokenBucket:
+    """
+    執行緒安全的 token bucket 限流器。
+    以 rate (每秒補充的 token 數) 持續補充，最多累積 capacity 個 token。
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """嘗試取得 tokens；成功回傳 0，否則回傳需要等待的秒數。"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1, timeout: float | None = None) -> bool:
+        """阻塞直到取得 tokens；超過 timeout 秒仍無法取得時回傳 False。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
@@ -0,0 +1,136 @@
+# utils/sse.py
+import json
+import random
+import logging
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.utils.json import parse_partial_json
+
+from config import CHAT_STREAM_LOG_LEVEL, CHAT_STREAM_LOG_SAMPLE_RATE
+
+# 結構化訊息 (例如 restaurant_list) 在 additional_kwargs 中帶著事件類型，串流時不必再解析內容判斷是不是 JSON
+EVENT_KIND_KEY = "event_kind"
+# 只有帶著這個 tag 的 LLM 呼叫 (要給使用者看的回覆) 會逐 token 送出；狀態擷取、摘要等內部呼叫不會
+REPLY_STREAM_TAG = "stream_reply"
+# 輸出是 JSON 的 LLM 呼叫 (融合模式)：只把其中 "reply" 欄位的文字逐段送出
+REPLY_JSON_STREAM_TAG = "stream_reply_json"
+REPLY_JSON_FIELD = "reply"
+
+
+def structured_message(kind: str, data, **extra) -> AIMessage:
+    """建立給前端的結構化訊息：內容為 {"type": kind, "data": data, **extra} 的 JSON，並標上事件類型。"""
+    content = json.dumps({"type": kind, "data": data, **extra}, ensure_ascii=False)
+    return AIMessage(content=content, additional_kwargs={EVENT_KIND_KEY: kind})
+
+
+def format_sse(payload) -> str:
+    """將 dict 或已序列化的 JSON 字串包裝成一個 SSE data 事件 (中文不跳脫，UTF-8 只要一半的 bytes)。"""
+    if not isinstance(payload, str):
+        payload = json.dumps(payload, ensure_ascii=False)
+    return f"data: {payload}\n\n"
+
+
+def message_to_sse(message) -> str | None:
+    """
+    將節點輸出的一則訊息轉換成 SSE 事件。
+    標有事件類型的結構化訊息 (例如 restaurant_list) 內容本身就是 JSON，直接送出；其餘包裝成 message 事件。
+    """
+    if not message or not message.content:
+        return None
+    if message.additional_kwargs.get(EVENT_KIND_KEY):
+        return format_sse(message.content)
+    return format_sse({"type": "message", "id": message.id, "content": message.content})
+
+
+class ChatStreamEncoder:
+    """
+    把一次 /api/chat 的 graph 串流轉成 SSE 事件 (Flask 與 ASGI 版本共用)。
+
+    以 stream_mode="updates" 只取得每個節點新增的訊息，而不是每一步的完整 state；
+    stream_tokens 為 True 時另外訂閱 "messages"，把標有 REPLY_STREAM_TAG 的 LLM 輸出以 delta 事件逐段送出
+    (標有 REPLY_JSON_STREAM_TAG 的則以部分 JSON 解析，只送出 reply 欄位新增的文字)。
+    delta 只是暫時的：之後送出同一個 id 的完整 message 事件才算定案；融合模式的回覆若最後沒有被採用
+    (例如這一輪改為送出餐廳列表)，就不會有對應的 message 事件，前端應在 end 時丟棄。
+    每條串流依 CHAT_STREAM_LOG_SAMPLE_RATE 抽樣決定是否記錄 log；訊息全文只在 DEBUG 等級時才輸出。
+    """
+
+    def __init__(self, thread_id: str, stream_tokens: bool = False):
+        self.thread_id = thread_id
+        self.stream_tokens = stream_tokens
+        self.stream_mode = ["updates", "messages"] if stream_tokens else ["updates"]
+        self.log_level = logging.getLevelName(CHAT_STREAM_LOG_LEVEL.upper())
+        if not isinstance(self.log_level, int):
+            self.log_level = logging.INFO
+        self.sampled = random.random() < CHAT_STREAM_LOG_SAMPLE_RATE
+        self.deltas = 0
+        # JSON 回覆：id -> (目前累積的原始輸出, 已送出的 reply 文字長度)
+        self._json_replies: dict[str, tuple[str, int]] = {}
+
+    def _log(self, node: str, message) -> None:
+        if not self.sampled:
+            return
+        logger = logging.getLogger()
+        if logger.isEnabledFor(logging.DEBUG):
+            logging.debug(f"Streaming event from {node} for thread_id {self.thread_id}: {message.pretty_repr()}")
+        elif logger.isEnabledFor(self.log_level):
+            kind = message.additional_kwargs.get(EVENT_KIND_KEY) or "message"
+            logging.log(self.log_level, f"Streaming {kind} from {node} for thread_id {self.thread_id} "
+                                        f"({len(message.content)} chars)")
+
+    def _updates(self, payload: dict) -> list[str]:
+        events = []
+        for node, update in payload.items():
+            if not isinstance(update, dict):
+                continue
+            messages = update.get("messages") or []
+            if not isinstance(messages, list):
+                messages = [messages]
+            for message in messages:
+                # ToolMessage 只給 graph 內部使用，不送給前端
+                if not isinstance(message, AIMessage):
+                    continue
+                self._log(node, message)
+                if event := message_to_sse(message):
+                    events.append(event)
+        return events
+
+    def _json_reply_delta(self, chunk: AIMessageChunk) -> str:
+        """累積 JSON 輸出並以部分解析取出 reply 欄位，回傳這次新增的文字。"""
+        raw, sent = self._json_replies.get(chunk.id, ("", 0))
+        raw += chunk.content
+        parsed = parse_partial_json(raw)
+        reply = parsed.get(REPLY_JSON_FIELD) if isinstance(parsed, dict) else None
+        text = reply[sent:] if isinstance(reply, str) else ""
+        self._json_replies[chunk.id] = (raw, sent + len(text))
+        return text
+
+    def _delta(self, payload: tuple) -> list[str]:
+        chunk, metadata = payload
+        if not isinstance(chunk, AIMessageChunk) or not isinstance(chunk.content, str) or not chunk.content:
+            return []
+        tags = metadata.get("tags") or []
+        if REPLY_STREAM_TAG in tags:
+            text = chunk.content
+        elif REPLY_JSON_STREAM_TAG in tags:
+            text = self._json_reply_delta(chunk)
+        else:
+            return []
+        if not text:
+            return []
+        self.deltas += 1
+        return [format_sse({"type": "delta", "id": chunk.id, "content": text})]
+
+    def encode(self, chunk) -> list[str]:
+        """將 graph.stream / astream 產生的一個 (mode, payload) 轉成零或多個 SSE 事件。"""
+        mode, payload = chunk
+        if mode == "messages":
+            return self._delta(payload)
+        return self._updates(payload)
+
+    def end(self) -> str:
+        if self.sampled and self.deltas:
+            logging.log(self.log_level, f"Streamed {self.deltas} deltas for thread_id {self.thread_id}")
+        return format_sse({"type": "end", "thread_id": self.thread_id})
+
+    def error(self, error: Exception) -> str:
+        return format_sse({"type": "error", "content": str(error)})
@@ -0,0 +1,499 @@
+# utils/telemetry.py
+"""
+LangGraph 工作流程的追蹤 (span) 與指標 (Prometheus)，不依賴 OpenTelemetry / prometheus_client 套件。
+
+- Span：欄位比照 OpenTelemetry (trace_id、span_id、parent_span_id、name、start/end、attributes、status)，
+  以 contextvars 串起父子關係，同步節點、async 節點與 ToolNode 的執行緒池都適用。
+  結束的 span 交給 exporter：InMemorySpanExporter (預設，保留最近的 span，也方便驗證)、
+  LoggingSpanExporter (每個 span 一行 JSON log)。
+- Histogram / Counter：render_prometheus() 輸出 Prometheus 文字格式，由 /metrics 提供。
+- instrument_node() / instrument_tool()：包裝 graph 的節點與工具，記錄耗時與成功/失敗。
+- LLM 的 prompt / completion tokens 以 langchain 的 configure hook 掛一個 callback 收集 (install_llm_callback)，
+  不必在每個 chain 傳 callbacks；外部 API 呼叫與快取命中由呼叫端以 record_external_call() /
+  record_cache_lookup() 回報。這些數字都會累加到目前所在的節點 span 與對應的 counter。
+"""
+import json
+import time
+import uuid
+import bisect
+import logging
+import functools
+import threading
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable
+
+from config import TELEMETRY_ENABLED, TELEMETRY_SPAN_EXPORTER, TELEMETRY_SPAN_BUFFER
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+# --- 指標 ---
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """只會增加的計數器 (Prometheus counter)。"""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels.get(n, "")) for n in self.labelnames), 0)
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """固定區間的直方圖 (Prometheus histogram)。"""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [各區間的次數 (非累計)..., +Inf 區間, sum]
+        self._series: dict[tuple, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels.get(n, "")) for n in self.labelnames))
+        return int(sum(series[:-1])) if series else 0
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), series):
+                    cumulative += n
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {int(cumulative)}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series[-1])}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {int(cumulative)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Any] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+NODE_DURATION = REGISTRY.register(Histogram(
+    "order_agent_node_duration_seconds", "Wall time of each LangGraph node.", ("node", "status")))
+TOOL_DURATION = REGISTRY.register(Histogram(
+    "order_agent_tool_duration_seconds", "Wall time of each tool call.", ("tool", "status")))
+LLM_DURATION = REGISTRY.register(Histogram(
+    "order_agent_llm_duration_seconds", "Wall time of each LLM call.", ("node", "status")))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "order_agent_llm_tokens_total", "LLM tokens by node and kind (prompt / completion).", ("node", "kind")))
+EXTERNAL_CALLS = REGISTRY.register(Counter(
+    "order_agent_external_calls_total", "Calls to external APIs (Maps, Forms, Sheets, LINE, SMTP).",
+    ("service", "operation", "node")))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "order_agent_cache_requests_total", "Result cache lookups by cache and result (hit / miss).",
+    ("cache", "result", "node")))
+
+
+def render_prometheus() -> str:
+    """/metrics 的內容 (Prometheus text exposition format 0.0.4)。"""
+    return REGISTRY.render()
+
+
+# --- 追蹤 ---
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: str | None
+    start_time: float
+    end_time: float | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    status: str = "UNSET"  # UNSET | OK | ERROR
+    status_description: str | None = None
+
+    @property
+    def duration(self) -> float | None:
+        return None if self.end_time is None else self.end_time - self.start_time
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add(self, key: str, amount: float) -> None:
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "duration": self.duration}
+
+
+class InMemorySpanExporter:
+    """保留最近 maxlen 個結束的 span。"""
+
+    def __init__(self, maxlen: int = TELEMETRY_SPAN_BUFFER):
+        self._spans: deque[Span] = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def get_finished_spans(self) -> list[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+
+class LoggingSpanExporter:
+    """每個結束的 span 以一行 JSON 寫入 log，交給既有的 log 收集管線。"""
+
+    def export(self, span: Span) -> None:
+        logging.info(f"[Span] {json.dumps(span.to_dict(), ensure_ascii=False, default=str)}")
+
+
+_current_span: ContextVar[Span | None] = ContextVar("telemetry_current_span", default=None)
+# 目前所在的節點 span；tokens、外部呼叫、快取命中都累加到這裡
+_current_node: ContextVar[Span | None] = ContextVar("telemetry_current_node", default=None)
+
+
+class Tracer:
+    def __init__(self, exporters: list | None = None, enabled: bool = TELEMETRY_ENABLED):
+        self.exporters = list(exporters or [])
+        self.enabled = enabled
+
+    def add_exporter(self, exporter) -> None:
+        self.exporters.append(exporter)
+
+    def create_span(self, name: str, attributes: dict | None = None, parent: Span | None = None) -> Span:
+        """建立 span (不設為目前的 span)，呼叫端負責 end_span()。"""
+        parent = parent if parent is not None else _current_span.get()
+        return Span(
+            name=name,
+            trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+            span_id=uuid.uuid4().hex[:16],
+            parent_span_id=parent.span_id if parent else None,
+            start_time=time.time(),
+            attributes=dict(attributes or {}),
+        )
+
+    def end_span(self, span: Span, error: BaseException | None = None) -> None:
+        span.end_time = time.time()
+        if error is not None:
+            span.status, span.status_description = "ERROR", f"{type(error).__name__}: {error}"
+        elif span.status == "UNSET":
+            span.status = "OK"
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                logging.warning(f"Span exporter {type(exporter).__name__} failed: {e}")
+
+    def start_as_current_span(self, name: str, attributes: dict | None = None, node: bool = False):
+        return _SpanScope(self, name, attributes, node)
+
+
+class _SpanScope:
+    """with tracer.start_as_current_span(...) as span：進入時設為目前的 span，離開時結束並匯出。"""
+
+    def __init__(self, tracer: Tracer, name: str, attributes: dict | None, node: bool):
+        self._tracer = tracer
+        self._name = name
+        self._attributes = attributes
+        self._node = node
+
+    def __enter__(self) -> Span:
+        self.span = self._tracer.create_span(self._name, self._attributes)
+        self._token = _current_span.set(self.span)
+        self._node_token = _current_node.set(self.span) if self._node else None
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current_span.reset(self._token)
+        if self._node_token is not None:
+            _current_node.reset(self._node_token)
+        self._tracer.end_span(self.span, exc)
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def _node_name() -> str:
+    node = _current_node.get()
+    return node.attributes.get("langgraph.node", "") if node is not None else ""
+
+
+def _add(key: str, amount: float) -> None:
+    """累加到目前的 span，以及 (不同的話) 所在的節點 span。"""
+    span, node = _current_span.get(), _current_node.get()
+    if span is not None:
+        span.add(key, amount)
+    if node is not None and node is not span:
+        node.add(key, amount)
+
+
+def _build_exporters() -> list:
+    if TELEMETRY_SPAN_EXPORTER == "memory":
+        return [memory_exporter]
+    if TELEMETRY_SPAN_EXPORTER == "log":
+        return [memory_exporter, LoggingSpanExporter()]
+    return []
+
+
+memory_exporter = InMemorySpanExporter()
+tracer = Tracer(_build_exporters())
+
+
+# --- 由呼叫端回報的事件 ---
+def record_external_call(service: str, operation: str) -> None:
+    """回報一次外部 API 呼叫 (例如 google_maps / places)。"""
+    if not tracer.enabled:
+        return
+    EXTERNAL_CALLS.inc(service=service, operation=operation, node=_node_name())
+    _add("external_calls", 1)
+    _add(f"external_calls.{service}", 1)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    """回報一次結果快取的查詢。"""
+    if not tracer.enabled:
+        return
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss", node=_node_name())
+    _add("cache_hits" if hit else "cache_misses", 1)
+
+
+# --- 節點與工具的包裝 ---
+def _accepts_config(func: Callable) -> bool:
+    from langchain_core.runnables.utils import accepts_config
+    return accepts_config(func)
+
+
+def instrument_node(name: str, func: Callable, afunc: Callable | None = None):
+    """
+    包裝 graph 節點 (同步函式與選用的 async 版本)，回傳可直接交給 add_node 的 RunnableLambda。
+    原本的函式有 config 參數時照樣傳入。
+    """
+    from langchain_core.runnables import RunnableConfig, RunnableLambda
+
+    def _call(target, state, config):
+        return target(state, config) if _accepts_config(target) else target(state)
+
+    def _observe(start: float, error: BaseException | None) -> None:
+        NODE_DURATION.observe(time.perf_counter() - start, node=name, status="error" if error else "ok")
+
+    # 不用 functools.wraps：RunnableLambda 會依 __wrapped__ 的簽名決定要不要傳 config
+    def wrapper(state, config: RunnableConfig):
+        if not tracer.enabled:
+            return _call(func, state, config)
+        start, error = time.perf_counter(), None
+        with tracer.start_as_current_span(f"node {name}", {"langgraph.node": name}, node=True):
+            try:
+                return _call(func, state, config)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                _observe(start, error)
+
+    if afunc is None:
+        return RunnableLambda(wrapper, name=name)
+
+    async def awrapper(state, config: RunnableConfig):
+        if not tracer.enabled:
+            return await _call(afunc, state, config)
+        start, error = time.perf_counter(), None
+        with tracer.start_as_current_span(f"node {name}", {"langgraph.node": name}, node=True):
+            try:
+                return await _call(afunc, state, config)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                _observe(start, error)
+
+    return RunnableLambda(wrapper, afunc=awrapper, name=name)
+
+
+def instrument_tool(tool):
+    """回傳記錄耗時的工具副本 (StructuredTool 的 func / coroutine 外包一層 span)。"""
+    name = tool.name
+
+    def wrap(target):
+        @functools.wraps(target)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return target(*args, **kwargs)
+            start, status = time.perf_counter(), "ok"
+            with tracer.start_as_current_span(f"tool {name}", {"tool.name": name}):
+                try:
+                    return target(*args, **kwargs)
+                except BaseException:
+                    status = "error"
+                    raise
+                finally:
+                    TOOL_DURATION.observe(time.perf_counter() - start, tool=name, status=status)
+        return wrapper
+
+    def awrap(target):
+        @functools.wraps(target)
+        async def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return await target(*args, **kwargs)
+            start, status = time.perf_counter(), "ok"
+            with tracer.start_as_current_span(f"tool {name}", {"tool.name": name}):
+                try:
+                    return await target(*args, **kwargs)
+                except BaseException:
+                    status = "error"
+                    raise
+                finally:
+                    TOOL_DURATION.observe(time.perf_counter() - start, tool=name, status=status)
+        return wrapper
+
+    update = {}
+    if getattr(tool, "func", None) is not None:
+        update["func"] = wrap(tool.func)
+    if getattr(tool, "coroutine", None) is not None:
+        update["coroutine"] = awrap(tool.coroutine)
+    return tool.model_copy(update=update)
+
+
+# --- LLM tokens (langchain callback) ---
+def _usage(response) -> tuple[int, int]:
+    prompt = completion = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt += usage.get("input_tokens", 0)
+                completion += usage.get("output_tokens", 0)
+    if not prompt and not completion:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    return prompt or 0, completion or 0
+
+
+_llm_callback_installed = False
+
+
+def install_llm_callback() -> None:
+    """
+    以 configure hook 把 callback 加到所有 langchain 的呼叫上 (與 LangSmith tracing 相同的機制)，
+    記錄每次 LLM 呼叫的耗時與 tokens。由 graph.graph 在建立流程時呼叫一次。
+    """
+    global _llm_callback_installed
+    if _llm_callback_installed or not TELEMETRY_ENABLED:
+        return
+    _llm_callback_installed = True
+
+    from langchain_core.callbacks import BaseCallbackHandler
+    from langchain_core.tracers.context import register_configure_hook
+
+    class TelemetryCallbackHandler(BaseCallbackHandler):
+        # 在呼叫端的 context 中執行，才能找到所在的節點 span
+        run_inline = True
+        ignore_chain = True
+        ignore_agent = True
+        ignore_retriever = True
+        ignore_retry = True
+
+        def __init__(self):
+            self._runs: dict[Any, tuple[Span, float, Span | None]] = {}
+            self._lock = threading.Lock()
+
+        def _start(self, run_id, serialized) -> None:
+            if not tracer.enabled:
+                return
+            model = (serialized or {}).get("kwargs", {}).get("model_name") or (serialized or {}).get("name", "")
+            span = tracer.create_span("llm", {"llm.model": model})
+            with self._lock:
+                self._runs[run_id] = (span, time.perf_counter(), _current_node.get())
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self._start(run_id, serialized)
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._start(run_id, serialized)
+
+        def _end(self, run_id, response=None, error=None) -> None:
+            with self._lock:
+                entry = self._runs.pop(run_id, None)
+            if entry is None:
+                return
+            span, start, node = entry
+            node_name = node.attributes.get("langgraph.node", "") if node is not None else ""
+            LLM_DURATION.observe(time.perf_counter() - start, node=node_name, status="error" if error else "ok")
+            if response is not None:
+                prompt, completion = _usage(response)
+                span.set_attribute("llm.prompt_tokens", prompt)
+                span.set_attribute("llm.completion_tokens", completion)
+                LLM_TOKENS.inc(prompt, node=node_name, kind="prompt")
+                LLM_TOKENS.inc(completion, node=node_name, kind="completion")
+                if node is not None:
+                    node.add("llm.calls", 1)
+                    node.add("llm.prompt_tokens", prompt)
+                    node.add("llm.completion_tokens", completion)
+            tracer.end_span(span, error)
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            self._end(run_id, response=response)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self._end(run_id, error=error)
+
+    handler_var: ContextVar = ContextVar("telemetry_llm_callback", default=TelemetryCallbackHandler())
+    register_configure_hook(handler_var, inheritable=True)
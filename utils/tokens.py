@@ -0,0 +1,31 @@
+# utils/tokens.py
+import re
+import logging
+from functools import lru_cache
+
+_CJK_RE = re.compile(r"[　-鿿가-힯＀-￯]")
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """載入 gpt-4o 系列使用的 tiktoken 編碼；無法載入 (例如離線環境) 時回傳 None。"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logging.warning(f"無法載入 tiktoken 編碼，改用估算方式計算 token: {e}")
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    計算文字的 token 數。
+    優先使用 tiktoken；不可用時以「每個中日韓字元 1 token、其餘每 4 個字元 1 token」估算。
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4